@@ -1,17 +1,651 @@
 import tkinter as tk
-from tkinter import filedialog, messagebox
-import struct
+from tkinter import filedialog, messagebox, ttk
+import tkinter.font as tkfont
 import os
-import re
+import sys
+import time
+
+from fasthex_core import (
+    BYTES_PER_LINE, ANNOTATION_FLUSH_IDLE_MS, INTERP_TYPES, SEARCH_MAX_HITS, SEARCH_MODES,
+    BytesDataSource, BackgroundJob, AnnotationIndex, AnnotationWriter, RowLayout,
+    open_data_source, parse_annotation_line, format_annotation_line, annotation_matches,
+    merge_ranges, verify_annotations, compile_search_pattern, search_data,
+    benchmark_format_rows, SelectionInterpretation, DECODER_BASE_TYPES,
+    compile_template, decode_records, export_records, template_annotations, format_field,
+    compute_overview, diff_data, RowPageCache, ROW_CACHE_BYTES, perf, export_perf,
+    export_dump, annotation_markers, scan_data, SCAN_MIN_STRING, FileSession, SESSION_CACHE_BYTES,
+)
+
+# Rows rendered above and below the visible area so small scrolls don't re-render.
+VIEW_OVERSCAN_ROWS = 16
+# Drag events are coalesced into one highlight update per display frame (~60 Hz)
+HIGHLIGHT_FRAME_MS = 16
+
+# How often the UI thread collects results from background jobs
+JOB_POLL_MS = 50
+# Problem lines shown in the parser report window
+REPORT_DISPLAY_LIMIT = 5000
+
+# How often follow mode checks the file for appended data
+FOLLOW_POLL_MS = 500
+
+# Width of the overview strip next to the scrollbar, in pixels
+OVERVIEW_WIDTH = 24
+
+# How often the stats window re-reads the timers
+STATS_REFRESH_MS = 1000
+
+# Records listed in the template window (exports and annotations cover all of them)
+TEMPLATE_DISPLAY_RECORDS = 1000
+
+# Hits listed in the scan window (the tag layer, exports and annotations cover all of them)
+SCAN_DISPLAY_HITS = 5000
+
+# Jobs that only serve the file on screen; switching tabs cancels them. Saves,
+# exports and template jobs finish against the file they were started on.
+VIEW_JOB_KINDS = ("interp", "search", "scan", "diff", "overview", "render", "parser")
+
+# Widget classes that take typed text: plain-key hotkeys are ignored while they
+# have the focus (Text only while editable, see _typing)
+TEXT_INPUT_CLASSES = ("Entry", "TEntry", "TCombobox", "Spinbox", "TSpinbox", "Text")
+
+# Decoder hotkeys: the digit key (also with Control/Command) saves the
+# little-endian decoder of a base type, Alt+digit the big-endian one
+DECODER_KEYS = ["1", "2", "3", "4", "5", "6", "7", "8", "9", "0", "minus"]
+DECODER_HOTKEYS = {}
+for _key, (_name, _code, _dtype) in zip(DECODER_KEYS, DECODER_BASE_TYPES):
+    if _name in ("Int8", "UInt8"):
+        DECODER_HOTKEYS[_key] = (_name, _name)
+    else:
+        DECODER_HOTKEYS[_key] = (_name + " LE", _name + " BE")
+del _key, _name, _code, _dtype
+
+
+class SearchPanel(tk.Toplevel):
+    """Search window: pattern entry, mode selector and a list of hits streamed from a background job."""
+
+    def __init__(self, viewer):
+        super().__init__(viewer)
+        self.viewer = viewer
+        self.title("Search")
+        self.geometry("520x480")
+        self.hits = []
+        self.job = None
+
+        top = tk.Frame(self)
+        top.pack(side=tk.TOP, fill=tk.X)
+        self.pattern = tk.Entry(top, font=("Courier", 12))
+        self.pattern.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5, pady=5)
+        self.pattern.bind("<Return>", lambda e: self.start_search())
+        self.mode = ttk.Combobox(top, values=SEARCH_MODES, state="readonly", width=8)
+        self.mode.set(SEARCH_MODES[0])
+        self.mode.pack(side=tk.LEFT, padx=5)
+        tk.Button(top, text="Find", command=self.start_search).pack(side=tk.LEFT, padx=5)
+        tk.Button(top, text="Stop", command=self.stop_search).pack(side=tk.LEFT, padx=5)
+
+        self.status = tk.Label(self, anchor="w")
+        self.status.pack(side=tk.BOTTOM, fill=tk.X, padx=5)
+
+        scroll = tk.Scrollbar(self, orient=tk.VERTICAL)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.results = tk.Listbox(self, font=("Courier", 12), yscrollcommand=scroll.set)
+        self.results.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scroll.config(command=self.results.yview)
+        self.results.bind("<<ListboxSelect>>", self.on_select)
+
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self.pattern.focus_set()
+
+    def start_search(self):
+        self.stop_search()
+        try:
+            regex, max_match = compile_search_pattern(self.pattern.get(), self.mode.get())
+        except (ValueError, UnicodeEncodeError) as e:
+            messagebox.showerror("Error", str(e), parent=self)
+            return
+        self.clear()
+        data = self.viewer.file_data
+
+        def work(job):
+            batch = []
+            count = 0
+            for hit in search_data(data, regex, max_match, progress=job.set_progress):
+                batch.append(hit)
+                count += 1
+                if len(batch) >= 100:
+                    job.post(batch)
+                    batch = []
+                if count >= SEARCH_MAX_HITS:
+                    break
+            job.post(batch)
+            return count
+
+        self.status.config(text="Searching...")
+        self.job = self.viewer.start_job(work, kind="search", label="Searching",
+                                         on_item=self.add_hits, on_done=self.finished)
+
+    def stop_search(self):
+        if self.job is not None:
+            self.job.cancel()
+            self.job = None
+            self.status.config(text=f"Stopped, {len(self.hits)} hits")
+
+    def clear(self):
+        self.hits = []
+        self.results.delete(0, tk.END)
+        self.status.config(text="")
+
+    def add_hits(self, batch):
+        data = self.viewer.file_data
+        for offset, length in batch:
+            preview = data.view(offset, offset + min(length, 16)).hex(" ").upper()
+            self.results.insert(tk.END, f"{offset:08X}  {length:5d}  {preview}")
+        self.hits.extend(batch)
+        self.status.config(text=f"{len(self.hits)} hits so far...")
+
+    def finished(self, count):
+        self.job = None
+        more = " (limit reached)" if count >= SEARCH_MAX_HITS else ""
+        self.status.config(text=f"{len(self.hits)} hits{more}")
+
+    def on_select(self, event):
+        selection = self.results.curselection()
+        if not selection:
+            return
+        offset, length = self.hits[selection[0]]
+        self.viewer.select_range(offset, offset + length - 1)
+
+    def close(self):
+        self.stop_search()
+        self.viewer.search_panel = None
+        self.destroy()
+
+
+class ScanPanel(tk.Toplevel):
+    """
+    Strings and signatures scan: runs scan_data over the open file, lists the
+    hits, and saves them as parser-file annotations or exports them.
+    """
+
+    def __init__(self, viewer):
+        super().__init__(viewer)
+        self.viewer = viewer
+        self.title("Scan")
+        self.geometry("760x520")
+        self.job = None
+
+        top = tk.Frame(self)
+        top.pack(side=tk.TOP, fill=tk.X)
+        self.strings = tk.BooleanVar(value=True)
+        self.signatures = tk.BooleanVar(value=True)
+        tk.Checkbutton(top, text="Strings", variable=self.strings).pack(side=tk.LEFT, padx=5)
+        tk.Label(top, text="Min length:").pack(side=tk.LEFT)
+        self.min_length = tk.Spinbox(top, from_=3, to=64, width=4)
+        self.min_length.delete(0, tk.END)
+        self.min_length.insert(0, str(SCAN_MIN_STRING))
+        self.min_length.pack(side=tk.LEFT, padx=5)
+        tk.Checkbutton(top, text="Signatures", variable=self.signatures).pack(side=tk.LEFT, padx=5)
+        tk.Button(top, text="Scan", command=self.start_scan).pack(side=tk.LEFT, padx=5, pady=5)
+        tk.Button(top, text="Stop", command=self.stop_scan).pack(side=tk.LEFT, padx=5)
+        tk.Button(top, text="Clear", command=self.clear).pack(side=tk.LEFT, padx=5)
+        tk.Button(top, text="Annotate", command=self.annotate).pack(side=tk.LEFT, padx=5)
+        tk.Button(top, text="Export...", command=self.export).pack(side=tk.LEFT, padx=5)
+
+        self.status = tk.Label(self, anchor="w")
+        self.status.pack(side=tk.BOTTOM, fill=tk.X, padx=5)
+
+        scroll = tk.Scrollbar(self, orient=tk.VERTICAL)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.results = tk.Listbox(self, font=("Courier", 12), yscrollcommand=scroll.set)
+        self.results.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scroll.config(command=self.results.yview)
+        self.results.bind("<<ListboxSelect>>", self.on_select)
+
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self.show(self.viewer.scan_index)
+
+    def start_scan(self):
+        self.stop_scan()
+        try:
+            min_length = int(self.min_length.get())
+        except ValueError:
+            messagebox.showerror("Error", "Min length must be a number", parent=self)
+            return
+        viewer = self.viewer
+        data, path = viewer.file_data, viewer.file_path
+        strings, signatures = self.strings.get(), self.signatures.get()
+
+        def done(index):
+            self.job = None
+            if data is viewer.file_data:
+                viewer.set_scan_index(index)
+
+        self.status.config(text="Scanning...")
+        self.job = viewer.start_job(lambda job: scan_data(data, path, min_length, strings, signatures,
+                                                          progress=job.set_progress, check=job.check),
+                                    kind="scan", label="Scanning", on_done=done)
+
+    def stop_scan(self):
+        if self.job is not None:
+            self.job.cancel()
+            self.job = None
+            self.status.config(text="Stopped")
+
+    def clear(self):
+        self.stop_scan()
+        self.viewer.set_scan_index(None)
+
+    def show(self, index):
+        """List the first SCAN_DISPLAY_HITS hits of `index` (None: nothing scanned)."""
+        self.results.delete(0, tk.END)
+        if index is None:
+            self.status.config(text="")
+            return
+        data = self.viewer.file_data
+        for i in range(min(len(index), SCAN_DISPLAY_HITS)):
+            offset, length, _ = index.entry(i)
+            data_type, value = index.describe(i, data)
+            self.results.insert(tk.END, f"{offset:08X}  {length:5d}  {data_type:16}  {value[:80]}")
+        more = f", first {SCAN_DISPLAY_HITS} listed" if len(index) > SCAN_DISPLAY_HITS else ""
+        self.status.config(text=f"{index.summary()}{more}")
+
+    def on_select(self, event):
+        selection = self.results.curselection()
+        index = self.viewer.scan_index
+        if not selection or index is None:
+            return
+        offset, length, _ = index.entry(selection[0])
+        self.viewer.select_range(offset, offset + length - 1)
+
+    def annotate(self):
+        """Log every hit to the parser file of the open file, so open_parser loads them."""
+        index = self.viewer.scan_index
+        if index is None:
+            return
+        data = self.viewer.file_data
+
+        def work(job):
+            lines = list(index.annotation_lines(data))
+            ranges = merge_ranges((index.offsets[i], index.offsets[i] + index.lengths[i])
+                                  for i in range(len(index)))
+            return lines, ranges
+
+        def done(result):
+            added = self.viewer.save_annotations(*result)
+            self.status.config(text=f"{added} new annotations")
+
+        self.job = self.viewer.start_job(work, kind="scan", label="Annotating", on_done=done)
+
+    def export(self):
+        """Write every hit as parser-file lines to a file of your choice."""
+        index = self.viewer.scan_index
+        if index is None:
+            return
+        out_path = filedialog.asksaveasfilename(
+            parent=self, defaultextension=".txt",
+            initialfile=os.path.basename(self.viewer.file_path) + ".scan.txt")
+        if not out_path:
+            return
+        data = self.viewer.file_data
+
+        def work(job):
+            count = 0
+            with open(out_path, "w", encoding="utf-8") as f:
+                for line in index.annotation_lines(data):
+                    f.write(line + "\n")
+                    count += 1
+                    if count % 10000 == 0:
+                        job.set_progress(count, len(index))
+            return count
+
+        self.job = self.viewer.start_job(work, kind="scan", label="Exporting",
+                                         on_done=lambda n: self.status.config(text=f"Exported {n} hits"))
+
+    def close(self):
+        if self.job is not None:
+            self.job.cancel()
+        self.viewer.scan_panel = None
+        self.destroy()
+
+
+class TemplatePanel(tk.Toplevel):
+    """Template window: edit or load a structure template and apply it at an offset as N records."""
+
+    def __init__(self, viewer):
+        super().__init__(viewer)
+        self.viewer = viewer
+        self.title("Templates")
+        self.geometry("900x600")
+        self.template = None
+        self.job = None
+
+        top = tk.Frame(self)
+        top.pack(side=tk.TOP, fill=tk.X)
+        tk.Button(top, text="Load...", command=self.load).pack(side=tk.LEFT, padx=5, pady=5)
+        tk.Label(top, text="Offset:").pack(side=tk.LEFT, padx=5)
+        self.offset = tk.Entry(top, font=("Courier", 12), width=12)
+        self.offset.pack(side=tk.LEFT)
+        tk.Label(top, text="Records:").pack(side=tk.LEFT, padx=5)
+        self.count = tk.Entry(top, font=("Courier", 12), width=10)
+        self.count.pack(side=tk.LEFT)
+        tk.Button(top, text="Apply", command=self.apply).pack(side=tk.LEFT, padx=5)
+        tk.Button(top, text="Export CSV", command=lambda: self.export("csv")).pack(side=tk.LEFT, padx=5)
+        tk.Button(top, text="Export JSON", command=lambda: self.export("json")).pack(side=tk.LEFT, padx=5)
+        tk.Button(top, text="Annotate", command=self.annotate).pack(side=tk.LEFT, padx=5)
+
+        self.text = tk.Text(self, height=10, font=("Courier", 12), wrap="none")
+        self.text.pack(side=tk.TOP, fill=tk.X, padx=5)
+        self.text.insert("1.0", "struct Header\nendian little\nmagic    char[4]\nversion  u16\nflags    u16\n")
+
+        self.status = tk.Label(self, anchor="w")
+        self.status.pack(side=tk.BOTTOM, fill=tk.X, padx=5)
+        y_scroll = tk.Scrollbar(self, orient=tk.VERTICAL)
+        y_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        x_scroll = tk.Scrollbar(self, orient=tk.HORIZONTAL)
+        x_scroll.pack(side=tk.BOTTOM, fill=tk.X)
+        self.table = ttk.Treeview(self, show="headings", yscrollcommand=y_scroll.set,
+                                  xscrollcommand=x_scroll.set)
+        self.table.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        y_scroll.config(command=self.table.yview)
+        x_scroll.config(command=self.table.xview)
+
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self.use_selection()
+
+    def use_selection(self):
+        """Default the offset to the start of the viewer's selection."""
+        self.offset.delete(0, tk.END)
+        self.offset.insert(0, f"{self.viewer.current_offset:08X}")
+
+    def load(self):
+        path = filedialog.askopenfilename(parent=self, title="Open Template",
+                                          filetypes=[("Templates", "*.tpl *.json"), ("All Files", "*")])
+        if not path:
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except Exception as e:
+            messagebox.showerror("Error", str(e), parent=self)
+            return
+        self.text.delete("1.0", tk.END)
+        self.text.insert("1.0", text)
+
+    def _prepare(self):
+        """Compile the template and read offset/count. Returns (template, offset, count) or None."""
+        try:
+            template = compile_template(self.text.get("1.0", tk.END))
+            offset = int(self.offset.get().strip() or "0", 16)
+            if offset < 0:
+                raise ValueError("Offset must not be negative")
+            count_text = self.count.get().strip()
+            count = int(count_text) if count_text else None
+            if count is not None and count < 0:
+                raise ValueError("Records must not be negative")
+        except ValueError as e:
+            messagebox.showerror("Error", str(e), parent=self)
+            return None
+        if count is None:
+            # No count given: as many records as the selection holds, at least one
+            interpretation = self.viewer.interpretation
+            selected = len(interpretation) if interpretation is not None else 0
+            count = max(1, selected // template.size)
+        self.template = template
+        return template, offset, count
+
+    def apply(self):
+        prepared = self._prepare()
+        if prepared is None:
+            return
+        template, offset, count = prepared
+        names = template.field_names
+        self.table.delete(*self.table.get_children())
+        self.table.config(columns=["offset"] + names)
+        self.table.heading("offset", text="Offset")
+        self.table.column("offset", width=90, stretch=False)
+        for name in names:
+            self.table.heading(name, text=name)
+            self.table.column(name, width=120)
+        types = [field[1] for field in template.fields]
+        shown = 0
+        for rec_offset, values in decode_records(template, self.viewer.file_data, offset,
+                                                 min(count, TEMPLATE_DISPLAY_RECORDS)):
+            self.table.insert("", tk.END, values=[f"{rec_offset:08X}"] +
+                              [format_field(t, v) for t, v in zip(types, values)])
+            shown += 1
+        more = f", showing {shown}" if count > shown else ""
+        self.status.config(text=f"{template.name}: {template.size} bytes per record, {count} records{more}")
+        if shown:
+            self.viewer.select_range(offset, offset + shown * template.size - 1)
+
+    def export(self, fmt):
+        prepared = self._prepare()
+        if prepared is None:
+            return
+        template, offset, count = prepared
+        out_path = filedialog.asksaveasfilename(parent=self, defaultextension="." + fmt,
+                                                filetypes=[(fmt.upper(), "*." + fmt)])
+        if not out_path:
+            return
+        data = self.viewer.file_data
+
+        def work(job):
+            with open(out_path, "w", encoding="utf-8", newline="") as f:
+                records = decode_records(template, data, offset, count, progress=job.set_progress)
+                return export_records(template, records, f, fmt)
+
+        self.job = self.viewer.start_job(work, kind="template", label="Exporting",
+                                         on_done=lambda n: self.status.config(text=f"Exported {n} records"),
+                                         source=data)
+
+    def annotate(self):
+        """Log every field of every record to the parser file and highlight them."""
+        prepared = self._prepare()
+        if prepared is None:
+            return
+        template, offset, count = prepared
+        data = self.viewer.file_data
+        target = self.viewer._save_target()
+
+        def work(job):
+            records = list(decode_records(template, data, offset, count, progress=job.set_progress))
+            ranges = merge_ranges((rec_offset + f[3], rec_offset + f[3] + f[4])
+                                  for rec_offset, _ in records for f in template.fields)
+            return list(template_annotations(template, data, records)), ranges
+
+        def done(result):
+            lines, ranges = result
+            added = self.viewer.save_annotations(lines, ranges, target)
+            self.status.config(text=f"{added} new annotations")
+
+        self.job = self.viewer.start_job(work, kind="template", label="Annotating", on_done=done, source=data)
+
+    def close(self):
+        if self.job is not None:
+            self.job.cancel()
+        self.viewer.template_panel = None
+        self.destroy()
+
+
+class DecoderPanel(tk.Toplevel):
+    """Decoder table: the selection as an array of every decoder type, refreshed with the selection."""
+
+    def __init__(self, viewer):
+        super().__init__(viewer)
+        self.viewer = viewer
+        self.title("Decoders")
+        self.geometry("900x520")
+
+        bottom = tk.Frame(self)
+        bottom.pack(side=tk.BOTTOM, fill=tk.X)
+        tk.Button(bottom, text="Write", command=self.write_selected).pack(side=tk.LEFT, padx=5, pady=5)
+        tk.Label(bottom, text="Hotkeys: 1-9, 0, - (little-endian); Alt + key for big-endian").pack(side=tk.LEFT, padx=5)
+
+        y_scroll = tk.Scrollbar(self, orient=tk.VERTICAL)
+        y_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        x_scroll = tk.Scrollbar(self, orient=tk.HORIZONTAL)
+        x_scroll.pack(side=tk.BOTTOM, fill=tk.X)
+        self.table = ttk.Treeview(self, columns=("key", "count", "values"), selectmode="browse",
+                                  yscrollcommand=y_scroll.set, xscrollcommand=x_scroll.set)
+        self.table.heading("#0", text="Type")
+        self.table.heading("key", text="Key")
+        self.table.heading("count", text="Count")
+        self.table.heading("values", text="Values")
+        self.table.column("#0", width=110, stretch=False)
+        self.table.column("key", width=70, stretch=False)
+        self.table.column("count", width=80, stretch=False, anchor="e")
+        self.table.column("values", width=2000, stretch=True)
+        self.table.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        y_scroll.config(command=self.table.yview)
+        x_scroll.config(command=self.table.xview)
+        self.table.bind("<Double-1>", lambda e: self.write_selected())
+
+        self.keys = {}
+        for key, (le, be) in DECODER_HOTKEYS.items():
+            label = "-" if key == "minus" else key
+            self.keys[le] = label
+            if be != le:
+                self.keys[be] = f"Alt+{label}"
+
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self.refresh()
+
+    def refresh(self):
+        self.table.delete(*self.table.get_children())
+        interpretation = self.viewer.interpretation
+        if interpretation is None:
+            return
+        for decoder, count, text in interpretation.decoder_table():
+            self.table.insert("", tk.END, iid=decoder, text=decoder,
+                              values=(self.keys.get(decoder, ""), count, text))
+
+    def write_selected(self):
+        selection = self.table.selection()
+        if selection:
+            self.viewer.write_decoded(selection[0])
+
+    def close(self):
+        self.viewer.decoder_panel = None
+        self.destroy()
+
+
+class StatsPanel(tk.Toplevel):
+    """Latency percentiles of the instrumented paths and counters, refreshed while open."""
+
+    COLUMNS = [("count", "Count"), ("mean_ms", "Mean ms"), ("p50_ms", "p50 ms"), ("p90_ms", "p90 ms"),
+               ("p99_ms", "p99 ms"), ("max_ms", "Max ms"), ("total_ms", "Total ms")]
+
+    def __init__(self, viewer):
+        super().__init__(viewer)
+        self.viewer = viewer
+        self.title("Performance")
+        self.geometry("860x460")
+
+        bottom = tk.Frame(self)
+        bottom.pack(side=tk.BOTTOM, fill=tk.X)
+        tk.Button(bottom, text="Reset", command=self.reset).pack(side=tk.LEFT, padx=5, pady=5)
+        tk.Button(bottom, text="Export JSON", command=lambda: self.export("json")).pack(side=tk.LEFT, padx=5)
+        tk.Button(bottom, text="Export CSV", command=lambda: self.export("csv")).pack(side=tk.LEFT, padx=5)
+        self.profile_btn = tk.Button(bottom, command=self.toggle_profile,
+                                     text="Stop Profile..." if perf.profiling else "Start Profile")
+        self.profile_btn.pack(side=tk.RIGHT, padx=5)
+
+        y_scroll = tk.Scrollbar(self, orient=tk.VERTICAL)
+        y_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.table = ttk.Treeview(self, columns=[c for c, _ in self.COLUMNS], selectmode="browse",
+                                  yscrollcommand=y_scroll.set)
+        self.table.heading("#0", text="Timer / counter")
+        self.table.column("#0", width=220, stretch=True)
+        for column, heading in self.COLUMNS:
+            self.table.heading(column, text=heading)
+            self.table.column(column, width=85, stretch=False, anchor="e")
+        self.table.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        y_scroll.config(command=self.table.yview)
+
+        self._refresh_job = None
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self.refresh()
+
+    def refresh(self):
+        self._refresh_job = None
+        snapshot = self.viewer.perf_snapshot()
+        rows = {}
+        for row in snapshot["timers"]:
+            rows[row["name"]] = [row["count"]] + [f"{row[c]:.3f}" for c, _ in self.COLUMNS[1:]]
+        for name, value in snapshot["counters"].items():
+            rows[name] = [value] + [""] * (len(self.COLUMNS) - 1)
+        # Update rows in place so the scroll position and selection survive
+        for iid in self.table.get_children():
+            if iid not in rows:
+                self.table.delete(iid)
+        for name, values in rows.items():
+            if self.table.exists(name):
+                self.table.item(name, values=values)
+            else:
+                self.table.insert("", tk.END, iid=name, text=name, values=values)
+        self._refresh_job = self.after(STATS_REFRESH_MS, self.refresh)
+
+    def reset(self):
+        perf.reset()
+        if self._refresh_job is not None:
+            self.after_cancel(self._refresh_job)
+        self.refresh()
+
+    def export(self, fmt):
+        path = filedialog.asksaveasfilename(parent=self, defaultextension="." + fmt,
+                                            initialfile=f"fasthex-perf.{fmt}")
+        if not path:
+            return
+        try:
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                export_perf(self.viewer.perf_snapshot(), f, fmt)
+        except Exception as e:
+            messagebox.showerror("Error", str(e), parent=self)
+
+    def toggle_profile(self):
+        """Start a cProfile capture of the UI thread, or stop it and save the .prof file."""
+        if perf.profiling:
+            path = filedialog.asksaveasfilename(parent=self, defaultextension=".prof",
+                                                initialfile="fasthex.prof")
+            try:
+                perf.stop_profile(path or None)
+            except Exception as e:
+                messagebox.showerror("Error", str(e), parent=self)
+            self.profile_btn.config(text="Start Profile")
+            return
+        try:
+            perf.start_profile()
+        except ValueError as e:
+            # Another profiler (or debugger) is already attached
+            messagebox.showerror("Error", str(e), parent=self)
+            return
+        self.profile_btn.config(text="Stop Profile...")
+
+    def close(self):
+        if self._refresh_job is not None:
+            self.after_cancel(self._refresh_job)
+        self.viewer.stats_panel = None
+        self.destroy()
+
 
 class HexViewerNativeSelection(tk.Tk):
-    def __init__(self):
+    def __init__(self, row_cache_bytes=ROW_CACHE_BYTES, session_cache_bytes=SESSION_CACHE_BYTES):
         super().__init__()
         self.title("Fast Hex Parser v1.4 (Viewer Only)")
         self.geometry("1400x800")
 
-        self.file_data = b""
+        # Open files, one tab each; the attributes below belong to the shown one
+        # and are saved to its FileTab when another tab is shown
+        self.session = FileSession(session_cache_bytes, row_cache_bytes)
+        # Tab strip frame of every FileTab
+        self._tab_frames = {}
+
+        self.file_data = BytesDataSource()
         self.file_path = None
+        # Formatted rows of file_data (and of compare_data in compare mode), see RowPageCache
+        self.row_cache_bytes = row_cache_bytes
+        self.row_cache = RowPageCache(self.file_data, row_cache_bytes)
+        self.compare_row_cache = None
         
         self.grouping_size = tk.IntVar(value=1)
         self.font_size = tk.IntVar(value=14)
@@ -20,19 +654,70 @@ class HexViewerNativeSelection(tk.Tk):
         self.select_start_offset = None
         self.select_end_offset   = None
 
-        # For storing positions (start_hex_idx, end_hex_idx, start_ascii_idx, end_ascii_idx, offset_in_file, hex_str)
-        self.group_info = []
+        # (start, end) byte range currently tagged "highlight" in the rendered window
+        self._highlight_span = None
+        # Latest motion event waiting for the next highlight frame, and its after() job
+        self._pending_drag = None
+        self._drag_job = None
+
+        # Column geometry for the current grouping size (see RowLayout)
+        self.layout = RowLayout(self.grouping_size.get())
+
+        # Virtualized view: only rows [render_first_row, render_first_row + render_row_count)
+        # are present in the text widgets; top_row is the first row shown on screen.
+        self.top_row = 0
+        self.render_first_row = 0
+        self.render_row_count = 0
+
+        # AnnotationIndex of the parser file loaded by open_parser, and its VerificationReport
+        self.annotations = None
+        self.parser_report = None
+        # AnnotationWriter for the current parser file, its pending idle-flush job,
+        # and merged (start, end) ranges saved since open_parser last ran
+        self.annotation_writer = None
+        self._flush_job = None
+        self.session_ranges = []
         
         # For interpretation
-        self.selected_hex_be = ""
-        self.selected_hex_le = ""
         self.current_offset = 0  # First byte of the selected range
+        # SelectionInterpretation of the selection, and the text last put into each field
+        self.interpretation = None
+        self._interp_shown = {}
+
+        # Compare mode: second file, its path and the DiffResult against file_data
+        self.compare_data = None
+        self.compare_path = None
+        self.diff = None
+
+        # ByteOverview of the open file once computed (drawn in overview_canvas)
+        self.byte_overview = None
+
+        # Follow mode: watch the file for appended data, and the after() id of the next check
+        self.follow = tk.BooleanVar(value=False)
+        self._follow_job = None
+
+        # ScanIndex of strings and signatures in the open file, tagged "scanned"
+        self.scan_index = None
+
+        # Open SearchPanel, ScanPanel, DecoderPanel, TemplatePanel and StatsPanel, if any
+        self.search_panel = None
+        self.scan_panel = None
+        self.decoder_panel = None
+        self.template_panel = None
+        self.stats_panel = None
+
+        # Running BackgroundJobs and the after() id of their poll loop
+        self._jobs = []
+        self._job_poll = None
+        # Outcome of the last finished job, shown while no job is running
+        self._status_message = ""
 
         self.create_top_controls()
         self.create_text_areas()
         self.create_bottom_interpretation()
 
         self.bind_hotkeys()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def create_top_controls(self):
         top_frame = tk.Frame(self)
@@ -41,9 +726,38 @@ class HexViewerNativeSelection(tk.Tk):
         open_btn = tk.Button(top_frame, text="Open File", command=self.open_file)
         open_btn.pack(side=tk.LEFT, padx=5, pady=5)
 
+        open_raw_btn = tk.Button(top_frame, text="Open Raw", command=lambda: self.open_file(raw=True))
+        open_raw_btn.pack(side=tk.LEFT, padx=5, pady=5)
+
         parser_btn = tk.Button(top_frame, text="Open Parser", command=self.open_parser)
         parser_btn.pack(side=tk.LEFT, padx=5, pady=5)
 
+        search_btn = tk.Button(top_frame, text="Search", command=self.open_search)
+        search_btn.pack(side=tk.LEFT, padx=5, pady=5)
+
+        scan_btn = tk.Button(top_frame, text="Scan", command=self.open_scan)
+        scan_btn.pack(side=tk.LEFT, padx=5, pady=5)
+
+        decoders_btn = tk.Button(top_frame, text="Decoders", command=self.open_decoders)
+        decoders_btn.pack(side=tk.LEFT, padx=5, pady=5)
+
+        templates_btn = tk.Button(top_frame, text="Templates", command=self.open_templates)
+        templates_btn.pack(side=tk.LEFT, padx=5, pady=5)
+
+        export_btn = tk.Button(top_frame, text="Export...", command=self.export_range)
+        export_btn.pack(side=tk.LEFT, padx=5, pady=5)
+
+        stats_btn = tk.Button(top_frame, text="Stats", command=self.toggle_stats)
+        stats_btn.pack(side=tk.LEFT, padx=5, pady=5)
+
+        self.compare_btn = tk.Button(top_frame, text="Compare...", command=self.toggle_compare)
+        self.compare_btn.pack(side=tk.LEFT, padx=5, pady=5)
+        tk.Button(top_frame, text="< Diff", command=self.prev_diff).pack(side=tk.LEFT, pady=5)
+        tk.Button(top_frame, text="Diff >", command=self.next_diff).pack(side=tk.LEFT, padx=(0, 5), pady=5)
+
+        tk.Checkbutton(top_frame, text="Follow", variable=self.follow,
+                       command=self.toggle_follow).pack(side=tk.LEFT, padx=5)
+
         tk.Label(top_frame, text="Byte grouping:").pack(side=tk.LEFT, padx=5)
         for size in [1, 2, 4]:
             rb = tk.Radiobutton(top_frame, text=f"{size} byte(s)",
@@ -60,6 +774,24 @@ class HexViewerNativeSelection(tk.Tk):
                                 command=self.change_font_size)
             rb.pack(side=tk.LEFT)
 
+        # Background job status (right side)
+        self.cancel_btn = tk.Button(top_frame, text="Cancel", state="disabled",
+                                    command=self.cancel_jobs)
+        self.cancel_btn.pack(side=tk.RIGHT, padx=5, pady=5)
+        self.progress_bar = ttk.Progressbar(top_frame, length=150, maximum=1.0)
+        self.progress_bar.pack(side=tk.RIGHT, padx=5)
+        self.status_label = tk.Label(top_frame, text="")
+        self.status_label.pack(side=tk.RIGHT, padx=5)
+        # Result of the last compare
+        self.diff_label = tk.Label(top_frame, text="")
+        self.diff_label.pack(side=tk.RIGHT, padx=5)
+
+        # One tab per open file; middle-click or Ctrl+W closes one
+        self.tab_bar = ttk.Notebook(self)
+        self.tab_bar.pack(side=tk.TOP, fill=tk.X)
+        self.tab_bar.bind("<<NotebookTabChanged>>", self._on_tab_changed)
+        self.tab_bar.bind("<Button-2>", self._on_tab_middle_click)
+
     def create_text_areas(self):
         main_frame = tk.Frame(self)
         main_frame.pack(fill=tk.BOTH, expand=True)
@@ -67,8 +799,18 @@ class HexViewerNativeSelection(tk.Tk):
         x_scroll = tk.Scrollbar(main_frame, orient=tk.HORIZONTAL)
         x_scroll.pack(side=tk.BOTTOM, fill=tk.X)
 
-        y_scroll = tk.Scrollbar(main_frame, orient=tk.VERTICAL)
-        y_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        # The vertical scrollbar is driven by the file length, not by the text widgets,
+        # because the widgets only ever hold the rendered window.
+        self.y_scroll = tk.Scrollbar(main_frame, orient=tk.VERTICAL, command=self._on_yscroll)
+        self.y_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+
+        # Overview strip: entropy / byte classes of the whole file; click to jump there
+        self.overview_canvas = tk.Canvas(main_frame, width=OVERVIEW_WIDTH, bg="gray30",
+                                         highlightthickness=0, cursor="hand2")
+        self.overview_canvas.pack(side=tk.RIGHT, fill=tk.Y)
+        self.overview_canvas.bind("<Button-1>", self._on_overview_click)
+        self.overview_canvas.bind("<B1-Motion>", self._on_overview_click)
+        self.overview_canvas.bind("<Configure>", lambda e: self._draw_overview())
 
         # offset_text
         self.offset_text = tk.Text(main_frame, width=10, bg="darkgray", fg="white",
@@ -87,19 +829,19 @@ class HexViewerNativeSelection(tk.Tk):
                                   state="disabled")
         self.ascii_text.pack(side=tk.LEFT, fill=tk.BOTH)
 
-        # Link scrolling
-        def y_scroll_command(*args):
-            self.offset_text.yview(*args)
-            self.hex_text.yview(*args)
-            self.ascii_text.yview(*args)
-        y_scroll.config(command=y_scroll_command)
-        self.offset_text.config(yscrollcommand=lambda *a: y_scroll.set(*a))
-        self.hex_text.config(yscrollcommand=lambda *a: y_scroll.set(*a))
-        self.ascii_text.config(yscrollcommand=lambda *a: y_scroll.set(*a))
+        # Hex and ASCII columns of the second file in compare mode, packed by start_compare
+        self.compare_hex_text = tk.Text(main_frame, bg="gray15", fg="white",
+                                        font=("Courier", self.font_size.get()), wrap="none",
+                                        state="disabled")
+        self.compare_ascii_text = tk.Text(main_frame, width=34, bg="gray40", fg="white",
+                                          font=("Courier", self.font_size.get()), wrap="none",
+                                          state="disabled")
 
         def x_scroll_command(*args):
             self.hex_text.xview(*args)
             self.ascii_text.xview(*args)
+            self.compare_hex_text.xview(*args)
+            self.compare_ascii_text.xview(*args)
         x_scroll.config(command=x_scroll_command)
         self.hex_text.config(xscrollcommand=lambda *a: x_scroll.set(*a))
         self.ascii_text.config(xscrollcommand=lambda *a: x_scroll.set(*a))
@@ -123,6 +865,21 @@ class HexViewerNativeSelection(tk.Tk):
         self.hex_text.bind("<Button-5>", self._on_mousewheel_linux)
         self.ascii_text.bind("<Button-4>", self._on_mousewheel_linux)
         self.ascii_text.bind("<Button-5>", self._on_mousewheel_linux)
+        for widget in (self.compare_hex_text, self.compare_ascii_text):
+            widget.bind("<MouseWheel>", self._on_mousewheel)
+            widget.bind("<Button-4>", self._on_mousewheel_linux)
+            widget.bind("<Button-5>", self._on_mousewheel_linux)
+
+        # Number of visible rows depends on the widget height
+        self.hex_text.bind("<Configure>", self._on_view_resize)
+
+        # Tags created later take priority, so the selection stays visible over parsed
+        # data, and logged annotations over scan hits
+        for widget in (self.hex_text, self.ascii_text, self.compare_hex_text, self.compare_ascii_text):
+            widget.tag_config("scanned", foreground="orange")
+            widget.tag_config("parsed", foreground="lightblue")
+            widget.tag_config("diff", background="#7a2020")
+            widget.tag_config("highlight", background="lightgreen", foreground="black")
 
     def create_bottom_interpretation(self):
         bottom_frame = tk.Frame(self)
@@ -130,7 +887,7 @@ class HexViewerNativeSelection(tk.Tk):
 
         self.interp_entries = {}
         self.interp_buttons = {}
-        self.interp_types = ["Hex (BE)", "Hex (LE)", "SignedInt16", "Float32", "Decimal"]
+        self.interp_types = INTERP_TYPES
 
         for i, interp in enumerate(self.interp_types):
             lbl = tk.Label(bottom_frame, text=interp, font=("Courier", self.font_size.get()))
@@ -138,6 +895,8 @@ class HexViewerNativeSelection(tk.Tk):
 
             entry = tk.Entry(bottom_frame, font=("Courier", self.font_size.get()), width=25)
             entry.grid(row=i, column=1, padx=5, pady=2, sticky="w")
+            # Values too expensive to compute up front are computed once the field is looked at
+            entry.bind("<FocusIn>", lambda e, it=interp: self.request_interpretation(it))
             self.interp_entries[interp] = entry
 
             btn = tk.Button(bottom_frame, text="Write",
@@ -145,126 +904,210 @@ class HexViewerNativeSelection(tk.Tk):
             btn.grid(row=i, column=2, padx=5, pady=2)
             self.interp_buttons[interp] = btn
 
+            copy_btn = tk.Button(bottom_frame, text="Copy",
+                                 command=lambda it=interp: self.copy_value(it))
+            copy_btn.grid(row=i, column=3, padx=5, pady=2)
+            self.interp_buttons[interp + " copy"] = copy_btn
+
     # ===========================
     # Methods for "native" byte selection
     # ===========================
     def on_mouse_down_hex(self, event):
         """Mouse button pressed inside hex column. Determine byte offset and start selection."""
+        self._cancel_drag()
         self.select_start_offset = self._point_to_offset_hex(event)
         self.select_end_offset   = self.select_start_offset
         self._update_highlight()
 
     def on_mouse_drag_hex(self, event):
         """Mouse movement while button is pressed in hex column."""
-        new_offset = self._point_to_offset_hex(event)
-        if new_offset is not None:
-            self.select_end_offset = new_offset
-            self._update_highlight()
+        self._queue_drag(self._point_to_offset_hex, event)
 
     def on_mouse_up_hex(self, event):
         """Button released - finalize selection and perform interpretation."""
+        self._flush_drag()
+        self._cancel_drag()
         self._interpret_selection()
 
     def on_mouse_down_ascii(self, event):
         """Mouse button pressed inside ascii column. Similar to hex."""
+        self._cancel_drag()
         self.select_start_offset = self._point_to_offset_ascii(event)
         self.select_end_offset   = self.select_start_offset
         self._update_highlight()
 
     def on_mouse_drag_ascii(self, event):
-        new_offset = self._point_to_offset_ascii(event)
-        if new_offset is not None:
-            self.select_end_offset = new_offset
-            self._update_highlight()
+        self._queue_drag(self._point_to_offset_ascii, event)
 
     def on_mouse_up_ascii(self, event):
+        self._flush_drag()
+        self._cancel_drag()
         self._interpret_selection()
 
+    def _queue_drag(self, point_to_offset, event):
+        """Remember the latest motion event; it is processed on the next frame."""
+        self._pending_drag = (point_to_offset, event)
+        if self._drag_job is None:
+            self._drag_job = self.after(HIGHLIGHT_FRAME_MS, self._on_drag_frame)
+
+    def _on_drag_frame(self):
+        self._drag_job = None
+        point_to_offset, event = self._pending_drag or (None, None)
+        if event is None:
+            return
+        # Dragging past the top or bottom edge keeps scrolling one row per frame
+        height = event.widget.winfo_height()
+        step = -1 if event.y < 0 else (1 if event.y >= height else 0)
+        if step:
+            self.scroll_rows(step)
+        self._flush_drag()
+        if step:
+            self._pending_drag = (point_to_offset, event)
+            self._drag_job = self.after(HIGHLIGHT_FRAME_MS, self._on_drag_frame)
+
+    def _flush_drag(self):
+        """Apply the pending motion event, if any, to the selection."""
+        if self._pending_drag is None:
+            return
+        point_to_offset, event = self._pending_drag
+        self._pending_drag = None
+        new_offset = point_to_offset(event)
+        if new_offset is not None and new_offset != self.select_end_offset:
+            self.select_end_offset = new_offset
+            self._update_highlight()
+
+    def _cancel_drag(self):
+        if self._drag_job is not None:
+            self.after_cancel(self._drag_job)
+            self._drag_job = None
+        self._pending_drag = None
+
+    @perf.timed("_point_to_offset_hex")
     def _point_to_offset_hex(self, event):
         """
         Determine which byte in the file the user clicked on,
         based on coordinates (event.x, event.y) in hex_text.
         """
-        # First convert (x,y) to (row, col) in text field
-        try:
-            index_str = self.hex_text.index(f"@{event.x},{event.y}")  # "row.col"
-        except:
-            return None
-        
-        if not index_str:
+        pos = self._event_row_col(self.hex_text, event)
+        if pos is None:
             return None
-        line_str, col_str = index_str.split(".")
-        row = int(line_str)  # 1-based
-        col = int(col_str)   # 0-based
-
-        # Each line corresponds to 32 bytes (or less if end of file)
-        # So byte offset of line start = (row-1)*32
-        # But need to account for group_size, spaces, etc.
-
-        # For convenience, use the same structure as during rendering: group_info.
-        # group_info contains tuples (start_hex_idx, end_hex_idx, start_ascii_idx, end_ascii_idx, offset_in_file, hex_str)
-        # We can "walk through" (or binary search) to find which one includes index_str.
-        # But in "native" editors, they usually calculate directly by col.
-        # Here for simplicity we'll use group_info.
-
-        # Convert index_str => "integer" for comparison
-        numeric_idx = self._index_to_int(index_str)
-
-        # Find the group where start_hex_idx <= numeric_idx < end_hex_idx
-        # Since there can be many groups per line, we'll do linear search
-        # (for large files, better to store grouping by lines)
-        for gstart, gend, astart, aend, off, hstr in self.group_info:
-            gi1 = self._index_to_int(gstart)
-            gi2 = self._index_to_int(gend)
-            if gi1 <= numeric_idx < gi2:
-                # This is the group. offset_in_file = off
-                # If group_size>1, maybe inside group?
-                # For simplicity, click on any part of group => offset_in_file (group start).
-                return off
-        return None
+        row, col = pos
+        return self._row_byte_to_offset(row, self.layout.byte_at_hex_col(col))
 
+    @perf.timed("_point_to_offset_ascii")
     def _point_to_offset_ascii(self, event):
         """Similar method but for ascii_text."""
+        pos = self._event_row_col(self.ascii_text, event)
+        if pos is None:
+            return None
+        row, col = pos
+        return self._row_byte_to_offset(row, self.layout.byte_at_ascii_col(col))
+
+    def _event_row_col(self, widget, event):
+        """Convert mouse coordinates to (file row, column) in a text widget."""
         try:
-            index_str = self.ascii_text.index(f"@{event.x},{event.y}")
-        except:
+            index_str = widget.index(f"@{event.x},{event.y}")  # "line.col"
+        except tk.TclError:
             return None
         if not index_str:
             return None
-        numeric_idx = self._index_to_int(index_str)
-
-        # Find in group_info where start_ascii_idx <= numeric_idx < end_ascii_idx
-        for gstart, gend, astart, aend, off, hstr in self.group_info:
-            ai1 = self._index_to_int(astart)
-            ai2 = self._index_to_int(aend)
-            if ai1 <= numeric_idx < ai2:
-                return off
-        return None
-
-    def _update_highlight(self):
-        """Highlight bytes in range [select_start_offset, select_end_offset]."""
-        if self.select_start_offset is None or self.select_end_offset is None:
-            return
-        start_off = min(self.select_start_offset, self.select_end_offset)
-        end_off   = max(self.select_start_offset, self.select_end_offset)
-
-        # Remove old highlighting
-        self.hex_text.config(state="normal")
-        self.ascii_text.config(state="normal")
-        self.hex_text.tag_remove("highlight", "1.0", tk.END)
-        self.ascii_text.tag_remove("highlight", "1.0", tk.END)
-
-        # Iterate through group_info, find groups within [start_off, end_off]
-        for gstart_idx, gend_idx, astart_idx, aend_idx, offset_in_file, hex_str in self.group_info:
-            if start_off <= offset_in_file < (end_off+1):
-                self.hex_text.tag_add("highlight", gstart_idx, gend_idx)
-                self.ascii_text.tag_add("highlight", astart_idx, aend_idx)
+        line_str, col_str = index_str.split(".")
+        # Line 1 of the widget is the first rendered row
+        return self.render_first_row + int(line_str) - 1, int(col_str)
 
-        self.hex_text.tag_config("highlight", background="lightgreen", foreground="black")
-        self.ascii_text.tag_config("highlight", background="lightgreen", foreground="black")
+    def _row_byte_to_offset(self, row, byte_in_row):
+        offset = row * BYTES_PER_LINE + byte_in_row
+        if offset >= len(self.file_data):
+            return None
+        return offset
 
-        self.hex_text.config(state="disabled")
-        self.ascii_text.config(state="disabled")
+    def _row_spans(self, start_off, end_off, size=None):
+        """
+        Yield (hex_start, hex_end, ascii_start, ascii_end) text indices for every
+        rendered row that intersects the byte range [start_off, end_off).
+        `size` is the length of the data shown (default: file_data).
+        """
+        window_start = self.render_first_row * BYTES_PER_LINE
+        window_end = min(len(self.file_data) if size is None else size,
+                         (self.render_first_row + self.render_row_count) * BYTES_PER_LINE)
+        start_off = max(start_off, window_start)
+        end_off = min(end_off, window_end)
+        if start_off >= end_off:
+            return
+        layout = self.layout
+        first_row = start_off // BYTES_PER_LINE
+        last_row = (end_off - 1) // BYTES_PER_LINE
+        for row in range(first_row, last_row + 1):
+            row_off = row * BYTES_PER_LINE
+            first_byte = max(start_off, row_off) - row_off
+            last_byte = min(end_off, row_off + BYTES_PER_LINE) - 1 - row_off
+            line = row - self.render_first_row + 1
+            yield (f"{line}.{layout.hex_col(first_byte)}",
+                   f"{line}.{layout.hex_end_col(last_byte)}",
+                   f"{line}.{first_byte}",
+                   f"{line}.{last_byte + 1}")
+
+    @perf.timed("_update_highlight")
+    def _update_highlight(self):
+        """
+        Highlight bytes in range [select_start_offset, select_end_offset].
+        Only rendered rows whose part of the selection changed since the last
+        call are re-tagged, with one tag range per row.
+        """
+        new_span = None
+        if self.select_start_offset is not None and self.select_end_offset is not None:
+            start_off = min(self.select_start_offset, self.select_end_offset)
+            end_off   = max(self.select_start_offset, self.select_end_offset) + 1
+            window_start = self.render_first_row * BYTES_PER_LINE
+            window_end = min(len(self.file_data),
+                             (self.render_first_row + self.render_row_count) * BYTES_PER_LINE)
+            start_off = max(start_off, window_start)
+            end_off = min(end_off, window_end)
+            if start_off < end_off:
+                new_span = (start_off, end_off)
+
+        old_span = self._highlight_span
+        self._highlight_span = new_span
+        changed = self._changed_rows(old_span, new_span)
+        perf.count("highlight.rows", len(changed))
+        for row in changed:
+            line = row - self.render_first_row + 1
+            self.hex_text.tag_remove("highlight", f"{line}.0", f"{line}.end")
+            self.ascii_text.tag_remove("highlight", f"{line}.0", f"{line}.end")
+            if new_span is None:
+                continue
+            row_off = row * BYTES_PER_LINE
+            for hstart, hend, astart, aend in self._row_spans(max(new_span[0], row_off),
+                                                              min(new_span[1], row_off + BYTES_PER_LINE)):
+                self.hex_text.tag_add("highlight", hstart, hend)
+                self.ascii_text.tag_add("highlight", astart, aend)
+
+    def _changed_rows(self, old_span, new_span):
+        """Rows whose selected part differs between two (start, end) byte ranges."""
+        def row_range(span):
+            if span is None:
+                return None
+            return span[0] // BYTES_PER_LINE, (span[1] - 1) // BYTES_PER_LINE
+
+        old_rows = row_range(old_span)
+        new_rows = row_range(new_span)
+        if old_rows is None and new_rows is None:
+            return []
+        if old_rows is None or new_rows is None:
+            first, last = old_rows or new_rows
+            return range(first, last + 1)
+        if old_rows[1] < new_rows[0] or new_rows[1] < old_rows[0]:
+            # Disjoint: every row of both ranges changed
+            return sorted(set(range(old_rows[0], old_rows[1] + 1)) |
+                          set(range(new_rows[0], new_rows[1] + 1)))
+
+        rows = set()
+        # Rows covered by only one of the ranges, at either end ...
+        rows.update(range(min(old_rows[0], new_rows[0]), max(old_rows[0], new_rows[0])))
+        rows.update(range(min(old_rows[1], new_rows[1]) + 1, max(old_rows[1], new_rows[1]) + 1))
+        # ... plus the partially selected boundary rows
+        rows.update((old_rows[0], old_rows[1], new_rows[0], new_rows[1]))
+        return sorted(rows)
 
     def _interpret_selection(self):
         """When user releases mouse button - interpret the selected range."""
@@ -283,9 +1126,21 @@ class HexViewerNativeSelection(tk.Tk):
         if end_off >= len(self.file_data):
             end_off = len(self.file_data)-1
 
-        selected_bytes = self.file_data[start_off:end_off+1]
         self.current_offset = start_off
-        self.update_interpretations(selected_bytes)
+        self.update_interpretations(SelectionInterpretation(self.file_data, start_off, end_off + 1))
+
+    def select_range(self, start_off, end_off):
+        """Select bytes [start_off, end_off] (inclusive), scroll them into view and interpret them."""
+        self._cancel_drag()
+        self.select_start_offset = start_off
+        self.select_end_offset = end_off
+        row = start_off // BYTES_PER_LINE
+        visible = self._visible_rows()
+        if not self.top_row <= row < self.top_row + visible:
+            # Leave a few rows of context above the selection
+            self.scroll_to_row(row - visible // 4)
+        self._update_highlight()
+        self._interpret_selection()
 
     # ===========================
     # Other methods (as usual)
@@ -296,12 +1151,17 @@ class HexViewerNativeSelection(tk.Tk):
         self.offset_text.config(font=new_font)
         self.hex_text.config(font=new_font)
         self.ascii_text.config(font=new_font)
+        self.compare_hex_text.config(font=new_font)
+        self.compare_ascii_text.config(font=new_font)
 
         for widget in self.interp_entries.values():
             widget.config(font=new_font)
         for widget in self.interp_buttons.values():
             widget.config(font=new_font)
 
+        # Line height changed, so the number of visible rows did too
+        self.scroll_to_row(self.top_row, force=True)
+
     def bind_hotkeys(self):
         mapping = {
             "b": "Hex (BE)",
@@ -311,279 +1171,1183 @@ class HexViewerNativeSelection(tk.Tk):
             "d": "Decimal"
         }
         for key, interp in mapping.items():
-            self.bind_all(f"<KeyPress-{key}>", lambda e, it=interp: self.hotkey_save(it))
+            self.bind_all(f"<KeyPress-{key}>", lambda e, it=interp: self.hotkey_save(it, e))
             self.bind_all(f"<Control-KeyPress-{key}>", lambda e, it=interp: self.hotkey_save(it))
             self.bind_all(f"<Command-KeyPress-{key}>", lambda e, it=interp: self.hotkey_save(it))
-
-    def hotkey_save(self, interp_type):
+        for key, (le, be) in DECODER_HOTKEYS.items():
+            self.bind_all(f"<KeyPress-{key}>", lambda e, d=le: self.hotkey_decode(d, e))
+            self.bind_all(f"<Control-KeyPress-{key}>", lambda e, d=le: self.hotkey_decode(d))
+            self.bind_all(f"<Command-KeyPress-{key}>", lambda e, d=le: self.hotkey_decode(d))
+            self.bind_all(f"<Alt-KeyPress-{key}>", lambda e, d=be: self.hotkey_decode(d))
+        self.bind_all("<KeyPress-F8>", self.next_diff)
+        self.bind_all("<Shift-KeyPress-F8>", self.prev_diff)
+        self.bind_all("<KeyPress-F12>", lambda e: self.toggle_stats())
+        self.bind_all("<Control-KeyPress-w>", lambda e: self.close_tab())
+        self.bind_all("<Control-Tab>", lambda e: self.cycle_tabs(1))
+        self.bind_all("<Control-Shift-Tab>", lambda e: self.cycle_tabs(-1))
+        # X11 reports Shift+Tab as ISO_Left_Tab
+        if self.tk.call("tk", "windowingsystem") == "x11":
+            self.bind_all("<Control-ISO_Left_Tab>", lambda e: self.cycle_tabs(-1))
+
+    def _typing(self, event):
+        """True if a plain key press went to a text field, where it is text rather than a hotkey."""
+        if event is None or not hasattr(event.widget, "winfo_class"):
+            return False
+        widget = event.widget
+        widget_class = widget.winfo_class()
+        if widget_class not in TEXT_INPUT_CLASSES:
+            return False
+        if widget_class == "Text":
+            # The hex and ASCII columns are disabled; the offset column is for reading only
+            return widget is not self.offset_text and str(widget.cget("state")) == "normal"
+        return True
+
+    def hotkey_save(self, interp_type, event=None):
+        if self._typing(event):
+            return
         self.write_value(interp_type)
 
-    def open_file(self):
+    def hotkey_decode(self, decoder, event=None):
+        if self._typing(event):
+            return
+        self.write_decoded(decoder)
+
+    def open_search(self):
+        if self.search_panel is None:
+            self.search_panel = SearchPanel(self)
+        else:
+            self.search_panel.lift()
+
+    def open_scan(self):
+        if not self.file_path:
+            return
+        if self.scan_panel is None:
+            self.scan_panel = ScanPanel(self)
+        else:
+            self.scan_panel.lift()
+
+    def set_scan_index(self, index):
+        """Show the hits of ScanIndex `index` (None to clear) as the "scanned" tag layer."""
+        self.scan_index = index
+        self._apply_scan_tags()
+        if self.scan_panel is not None:
+            self.scan_panel.show(index)
+
+    def open_decoders(self):
+        if self.decoder_panel is None:
+            self.decoder_panel = DecoderPanel(self)
+        else:
+            self.decoder_panel.lift()
+
+    def open_templates(self):
+        if self.template_panel is None:
+            self.template_panel = TemplatePanel(self)
+        else:
+            self.template_panel.use_selection()
+            self.template_panel.lift()
+
+    def toggle_stats(self):
+        if self.stats_panel is None:
+            self.stats_panel = StatsPanel(self)
+        else:
+            self.stats_panel.close()
+
+    def perf_snapshot(self):
+        """perf.snapshot() plus the row cache statistics of the open file(s)."""
+        counters = {}
+        caches = [("row_cache", self.row_cache), ("compare_row_cache", self.compare_row_cache)]
+        for prefix, cache in caches:
+            if cache is not None:
+                for key, value in cache.stats().items():
+                    counters[f"{prefix}.{key}"] = value
+        for key, value in self.session.stats().items():
+            counters[f"session.{key}"] = value
+        return perf.snapshot(counters)
+
+    def open_file(self, raw=False):
+        """Open a file in a new tab; `raw` shows gzip/bzip2/xz files without decompressing them."""
         path = filedialog.askopenfilename()
         if not path:
             return
-        self.file_path = path
-        try:
-            with open(path, "rb") as f:
-                self.file_data = f.read()
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        existing = self.session.find(path, raw)
+        if existing is not None:
+            self.show_tab(existing)
+            return
+        # Timed from the dialog to the first rendered screen, load included
+        t0 = time.perf_counter()
+        # Only another file still loading is obsolete; the open ones stay in their tabs
+        self.cancel_jobs("load")
+
+        def loaded(data):
+            tab = self.session.add(path, raw)
+            self.session.attach(tab, data)
+            frame = tk.Frame(self.tab_bar, height=0)
+            self._tab_frames[tab] = frame
+            position = self.session.tabs.index(tab)
+            self.tab_bar.insert(position if position < len(self.tab_bar.tabs()) else "end", frame, text=tab.name)
+            self.show_tab(tab)
+            perf.record("open_file", time.perf_counter() - t0)
+
+        self._load_source(path, "load", loaded, raw)
+
+    def _load_source(self, path, kind, on_done, raw=False):
+        """
+        on_done(data source of `path`) with a reference of its own: at once if
+        the file is already open (in a tab or as the compare file), else after
+        opening it in the background.
+        """
+        shared = self.session.acquire(path, raw)
+        if shared is not None:
+            on_done(shared)
             return
+        self.start_job(lambda job: open_data_source(path, progress=job.set_progress, decompress=not raw),
+                       kind=kind, label="Loading",
+                       on_done=lambda data: on_done(self.session.register(path, data, raw)),
+                       on_discard=lambda data: data.close())
 
-        self.refresh_hex_view()
+    def export_range(self):
+        """
+        Write the selection (or the whole file) as a text dump in the current
+        grouping, with the loaded annotations as row markers, in the background.
+        """
+        if not self.file_path:
+            return
+        start, end = 0, len(self.file_data)
+        if self.select_start_offset is not None and self.select_end_offset is not None:
+            start = min(self.select_start_offset, self.select_end_offset)
+            end = max(self.select_start_offset, self.select_end_offset) + 1
+        out_path = filedialog.asksaveasfilename(defaultextension=".txt",
+                                                initialfile=os.path.basename(self.file_path) + ".dump.txt")
+        if not out_path:
+            return
+        data, path, index = self.file_data, self.file_path, self.annotations
+        group_size = self.grouping_size.get()
 
-    def refresh_hex_view(self):
-        self.offset_text.config(state="normal")
-        self.offset_text.delete("1.0", tk.END)
+        def work(job):
+            markers = annotation_markers(index, start, end, data) if index is not None else None
+            try:
+                with open(out_path, "wb") as f:
+                    return export_dump(data, f, start, end, group_size, markers, path=path,
+                                       progress=job.set_progress, check=job.check)
+            except BaseException:
+                # No half-written dump left behind on cancel or error
+                try:
+                    os.remove(out_path)
+                except OSError:
+                    pass
+                raise
+
+        def done(written):
+            self.show_status(f"Exported {end - start} bytes to {os.path.basename(out_path)} ({written} bytes)")
+            self.bell()
 
-        self.hex_text.config(state="normal")
-        self.hex_text.delete("1.0", tk.END)
+        self.start_job(work, kind="export", label="Exporting", on_done=done, source=data)
 
-        self.ascii_text.config(state="normal")
-        self.ascii_text.delete("1.0", tk.END)
+    def start_overview(self):
+        """Compute (or load from cache) the overview of the open file in the background."""
+        self.cancel_jobs("overview")
+        self.byte_overview = None
+        self._draw_overview()
+        data, path = self.file_data, self.file_path
 
-        self.group_info.clear()
+        def done(overview):
+            if data is self.file_data:
+                self.byte_overview = overview
+                self._draw_overview()
 
-        group_size = self.grouping_size.get()
-        bytes_per_line = 32
-        groups_per_line = bytes_per_line // group_size
-        data_len = len(self.file_data)
-
-        offset = 0
-        while offset < data_len:
-            line_offset = offset
-            line_bytes = self.file_data[offset : offset + bytes_per_line]
-            offset += bytes_per_line
-
-            # offset column
-            self.offset_text.insert(tk.END, f"{line_offset:08X}\n")
-
-            line_hex_str = []
-            ascii_str = []
-
-            for i in range(0, len(line_bytes)):
-                b = line_bytes[i]
-                if 32 <= b < 127:
-                    ascii_str.append(chr(b))
-                else:
-                    ascii_str.append(".")
-
-            # Remember where this line starts in hex_text
-            start_line_hex_idx = self.hex_text.index(tk.INSERT)
-            for i2 in range(groups_per_line):
-                group_off = line_offset + i2 * group_size
-                if group_off >= data_len:
-                    break
-                group_data = self.file_data[group_off : group_off+group_size]
-                hex_part = group_data.hex().upper()
-                line_hex_str.append(hex_part.ljust(group_size*2, " ") + " ")
+        self.start_job(lambda job: compute_overview(data, path, progress=job.set_progress, check=job.check),
+                       kind="overview", label="Overview", on_done=done,
+                       on_error=lambda e: self.show_status(f"Overview failed: {e}"))
 
-            # Insert one line into hex_text
-            self.hex_text.insert(tk.END, "".join(line_hex_str) + "\n")
-            end_line_hex_idx = self.hex_text.index(tk.INSERT)
+    @perf.timed("refresh_hex_view")
+    def refresh_hex_view(self):
+        """Re-render the visible window, e.g. after the grouping or the file changed."""
+        # Background rendering for the old grouping is obsolete
+        self.cancel_jobs("render")
+        self.scroll_to_row(self.top_row, force=True)
 
-            # Insert ASCII
-            self.ascii_text.insert(tk.END, "".join(ascii_str) + "\n")
+    # ===========================
+    # Background job plumbing
+    # ===========================
+    def start_job(self, work, kind="", label="", on_item=None, on_done=None,
+                  on_error=None, on_discard=None, source=None):
+        """
+        Run `work(job)` on a worker thread (see BackgroundJob).
+        on_item(item) runs on the UI thread for every posted item, then
+        on_done(result) or on_error(exception). If the job is cancelled, its
+        pending items are dropped and on_discard(result) gets a chance to
+        release whatever the worker produced. Data source `source`, if the
+        work reads one, stays open until the job has finished, even if its
+        tab is closed or evicted meanwhile.
+        """
+        job = BackgroundJob(work, kind=kind, label=label)
+        job.on_item = on_item
+        job.on_done = on_done
+        job.on_error = on_error or (lambda e: messagebox.showerror("Error", str(e)))
+        job.on_discard = on_discard
+        job.source = source if source is not None and self.session.retain(source) else None
+        self._jobs.append(job)
+        job.start()
+        if self._job_poll is None:
+            self._job_poll = self.after(JOB_POLL_MS, self._poll_jobs)
+        self._update_job_status()
+        return job
+
+    def show_status(self, message):
+        """Show `message` next to the job progress until the next one (or another file)."""
+        self._status_message = message
+        if not any(job.label for job in self._jobs):
+            self.status_label.config(text=message)
+
+    def cancel_jobs(self, kind=None):
+        """Cancel running jobs (all of them, or only those of `kind`, a kind or a tuple of kinds)."""
+        kinds = (kind,) if isinstance(kind, str) else kind
+        for job in self._jobs:
+            if kinds is None or job.kind in kinds:
+                job.cancel()
+
+    def _poll_jobs(self):
+        self._job_poll = None
+        for job in list(self._jobs):
+            # Read `done` before draining so nothing posted before it is missed
+            finished = job.done
+            items = job.drain()
+            if not job.cancelled and job.on_item:
+                for item in items:
+                    job.on_item(item)
+            if not finished:
+                continue
+            self._jobs.remove(job)
+            if job.cancelled:
+                if job.result is not None and job.on_discard:
+                    job.on_discard(job.result)
+            elif job.error is not None:
+                job.on_error(job.error)
+            elif job.on_done:
+                job.on_done(job.result)
+            if job.source is not None:
+                self.session.release(job.source)
+        self._update_job_status()
+        if self._jobs:
+            self._job_poll = self.after(JOB_POLL_MS, self._poll_jobs)
+
+    def _update_job_status(self):
+        """Show the newest labelled job's label and progress next to the Cancel button."""
+        labelled = [job for job in self._jobs if job.label]
+        if not labelled:
+            self.status_label.config(text=self._status_message)
+            self.progress_bar.stop()
+            self.progress_bar.config(mode="determinate", value=0)
+            self.cancel_btn.config(state="disabled")
+            return
+        job = labelled[-1]
+        self.cancel_btn.config(state="normal")
+        done, total = job.progress or (0, None)
+        if total:
+            self.progress_bar.stop()
+            self.progress_bar.config(mode="determinate", value=min(1.0, done / total))
+            self.status_label.config(text=f"{job.label} {100 * done // total}%")
+        else:
+            if str(self.progress_bar.cget("mode")) != "indeterminate":
+                self.progress_bar.config(mode="indeterminate")
+                self.progress_bar.start()
+            self.status_label.config(text=f"{job.label} {done // 1024} KB" if done else job.label)
 
-            # Now divide this line into groups and record indices
-            base_hex_start = self._index_to_int(start_line_hex_idx)
-            base_hex_start = self._index_to_int(start_line_hex_idx)
+    # ===========================
+    # Virtualized viewport
+    # ===========================
+    def _total_rows(self):
+        size = len(self.file_data)
+        if self.compare_data is not None:
+            size = max(size, len(self.compare_data))
+        return (size + BYTES_PER_LINE - 1) // BYTES_PER_LINE
+
+    def _visible_rows(self):
+        """How many rows fit into hex_text at the current font size."""
+        linespace = tkfont.Font(font=self.hex_text.cget("font")).metrics("linespace")
+        return max(1, self.hex_text.winfo_height() // max(1, linespace))
+
+    @perf.timed("scroll_to_row")
+    def scroll_to_row(self, row, force=False):
+        """Show `row` at the top of the three text widgets, re-rendering only if needed."""
+        visible = self._visible_rows()
+        total = self._total_rows()
+        row = max(0, min(row, total - visible))
+        self.top_row = row
+
+        rendered_end = self.render_first_row + self.render_row_count
+        covered = (self.render_first_row <= row and
+                   min(row + visible, total) <= rendered_end)
+        if force or not covered:
+            self._render_window()
+        else:
+            self._sync_text_view()
+        self._update_scrollbar()
 
-            # Instead of float(...) - do:
-            line_str = start_line_hex_idx.split('.')[0]
-            line_num = int(line_str)
-            ascii_line_index_str = f"{line_num}.0"
-            ascii_line_start = self.ascii_text.index(ascii_line_index_str)
-            base_ascii_start = self._index_to_int(ascii_line_start)
+    def scroll_rows(self, step):
+        self.scroll_to_row(self.top_row + step)
 
+    def _on_yscroll(self, *args):
+        """Scrollbar command: ("moveto", fraction) or ("scroll", n, "units"|"pages")."""
+        if not args:
+            return
+        if args[0] == "moveto":
+            row = int(float(args[1]) * self._total_rows())
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            if args[2] == "pages":
+                amount *= max(1, self._visible_rows() - 1)
+            row = self.top_row + amount
+        else:
+            return
+        self.scroll_to_row(row)
 
-            current_hex_pos = 0
-            current_ascii_pos = 0
+    def _on_view_resize(self, event):
+        self.scroll_to_row(self.top_row, force=True)
 
-            for i2 in range(groups_per_line):
-                group_off = line_offset + i2 * group_size
-                if group_off >= data_len:
-                    break
-                group_data = self.file_data[group_off : group_off+group_size]
-                hex_part = group_data.hex().upper()
-                
-                displayed_length = (group_size * 2) + 1  # +1 for space
-                
-                start_hex_idx = self._int_to_index(base_hex_start + current_hex_pos)
-                end_hex_idx   = self._int_to_index(base_hex_start + current_hex_pos + displayed_length)
-
-                ascii_start_idx = self._int_to_index(base_ascii_start + current_ascii_pos)
-                ascii_end_idx   = self._int_to_index(base_ascii_start + current_ascii_pos + len(group_data))
-
-                self.group_info.append((
-                    start_hex_idx,
-                    end_hex_idx,
-                    ascii_start_idx,
-                    ascii_end_idx,
-                    group_off,
-                    hex_part
-                ))
-
-                current_hex_pos += displayed_length
-                current_ascii_pos += len(group_data)
-
-        self.offset_text.config(state="disabled")
-        self.hex_text.config(state="disabled")
-        self.ascii_text.config(state="disabled")
-
-    def _index_to_int(self, idx_str):
-        line, col = idx_str.split(".")
-        return int(line)*10000 + int(col)
-
-    def _int_to_index(self, val):
-        line = val // 10000
-        col  = val % 10000
-        return f"{line}.{col}"
-
-    def update_interpretations(self, selected_bytes):
-        if not selected_bytes:
-            self.clear_interpretations()
+    def _update_scrollbar(self):
+        total = self._total_rows()
+        if total == 0:
+            self.y_scroll.set(0.0, 1.0)
             return
+        first = self.top_row / total
+        last = min(1.0, (self.top_row + self._visible_rows()) / total)
+        self.y_scroll.set(first, last)
+        self._draw_overview_viewport(first, last)
 
-        hex_be = "0x" + selected_bytes.hex().upper()
-        hex_le = "0x" + selected_bytes[::-1].hex().upper()
-        self.selected_hex_be = hex_be
-        self.selected_hex_le = hex_le
+    # ===========================
+    # Overview strip
+    # ===========================
+    @staticmethod
+    def _overview_color(entropy, zeros, printable, high):
+        """Strip colour of a block: black zero fill, red random-looking data, green text, blue the rest."""
+        if zeros >= 230:
+            return "#000000"
+        if entropy >= 230:  # above ~7.2 bits per byte: compressed or encrypted
+            return "#e03030"
+        level = 60 + entropy * 195 // 255
+        if printable >= 180:
+            return f"#20{level:02x}20"
+        return f"#2020{level:02x}"
+
+    def _draw_overview(self):
+        canvas = self.overview_canvas
+        canvas.delete("all")
+        overview = self.byte_overview
+        height = canvas.winfo_height()
+        if overview is None or not len(overview) or height <= 1:
+            return
+        count = len(overview)
+        # One rectangle per pixel row (or per block if there are fewer blocks than pixels);
+        # each shows its busiest block so short high-entropy runs stay visible
+        slots = min(height, count)
+        for slot in range(slots):
+            first = slot * count // slots
+            last = max(first + 1, (slot + 1) * count // slots)
+            block = max(range(first, last), key=lambda i: overview.entropy[i])
+            y0 = slot * height // slots
+            y1 = (slot + 1) * height // slots
+            canvas.create_rectangle(0, y0, OVERVIEW_WIDTH, y1, width=0,
+                                    fill=self._overview_color(*overview.block(block)))
+        total = self._total_rows()
+        if total:
+            self._draw_overview_viewport(self.top_row / total,
+                                         min(1.0, (self.top_row + self._visible_rows()) / total))
+
+    def _draw_overview_viewport(self, first, last):
+        """Outline the part of the file currently on screen."""
+        canvas = self.overview_canvas
+        canvas.delete("viewport")
+        if self.byte_overview is None:
+            return
+        height = canvas.winfo_height()
+        y0 = int(first * height)
+        y1 = max(y0 + 2, int(last * height))
+        canvas.create_rectangle(1, y0, OVERVIEW_WIDTH - 1, y1, outline="white", tags="viewport")
+
+    def _on_overview_click(self, event):
+        """Jump so that the clicked part of the file is in the middle of the view."""
+        height = self.overview_canvas.winfo_height()
+        if height <= 1 or not len(self.file_data):
+            return
+        fraction = max(0.0, min(1.0, event.y / height))
+        row = int(fraction * self._total_rows())
+        self.scroll_to_row(row - self._visible_rows() // 2)
+
+    def _sync_text_view(self):
+        """Scroll the rendered window so that top_row is the first visible line."""
+        line = f"{self.top_row - self.render_first_row + 1}.0"
+        self.offset_text.yview(line)
+        self.hex_text.yview(line)
+        self.ascii_text.yview(line)
+        if self.compare_data is not None:
+            self.compare_hex_text.yview(line)
+            self.compare_ascii_text.yview(line)
+
+    def _render_window(self):
+        """Format and insert only the rows around top_row (visible rows plus overscan)."""
+        group_size = self.grouping_size.get()
+        total = self._total_rows()
+        first_row = max(0, self.top_row - VIEW_OVERSCAN_ROWS)
+        last_row = min(total, self.top_row + self._visible_rows() + VIEW_OVERSCAN_ROWS)
+
+        if self.layout.group_size != group_size:
+            self.layout = RowLayout(group_size)
+
+        # Pages visited before (at this grouping) come straight from the cache
+        t0 = time.perf_counter()
+        offset_lines, hex_lines, ascii_lines = self.row_cache.rows(first_row, last_row, group_size)
+
+        self.render_first_row = first_row
+        self.render_row_count = last_row - first_row
+
+        columns = [(self.offset_text, offset_lines),
+                   (self.hex_text, hex_lines),
+                   (self.ascii_text, ascii_lines)]
+        if self.compare_data is not None:
+            compare_offsets, compare_hex, compare_ascii = self.compare_row_cache.rows(first_row, last_row,
+                                                                                      group_size)
+            if len(compare_offsets) > len(offset_lines):
+                # The second file is longer: its rows need offsets too
+                columns[0] = (self.offset_text, compare_offsets)
+            columns += [(self.compare_hex_text, compare_hex), (self.compare_ascii_text, compare_ascii)]
+        t1 = time.perf_counter()
+
+        # One insert per widget instead of one per row
+        for widget, lines in columns:
+            widget.config(state="normal")
+            widget.delete("1.0", tk.END)
+            widget.insert("1.0", "\n".join(lines))
+            widget.config(state="disabled")
+        # The old tags went away with the old text
+        self._highlight_span = None
+        t2 = time.perf_counter()
+
+        self._apply_scan_tags()
+        self._apply_parsed_tags()
+        self._apply_diff_tags()
+        self._update_highlight()
+        self._sync_text_view()
+        t3 = time.perf_counter()
+        perf.record("render.rows", t1 - t0)
+        perf.record("render.insert", t2 - t1)
+        perf.record("render.tags", t3 - t2)
+        perf.count("render.rows_rendered", last_row - first_row)
+        self._start_readahead(first_row, last_row)
+
+    def _start_readahead(self, first_row, last_row):
+        """Format the pages either side of the rendered window in the background."""
+        self.cancel_jobs("render")
+        group_size = self.grouping_size.get()
+        caches = [self.row_cache]
+        if self.compare_row_cache is not None:
+            caches.append(self.compare_row_cache)
 
-        if len(selected_bytes) >= 2:
-            signed16 = str(int.from_bytes(selected_bytes[:2], byteorder="little", signed=True))
-        else:
-            signed16 = ""
+        def work(job):
+            for cache in caches:
+                cache.prefetch(first_row, last_row, group_size, check=job.check)
 
-        if len(selected_bytes) >= 4:
-            try:
-                float32 = str(struct.unpack("<f", selected_bytes[:4])[0])
-            except Exception:
-                float32 = ""
-        else:
-            float32 = ""
+        # No label: read-ahead is not worth a progress display or the Cancel button
+        self.start_job(work, kind="render", on_error=lambda e: None)
 
-        decimal_val = str(int.from_bytes(selected_bytes, byteorder="little", signed=False))
+    def update_interpretations(self, interpretation):
+        """Show previews of a SelectionInterpretation; expensive values follow from a background job."""
+        self.cancel_jobs("interp")
+        if not len(interpretation):
+            self.clear_interpretations()
+            return
+        self.interpretation = interpretation
+        for itype in self.interp_types:
+            text = interpretation.preview(itype)
+            if text is not None:
+                self._show_interpretation(itype, text)
+            elif interpretation.deferred(itype):
+                self._show_interpretation(itype, f"(click to compute, {len(interpretation)} bytes)")
+            else:
+                self._show_interpretation(itype, "(computing...)")
+                self._compute_interpretation(itype)
+        if self.decoder_panel is not None:
+            self.decoder_panel.refresh()
 
-        self.interp_entries["Hex (BE)"].delete(0, tk.END)
-        self.interp_entries["Hex (BE)"].insert(0, hex_be)
-        self.interp_entries["Hex (LE)"].delete(0, tk.END)
-        self.interp_entries["Hex (LE)"].insert(0, hex_le)
-        self.interp_entries["SignedInt16"].delete(0, tk.END)
-        self.interp_entries["SignedInt16"].insert(0, signed16)
-        self.interp_entries["Float32"].delete(0, tk.END)
-        self.interp_entries["Float32"].insert(0, float32)
-        self.interp_entries["Decimal"].delete(0, tk.END)
-        self.interp_entries["Decimal"].insert(0, decimal_val)
+    def _show_interpretation(self, itype, text):
+        self.interp_entries[itype].delete(0, tk.END)
+        self.interp_entries[itype].insert(0, text)
+        self._interp_shown[itype] = text
 
     def clear_interpretations(self):
+        self.cancel_jobs("interp")
+        self.interpretation = None
+        self._interp_shown = {}
         for itype in self.interp_types:
             self.interp_entries[itype].delete(0, tk.END)
+        if self.decoder_panel is not None:
+            self.decoder_panel.refresh()
+
+    def _compute_interpretation(self, itype, then=None):
+        """Compute the full value of `itype` off the UI thread, then show it and call then(value)."""
+        interpretation = self.interpretation
+
+        def done(value):
+            if interpretation is self.interpretation:
+                self._show_interpretation(itype, interpretation.preview(itype))
+            if then:
+                then(value)
+
+        # Display-only jobs are dropped with the selection (or file); a pending save or copy is not
+        self.start_job(lambda job: interpretation.full(itype, check=job.check),
+                       kind="interp" if then is None else "interp-save",
+                       label=f"Computing {itype}", on_done=done,
+                       source=interpretation.data if then is not None else None)
+
+    def request_interpretation(self, itype):
+        """A field was focused: compute its value if that was put off."""
+        interpretation = self.interpretation
+        if interpretation is not None and not interpretation.computed(itype) \
+                and self._interp_shown.get(itype, "").startswith("(click"):
+            self._show_interpretation(itype, "(computing...)")
+            self._compute_interpretation(itype)
+
+    def _with_full_value(self, itype, callback):
+        """
+        Call callback(text) with what the field stands for: the full value when
+        it shows a preview, or the field's text if the user edited it.
+        """
+        text = self.interp_entries[itype].get().strip()
+        interpretation = self.interpretation
+        if interpretation is None or text != self._interp_shown.get(itype, "").strip():
+            callback(text)
+        elif interpretation.computed(itype):
+            callback(interpretation.full(itype))
+        else:
+            self._show_interpretation(itype, "(computing...)")
+            self._compute_interpretation(itype, then=callback)
+
+    def copy_value(self, interp_type):
+        def copy(text):
+            self.clipboard_clear()
+            self.clipboard_append(text)
+        self._with_full_value(interp_type, copy)
 
+    @perf.timed("write_value")
     def write_value(self, interp_type):
-        raw_value = self.selected_hex_be
-        interp_text = self.interp_entries[interp_type].get().strip()
-        line = f"|{self.current_offset:08X}|{raw_value}|{interp_type}|{interp_text}|"
-        
-        if self.file_path:
-            base = os.path.basename(self.file_path)
-            out_path = os.path.join(os.path.dirname(self.file_path), base + ".txt")
-        else:
+        interpretation = self.interpretation
+        offset = self.current_offset
+        raw_value = interpretation.full("Hex (BE)") if interpretation is not None else ""
+        # The value may still be computing when another tab is shown
+        target = self._save_target()
+        self._with_full_value(interp_type, lambda interp_text: self._save_annotation(
+            format_annotation_line(offset, raw_value, interp_type, interp_text), target))
+
+    def write_decoded(self, decoder):
+        """Save the whole selection decoded as an array of `decoder` values."""
+        interpretation = self.interpretation
+        if interpretation is None:
+            return
+        offset = self.current_offset
+        target = self._save_target()
+
+        def work(job):
+            return interpretation.full("Hex (BE)"), interpretation.decoded(decoder)
+
+        def done(result):
+            raw_value, values = result
+            if values:
+                self._save_annotation(format_annotation_line(offset, raw_value, decoder, values), target)
+
+        self.start_job(work, kind="interp-save", label=f"Decoding {decoder}", on_done=done,
+                       source=interpretation.data)
+
+    def _save_target(self):
+        """
+        (parser file, data source, FileTab) of the file shown now, for a save
+        that may complete after another tab has been shown.
+        """
+        return self._parser_path(), self.file_data, self.session.active
+
+    def _save_annotation(self, line, target=None):
+        """
+        Queue `line` in the parser file of `target` (see _save_target; default:
+        the shown file) and highlight it if it matches that file.
+        """
+        out_path, data, tab = target or self._save_target()
+        if out_path is None:
             out_path = filedialog.asksaveasfilename(defaultextension=".txt")
         if not out_path:
             return
         try:
-            with open(out_path, "a", encoding="utf-8") as f:
-                f.write(line + "\n")
+            writer = self._annotation_writer(out_path)
+            if not writer.write(line):
+                # Exact duplicate of a line already saved
+                return
+            perf.count("annotations.saved")
             self.bell()
         except Exception as e:
             messagebox.showerror("Error", str(e))
+            return
+        self._schedule_flush()
 
-    def open_parser(self):
-        """Works similarly to v1.3, but remember we're manually highlighting."""
+        # Show the new entry right away without re-running open_parser
+        entry = parse_annotation_line(line)
+        if entry is not None and tab is not None:
+            offset, length, logged = entry[:3]
+            if annotation_matches(data, offset, length, logged):
+                self._add_session_ranges(tab, [(offset, offset + length)])
+
+    def save_annotations(self, lines, ranges, target=None):
+        """
+        Append many parser lines at once (e.g. from a template) to the parser
+        file of `target` (see _save_target; default: the shown file) and
+        highlight `ranges`. Returns the number of new lines.
+        """
+        out_path, _, tab = target or self._save_target()
+        if out_path is None:
+            return 0
+        try:
+            added = self._annotation_writer(out_path).write_many(lines)
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+            return 0
+        self._schedule_flush()
+        self._add_session_ranges(tab, ranges)
+        return added
+
+    def _add_session_ranges(self, tab, ranges):
+        """Highlight saved `ranges` in `tab`: now if it is shown, else when it is shown again."""
+        if tab is self.session.active:
+            self.session_ranges = merge_ranges(self.session_ranges + list(ranges))
+            self._apply_parsed_tags()
+        elif tab in self.session.tabs:
+            tab.session_ranges = merge_ranges(tab.session_ranges + list(ranges))
+
+    def _parser_path(self):
+        """Default parser file for the open file: <file>.txt next to it."""
         if not self.file_path:
+            return None
+        return os.path.join(os.path.dirname(self.file_path),
+                            os.path.basename(self.file_path) + ".txt")
+
+    def _annotation_writer(self, path):
+        if self.annotation_writer is None or self.annotation_writer.path != path:
+            self._close_annotation_writer()
+            self.annotation_writer = AnnotationWriter(path)
+        return self.annotation_writer
+
+    def _schedule_flush(self):
+        """Flush the annotation writer once no new line arrived for a while."""
+        if self._flush_job is not None:
+            self.after_cancel(self._flush_job)
+        self._flush_job = self.after(ANNOTATION_FLUSH_IDLE_MS, self.flush_annotations)
+
+    def flush_annotations(self, sync=False):
+        self._flush_job = None
+        if self.annotation_writer is None:
             return
-        parser_path = os.path.join(os.path.dirname(self.file_path),
-                                   os.path.basename(self.file_path) + ".txt")
-        if not os.path.exists(parser_path):
-            parser_path = filedialog.askopenfilename(title="Open Parser File", filetypes=[("Text Files", "*.txt")])
-            if not parser_path:
-                return
-        print(f"Parsing {parser_path} ...")
         try:
-            with open(parser_path, "r", encoding="utf-8") as f:
-                lines = f.readlines()
+            self.annotation_writer.flush(sync=sync)
         except Exception as e:
             messagebox.showerror("Error", str(e))
+
+    def _close_annotation_writer(self):
+        if self._flush_job is not None:
+            self.after_cancel(self._flush_job)
+            self._flush_job = None
+        if self.annotation_writer is None:
             return
+        try:
+            self.annotation_writer.close()
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+        self.annotation_writer = None
 
-        self.hex_text.config(state="normal")
-        self.ascii_text.config(state="normal")
+    def on_close(self):
+        """Window closed: save queued annotations and stop background work."""
+        self._close_annotation_writer()
+        self.cancel_jobs()
+        self.end_compare(refresh=False)
+        self.session.close_all()
+        self.destroy()
 
-        self.hex_text.tag_remove("parsed", "1.0", tk.END)
-        self.ascii_text.tag_remove("parsed", "1.0", tk.END)
+    # ===========================
+    # Tabs
+    # ===========================
+    def show_tab(self, tab):
+        """
+        Show FileTab `tab`: save the view of the file shown so far into its tab,
+        then restore `tab`'s, reopening whatever was evicted while it was idle.
+        """
+        current = self.session.active
+        if tab is current:
+            return
+        if current is not None and current.loaded:
+            # A tab still reopening is not on screen yet; its saved view stays as it was
+            self._store_tab(current)
+        self._leave_file()
+        self.session.activate(tab)
+        self.tab_bar.select(self._tab_frames[tab])
+        if tab.loaded:
+            self._restore_tab(tab)
+            self.session.trim()
+            return
 
-        for line in lines:
-            line = line.strip()
-            if not line.startswith("|"):
-                continue
-            parts = line.split("|")
-            if len(parts) < 4:
-                continue
-            # offset_str = parts[1], data_str = parts[2], data_type = parts[3]
-            offset_str = parts[1].strip()
-            data_str   = parts[2].strip()
-            data_type  = parts[3].strip()
+        def reloaded(data):
+            if tab is not self.session.active or tab not in self.session.tabs:
+                self.session.release(data)
+                return
+            self.session.attach(tab, data)
+            self._restore_tab(tab)
+            self.session.trim()
+
+        # Show nothing while it reopens: trimming may close the source that was on screen
+        self._show_empty()
+        self._load_source(tab.path, "load", reloaded, tab.raw)
+
+    def _store_tab(self, tab):
+        tab.top_row = self.top_row
+        tab.select_start_offset = self.select_start_offset
+        tab.select_end_offset = self.select_end_offset
+        tab.annotations = self.annotations
+        tab.parser_report = self.parser_report
+        tab.session_ranges = self.session_ranges
+        tab.overview = self.byte_overview
+        tab.scan_index = self.scan_index
+
+    def _leave_file(self):
+        """Stop everything tied to the shown file before another one is shown."""
+        self.cancel_jobs(VIEW_JOB_KINDS)
+        self.show_status("")
+        if self._follow_job is not None:
+            self.after_cancel(self._follow_job)
+            self._follow_job = None
+        self.follow.set(False)
+        self.end_compare(refresh=False)
+        self._close_annotation_writer()
+        if self.search_panel is not None:
+            self.search_panel.clear()
+        if self.scan_panel is not None:
+            self.scan_panel.stop_scan()
+        # The old interpretation reads from the file being left
+        self.clear_interpretations()
+
+    def _restore_tab(self, tab):
+        self._show_file(tab.data, tab.path, tab.row_cache)
+        self.top_row = tab.top_row
+        self.select_start_offset = tab.select_start_offset
+        self.select_end_offset = tab.select_end_offset
+        self.annotations = tab.annotations
+        self.parser_report = tab.parser_report
+        self.session_ranges = tab.session_ranges
+        self.byte_overview = tab.overview
+        self.set_scan_index(tab.scan_index)
+        self.refresh_hex_view()
+        if self.byte_overview is None:
+            self.start_overview()
+        else:
+            self._draw_overview()
+        if tab.parser_path is not None and self.annotations is None:
+            # Evicted while idle: load it again (from its saved index), quietly
+            self._load_parser(tab.parser_path, report=False)
+        self._interpret_selection()
 
-            try:
-                offset_int = int(offset_str, 16)
-            except:
-                continue
+    def _show_file(self, data, path, row_cache):
+        """Reset the view to file `data` (at the top, nothing selected or annotated)."""
+        self.file_data = data
+        self.file_path = path
+        self.row_cache = row_cache
+        self.top_row = 0
+        self.select_start_offset = None
+        self.select_end_offset = None
+        self._highlight_span = None
+        self.annotations = None
+        self.parser_report = None
+        self.session_ranges = []
+        self.byte_overview = None
+        self.set_scan_index(None)
+
+    def close_tab(self, tab=None):
+        """Close `tab` (default: the shown one) and show its neighbour."""
+        tab = tab or self.session.active
+        if tab is None:
+            return
+        was_active = tab is self.session.active
+        if was_active:
+            self._leave_file()
+        frame = self._tab_frames.pop(tab)
+        self.tab_bar.forget(frame)
+        frame.destroy()
+        following = self.session.close(tab)
+        if not was_active:
+            return
+        if following is not None:
+            self.show_tab(following)
+        else:
+            self._show_empty()
 
-            if data_type in ["SignedInt16"]:
-                expected_bytes = 2
-            elif data_type in ["Float32"]:
-                expected_bytes = 4
-            else:
-                if data_str.lower().startswith("0x"):
-                    hex_val = data_str[2:]
-                else:
-                    hex_val = data_str
-                expected_bytes = len(hex_val)//2
-
-            # Get bytes from file_data
-            if offset_int >= len(self.file_data):
-                continue
-            end_off = offset_int + expected_bytes
-            if end_off > len(self.file_data):
-                end_off = len(self.file_data)
-            actual_bytes = self.file_data[offset_int:end_off]
+    def _show_empty(self):
+        empty = BytesDataSource()
+        self._show_file(empty, None, RowPageCache(empty, self.row_cache_bytes))
+        self.refresh_hex_view()
+        self._draw_overview()
+
+    def cycle_tabs(self, step):
+        tabs = self.session.tabs
+        if len(tabs) > 1 and self.session.active in tabs:
+            self.show_tab(tabs[(tabs.index(self.session.active) + step) % len(tabs)])
+        return "break"
+
+    def _tab_at(self, widget_name):
+        for tab, frame in self._tab_frames.items():
+            if str(frame) == widget_name:
+                return tab
+        return None
+
+    def _on_tab_changed(self, event):
+        # Also fires for selections made by show_tab itself; those are already shown
+        tab = self._tab_at(self.tab_bar.select())
+        if tab is not None and tab is not self.session.active:
+            self.show_tab(tab)
 
-            if data_str.lower().startswith("0x"):
-                expected_data = data_str[2:].upper()
+    def _on_tab_middle_click(self, event):
+        try:
+            index = self.tab_bar.index(f"@{event.x},{event.y}")
+        except tk.TclError:
+            return
+        self.close_tab(self._tab_at(self.tab_bar.tabs()[index]))
+
+    # ===========================
+    # Follow mode
+    # ===========================
+    def toggle_follow(self):
+        if self._follow_job is not None:
+            self.after_cancel(self._follow_job)
+            self._follow_job = None
+        if self.follow.get():
+            self.scroll_to_row(self._total_rows())
+            self._follow_job = self.after(FOLLOW_POLL_MS, self._poll_follow)
+        elif self.file_path:
+            # The overview was left as it was while following
+            self.start_overview()
+
+    def _poll_follow(self):
+        self._follow_job = None
+        if not self.follow.get():
+            return
+        old_size = len(self.file_data)
+        try:
+            added = self.file_data.refresh()
+        except OSError:
+            added = 0
+        if added > 0:
+            self._on_appended(old_size)
+        elif added < 0:
+            # Truncated or rewritten: start over
+            self.row_cache.clear()
+            self.refresh_hex_view()
+        self._follow_job = self.after(FOLLOW_POLL_MS, self._poll_follow)
+
+    def _on_appended(self, old_size):
+        """
+        The file grew from old_size bytes: render only the new rows (re-rendering
+        a partly filled old last row), stay at the end if the view was there,
+        and tag annotations only in the new range.
+        """
+        if self.compare_data is not None:
+            # Both panes and the diff are out of date
+            self.refresh_hex_view()
+            self.start_diff()
+            return
+        visible = self._visible_rows()
+        old_rows = (old_size + BYTES_PER_LINE - 1) // BYTES_PER_LINE
+        pinned = self.top_row + visible >= old_rows
+        total = self._total_rows()
+        first_new = old_size // BYTES_PER_LINE
+        rendered_end = self.render_first_row + self.render_row_count
+
+        if pinned:
+            last = total
+            if total - visible - VIEW_OVERSCAN_ROWS > rendered_end:
+                # Too much arrived to append to the rendered window
+                self.scroll_to_row(total, force=True)
+                return
+        else:
+            last = min(total, self.top_row + visible + VIEW_OVERSCAN_ROWS)
+        if rendered_end < first_new or last <= first_new:
+            # The old end is not rendered, so nothing on screen changes
+            self._update_scrollbar()
+            return
+
+        self._replace_rows(first_new, last)
+        if pinned:
+            self.top_row = max(0, total - visible)
+            self._trim_rows()
+        self._apply_scan_tags(first_new * BYTES_PER_LINE, last * BYTES_PER_LINE)
+        self._apply_parsed_tags(first_new * BYTES_PER_LINE, last * BYTES_PER_LINE)
+        self._update_highlight()
+        self._sync_text_view()
+        self._update_scrollbar()
+
+    def _replace_rows(self, first_row, last_row):
+        """Render rows [first_row, last_row) in place of the rendered rows from first_row on."""
+        # The cache reformats the page that held the old, shorter end of the file
+        offset_lines, hex_lines, ascii_lines = self.row_cache.rows(first_row, last_row, self.layout.group_size)
+        line = first_row - self.render_first_row + 1
+        for widget, lines in ((self.offset_text, offset_lines),
+                              (self.hex_text, hex_lines),
+                              (self.ascii_text, ascii_lines)):
+            widget.config(state="normal")
+            if line <= self.render_row_count:
+                widget.delete(f"{line}.0", "end-1c")
+                widget.insert(f"{line}.0", "\n".join(lines))
             else:
-                expected_data = data_str.upper()
+                widget.insert("end-1c", ("\n" if self.render_row_count else "") + "\n".join(lines))
+            widget.config(state="disabled")
+        self.render_row_count = last_row - self.render_first_row
+        self._clip_highlight_span(0, first_row * BYTES_PER_LINE)
+
+    def _trim_rows(self):
+        """Drop rendered rows far above top_row, in batches, so following never grows the window."""
+        excess = self.top_row - VIEW_OVERSCAN_ROWS - self.render_first_row
+        if excess < VIEW_OVERSCAN_ROWS:
+            return
+        for widget in (self.offset_text, self.hex_text, self.ascii_text):
+            widget.config(state="normal")
+            widget.delete("1.0", f"{excess + 1}.0")
+            widget.config(state="disabled")
+        self.render_first_row += excess
+        self.render_row_count -= excess
+        self._clip_highlight_span(self.render_first_row * BYTES_PER_LINE, len(self.file_data))
+
+    def _clip_highlight_span(self, start, end):
+        """Rows outside [start, end) lost their text, and with it their highlight tags."""
+        if self._highlight_span is None:
+            return
+        span = (max(start, self._highlight_span[0]), min(end, self._highlight_span[1]))
+        self._highlight_span = span if span[0] < span[1] else None
 
-            actual_hex = actual_bytes.hex().upper()
+    # ===========================
+    # Compare mode
+    # ===========================
+    def toggle_compare(self):
+        if self.compare_data is not None:
+            self.end_compare()
+            return
+        if not self.file_path:
+            return
+        path = filedialog.askopenfilename(title="Compare With")
+        if not path:
+            return
 
-            if actual_hex != expected_data:
-                continue
-            
-            # Highlight in hex_text / ascii_text
-            # Find groups in self.group_info within [offset_int, offset_int+expected_bytes)
-            start_off = offset_int
-            end_off   = offset_int + expected_bytes - 1
+        def loaded(data):
+            self.end_compare(refresh=False)
+            self.compare_data = data
+            self.compare_path = path
+            self.compare_row_cache = RowPageCache(data, self.row_cache_bytes)
+            self.compare_btn.config(text="End Compare")
+            self.compare_hex_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+            self.compare_ascii_text.pack(side=tk.LEFT, fill=tk.BOTH)
+            self.refresh_hex_view()
+            self.start_diff()
+
+        self._load_source(path, "compare", loaded)
+
+    def start_diff(self):
+        """Compare file_data with compare_data in the background, then tag the differences."""
+        self.cancel_jobs("diff")
+        self.diff = None
+        self._apply_diff_tags()
+        a, b = self.file_data, self.compare_data
+        self.diff_label.config(text="Comparing...")
+
+        def done(result):
+            if a is not self.file_data or b is not self.compare_data:
+                return
+            self.diff = result
+            self.diff_label.config(text=f"{os.path.basename(self.compare_path)}: {result.summary()}")
+            self._apply_diff_tags()
+
+        self.start_job(lambda job: diff_data(a, b, progress=job.set_progress, check=job.check),
+                       kind="diff", label="Comparing", on_done=done)
+
+    def end_compare(self, refresh=True):
+        self.cancel_jobs("diff")
+        if self.compare_data is None:
+            return
+        # The compare file may be open in a tab too
+        self.session.release(self.compare_data)
+        self.compare_data = None
+        self.compare_path = None
+        self.compare_row_cache = None
+        self.diff = None
+        self.compare_btn.config(text="Compare...")
+        self.diff_label.config(text="")
+        self.compare_hex_text.pack_forget()
+        self.compare_ascii_text.pack_forget()
+        if refresh:
+            self.refresh_hex_view()
+
+    def _apply_diff_tags(self):
+        """Tag the differing ranges of the rendered window in both files."""
+        widgets = (self.hex_text, self.ascii_text, self.compare_hex_text, self.compare_ascii_text)
+        for widget in widgets:
+            widget.tag_remove("diff", "1.0", tk.END)
+        if self.diff is None:
+            return
+        window_start = self.render_first_row * BYTES_PER_LINE
+        window_end = (self.render_first_row + self.render_row_count) * BYTES_PER_LINE
+        for start, end in self.diff.ranges_between(window_start, window_end):
+            for hstart, hend, astart, aend in self._row_spans(start, end):
+                self.hex_text.tag_add("diff", hstart, hend)
+                self.ascii_text.tag_add("diff", astart, aend)
+            for hstart, hend, astart, aend in self._row_spans(start, end, size=len(self.compare_data)):
+                self.compare_hex_text.tag_add("diff", hstart, hend)
+                self.compare_ascii_text.tag_add("diff", astart, aend)
+
+    def _diff_anchor(self):
+        """Offset the diff navigation starts from: the selection, else the top of the view."""
+        if self.select_start_offset is not None and self.select_end_offset is not None:
+            return min(self.select_start_offset, self.select_end_offset)
+        return self.top_row * BYTES_PER_LINE
+
+    def next_diff(self, event=None):
+        if self.diff is None:
+            return
+        found = self.diff.next_after(self._diff_anchor())
+        if found is None:
+            self.bell()
+            return
+        self.select_range(found[0], found[1] - 1)
+
+    def prev_diff(self, event=None):
+        if self.diff is None:
+            return
+        found = self.diff.prev_before(self._diff_anchor())
+        if found is None:
+            self.bell()
+            return
+        self.select_range(found[0], found[1] - 1)
 
-            for gstart_idx, gend_idx, astart_idx, aend_idx, ofile, hstr in self.group_info:
-                if start_off <= ofile <= end_off:
-                    self.hex_text.tag_add("parsed", gstart_idx, gend_idx)
-                    self.ascii_text.tag_add("parsed", astart_idx, aend_idx)
+    def open_parser(self):
+        """Works similarly to v1.3, but remember we're manually highlighting."""
+        if not self.file_path:
+            return
+        # The parser file must contain everything saved so far
+        self.flush_annotations(sync=True)
+        parser_path = self._parser_path()
+        if not os.path.exists(parser_path):
+            parser_path = filedialog.askopenfilename(title="Open Parser File", filetypes=[("Text Files", "*.txt")])
+            if not parser_path:
+                return
+        self._load_parser(parser_path)
 
-        self.hex_text.tag_config("parsed", foreground="lightblue")
-        self.ascii_text.tag_config("parsed", foreground="lightblue")
+    def _load_parser(self, parser_path, report=True):
+        """Index and verify `parser_path` in the background, then tag the matches."""
+        data = self.file_data
+        tab = self.session.active
+        t0 = time.perf_counter()
 
-        self.hex_text.config(state="disabled")
-        self.ascii_text.config(state="disabled")
+        def work(job):
+            index = AnnotationIndex.open(parser_path, progress=job.set_progress)
+            try:
+                index.save()
+            except OSError:
+                # Read-only location: the index only saves time on the next open
+                pass
+            job.label = "Verifying"
+            return index, verify_annotations(index, data, progress=job.set_progress)
+
+        def loaded(result):
+            if data is not self.file_data:
+                return
+            self.annotations, self.parser_report = result
+            if tab is not None:
+                tab.parser_path = parser_path
+            # Entries saved before the parse are part of the index now; ones saved
+            # while it ran may not be, and keep their own highlight
+            report = self.parser_report
+            self.session_ranges = [r for r in self.session_ranges if not report.covers(*r)]
+            self._apply_parsed_tags()
+            perf.record("open_parser", time.perf_counter() - t0)
+            self.show_status(self.parser_report.summary())
+            if report and self.parser_report.problems:
+                self.show_parser_report(parser_path)
+
+        self.cancel_jobs("parser")
+        self.start_job(work, kind="parser", label="Parsing", on_done=loaded)
+
+    def _apply_parsed_tags(self, start=None, end=None):
+        """
+        Tag annotations in the rendered window whose logged data matches the file.
+        With `start`/`end`, only rows freshly rendered for the byte range
+        [start, end) are tagged (they carry no tags yet).
+        """
+        window_start = self.render_first_row * BYTES_PER_LINE
+        window_end = (self.render_first_row + self.render_row_count) * BYTES_PER_LINE
+        if start is None:
+            self.hex_text.tag_remove("parsed", "1.0", tk.END)
+            self.ascii_text.tag_remove("parsed", "1.0", tk.END)
+            report = self.parser_report
+        else:
+            window_start = max(window_start, start)
+            window_end = min(window_end, end)
+            # The report was made before these bytes existed; check them directly
+            report = None
+        # Entries saved this session are not in the index yet
+        ranges = [r for r in self.session_ranges if r[0] < window_end and r[1] > window_start]
+        if report is not None:
+            ranges += report.ranges_between(window_start, window_end)
+        elif self.annotations is not None:
+            for i in self.annotations.query(window_start, window_end):
+                offset, length, data = self.annotations.entry(i)[:3]
+                if annotation_matches(self.file_data, offset, length, data):
+                    ranges.append((offset, offset + length))
+        for start, end in ranges:
+            for hstart, hend, astart, aend in self._row_spans(start, end):
+                self.hex_text.tag_add("parsed", hstart, hend)
+                self.ascii_text.tag_add("parsed", astart, aend)
+
+    def _apply_scan_tags(self, start=None, end=None):
+        """Tag scan hits in the rendered window (or only in its rows for [start, end))."""
+        window_start = self.render_first_row * BYTES_PER_LINE
+        window_end = (self.render_first_row + self.render_row_count) * BYTES_PER_LINE
+        if start is None:
+            self.hex_text.tag_remove("scanned", "1.0", tk.END)
+            self.ascii_text.tag_remove("scanned", "1.0", tk.END)
+        else:
+            window_start = max(window_start, start)
+            window_end = min(window_end, end)
+        if self.scan_index is None:
+            return
+        for start, end in self.scan_index.ranges_between(window_start, window_end):
+            for hstart, hend, astart, aend in self._row_spans(start, end):
+                self.hex_text.tag_add("scanned", hstart, hend)
+                self.ascii_text.tag_add("scanned", astart, aend)
+
+    def show_parser_report(self, parser_path):
+        """List stale and mismatched parser entries in a separate window."""
+        report = self.parser_report
+        win = tk.Toplevel(self)
+        win.title(f"Parser report - {os.path.basename(parser_path)}")
+        text = tk.Text(win, width=110, height=30, wrap="none", font=("Courier", 11))
+        scroll = tk.Scrollbar(win, orient=tk.VERTICAL, command=text.yview)
+        text.config(yscrollcommand=scroll.set)
+
+        def save():
+            out_path = filedialog.asksaveasfilename(
+                defaultextension=".txt",
+                initialfile=os.path.basename(parser_path) + ".report.txt")
+            if not out_path:
+                return
+            try:
+                with open(out_path, "w", encoding="utf-8") as f:
+                    f.write(report.to_text() + "\n")
+            except Exception as e:
+                messagebox.showerror("Error", str(e))
+
+        tk.Button(win, text="Save Report", command=save).pack(side=tk.BOTTOM, pady=5)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        # The window shows the first entries; Save Report writes all of them
+        text.insert("1.0", report.to_text(limit=REPORT_DISPLAY_LIMIT))
+        text.config(state="disabled")
 
     # ===========================
     # Mouse wheel scrolling
@@ -593,9 +2357,7 @@ class HexViewerNativeSelection(tk.Tk):
             step = -1
         else:
             step = 1
-        self.offset_text.yview_scroll(step, "units")
-        self.hex_text.yview_scroll(step, "units")
-        self.ascii_text.yview_scroll(step, "units")
+        self.scroll_rows(step)
         return "break"
 
     def _on_mousewheel_linux(self, event):
@@ -603,11 +2365,27 @@ class HexViewerNativeSelection(tk.Tk):
             step = -1
         else:
             step = 1
-        self.offset_text.yview_scroll(step, "units")
-        self.hex_text.yview_scroll(step, "units")
-        self.ascii_text.yview_scroll(step, "units")
+        self.scroll_rows(step)
         return "break"
 
 if __name__ == "__main__":
-    app = HexViewerNativeSelection()
-    app.mainloop()
+    if "--bench-format" in sys.argv[1:]:
+        benchmark_format_rows()
+    else:
+        # --row-cache-mb N: memory budget for formatted rows per open file
+        row_cache_bytes = ROW_CACHE_BYTES
+        if "--row-cache-mb" in sys.argv[1:-1]:
+            row_cache_bytes = int(sys.argv[sys.argv.index("--row-cache-mb") + 1]) * 1024 * 1024
+        # --session-cache-mb N: memory budget for the rebuildable state of all open files
+        session_cache_bytes = SESSION_CACHE_BYTES
+        if "--session-cache-mb" in sys.argv[1:-1]:
+            session_cache_bytes = int(sys.argv[sys.argv.index("--session-cache-mb") + 1]) * 1024 * 1024
+        # --profile FILE: cProfile the whole session (UI thread) into FILE
+        profile_path = None
+        if "--profile" in sys.argv[1:-1]:
+            profile_path = sys.argv[sys.argv.index("--profile") + 1]
+            perf.start_profile()
+        app = HexViewerNativeSelection(row_cache_bytes, session_cache_bytes)
+        app.mainloop()
+        if profile_path:
+            perf.stop_profile(profile_path)
@@ -0,0 +1,504 @@
+"""
+Benchmark suite for Fast Hex Parser.
+
+    python fasthex_bench.py                         1 MB and 64 MB files, core paths only
+    python fasthex_bench.py --sizes 1M,256M,4G      other sizes (generated once, then reused)
+    python fasthex_bench.py --tk -o v1.4.json       also the viewer paths; results as JSON
+    python fasthex_bench.py --compare old.json new.json
+
+Synthetic files (random, zero-filled and text-heavy) and annotation logs of
+the requested sizes are written to --workdir and kept for later runs, so two
+versions are measured on identical inputs. The core benchmarks cover file
+load, full and windowed row rendering, click-to-offset lookup, interpretation
+and annotation log validation; --tk adds the same paths through the Tk viewer
+(open, scroll, click, drag highlighting, open_parser), started under Xvfb when
+there is no display. --compare prints the median ratio of every benchmark and
+exits with status 1 if one got slower by more than --threshold.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+from fasthex_core import (
+    BYTES_PER_LINE, INTERP_TYPES, INTERP_LAZY_BYTES, AnnotationIndex, RowLayout, RowPageCache, SelectionInterpretation,
+    open_data_source, format_rows, format_annotation_line, verify_annotations, np,
+)
+
+BENCH_KINDS = ["random", "zero", "text"]
+# Inputs are generated and the full render is run in chunks of this size
+BENCH_CHUNK = 4 * 1024 * 1024
+# Full render formats at most this many bytes of each file (the rate is what matters)
+BENCH_RENDER_LIMIT = 256 * 1024 * 1024
+# Rows in one rendered window (a screen plus overscan) and windows per run
+BENCH_WINDOW_ROWS = 80
+BENCH_WINDOWS = 200
+# Offset lookups per click-to-offset run, and selection steps per drag run
+BENCH_LOOKUPS = 100000
+BENCH_DRAG_STEPS = 200
+# Selection sizes for the interpretation benchmark
+BENCH_SELECTIONS = [4, 1024, 64 * 1024, 1024 * 1024]
+# Fraction of generated annotation entries whose logged bytes no longer match
+BENCH_STALE_FRACTION = 0.1
+
+SIZE_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_size(text):
+    """"64M", "2G", "512K" or a plain byte count."""
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in SIZE_UNITS:
+        return int(float(text[:-1]) * SIZE_UNITS[text[-1]])
+    return int(text)
+
+
+def size_label(size):
+    for unit in ("G", "M", "K"):
+        if size >= SIZE_UNITS[unit] and size % SIZE_UNITS[unit] == 0:
+            return f"{size // SIZE_UNITS[unit]}{unit}"
+    return str(size)
+
+
+# ===========================
+# Synthetic inputs
+# ===========================
+def _text_block(rng, size):
+    """Log-like printable text with some variety, used as the repeating unit of text files."""
+    words = ["GET", "POST", "/api/v1/items", "status=200", "status=404", "user", "session",
+             "timeout", "ERROR", "INFO", "DEBUG", "retry", "bytes", "latency_ms", "ok", "payload"]
+    lines = []
+    total = 0
+    while total < size:
+        line = f"{rng.randrange(10 ** 9):09d} " + " ".join(rng.choice(words) for _ in range(rng.randrange(4, 12)))
+        lines.append(line)
+        total += len(line) + 1
+    return ("\n".join(lines) + "\n").encode("ascii")[:size]
+
+
+def generate_file(workdir, kind, size, seed=1):
+    """Create (or reuse) a synthetic input of `kind` and `size` bytes. Returns its path."""
+    path = os.path.join(workdir, f"{kind}-{size_label(size)}.bin")
+    if os.path.exists(path) and os.path.getsize(path) == size:
+        return path
+    rng = random.Random(seed)
+    tmp = path + ".part"
+    with open(tmp, "wb") as f:
+        if kind == "zero":
+            # Sparse where the file system supports it
+            f.truncate(size)
+        else:
+            block = _text_block(rng, BENCH_CHUNK) if kind == "text" else None
+            written = 0
+            while written < size:
+                n = min(BENCH_CHUNK, size - written)
+                f.write(block[:n] if block is not None else rng.randbytes(n))
+                written += n
+    os.replace(tmp, path)
+    return path
+
+
+def generate_annotations(path, count, seed=2):
+    """
+    Create (or reuse) an annotation log with `count` entries for `path`, in
+    click order (unsorted), with BENCH_STALE_FRACTION of them stale.
+    """
+    log_path = f"{path}.{count}.txt"
+    if os.path.exists(log_path):
+        return log_path
+    rng = random.Random(seed)
+    data = open_data_source(path)
+    try:
+        size = len(data)
+        with open(log_path + ".part", "w", encoding="utf-8") as f:
+            for _ in range(count):
+                length = rng.choice((1, 2, 4, 8, 16))
+                offset = rng.randrange(max(1, size - length))
+                raw = bytes(data[offset:offset + length])
+                if rng.random() < BENCH_STALE_FRACTION:
+                    raw = bytes(b ^ 0xFF for b in raw)
+                f.write(format_annotation_line(offset, "0x" + raw.hex().upper(),
+                                               rng.choice(INTERP_TYPES), str(rng.randrange(65536))) + "\n")
+    finally:
+        data.close()
+    os.replace(log_path + ".part", log_path)
+    return log_path
+
+
+def _drop_index(log_path):
+    try:
+        os.remove(log_path + ".idx")
+    except FileNotFoundError:
+        pass
+
+
+# ===========================
+# Measurement
+# ===========================
+def measure(func, repeat, setup=None):
+    """Run func() `repeat` times (after setup(), untimed) and return the durations in seconds."""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+class Results:
+    """Benchmark results in run order, printed as they come in."""
+
+    def __init__(self):
+        self.items = []
+
+    def add(self, name, kind, size, times, nbytes=None, ops=None, **params):
+        median = statistics.median(times)
+        item = {"benchmark": name, "kind": kind, "size": size, "params": params,
+                "runs_s": times, "best_s": min(times), "median_s": median}
+        rate = ""
+        if nbytes:
+            item["mb_per_s"] = nbytes / median / 1e6 if median else None
+            rate = f"{item['mb_per_s']:10.1f} MB/s" if median else ""
+        elif ops:
+            item["us_per_op"] = median / ops * 1e6
+            rate = f"{item['us_per_op']:10.3f} us/op"
+        self.items.append(item)
+        extra = " ".join(f"{k}={v}" for k, v in params.items())
+        print(f"{name:<24} {kind:<7} {size_label(size):>6} {extra:<28} median {median * 1000:10.3f} ms {rate}",
+              flush=True)
+
+
+def _windows(rng, size, count):
+    rows = max(1, (size + BYTES_PER_LINE - 1) // BYTES_PER_LINE)
+    return [rng.randrange(max(1, rows - BENCH_WINDOW_ROWS)) for _ in range(count)]
+
+
+def bench_core(results, path, kind, logs, repeat):
+    size = os.path.getsize(path)
+    rng = random.Random(3)
+
+    def load():
+        open_data_source(path).close()
+    results.add("load", kind, size, measure(load, repeat))
+
+    data = open_data_source(path)
+    try:
+        render_bytes = min(size, BENCH_RENDER_LIMIT)
+        for group in (1, 2, 4):
+            def full_render():
+                for off in range(0, render_bytes, BENCH_CHUNK):
+                    view = data.view(off, min(render_bytes, off + BENCH_CHUNK))
+                    format_rows(view, off, group)
+                    del view
+            results.add("render_full", kind, size, measure(full_render, repeat), nbytes=render_bytes, group=group)
+
+        # Windows at random positions: a fresh cache formats them, a warm one only looks them up
+        starts = _windows(rng, size, BENCH_WINDOWS)
+        cache = RowPageCache(data)
+
+        def fresh_cache():
+            cache.clear()
+
+        def windows():
+            for row in starts:
+                cache.rows(row, row + BENCH_WINDOW_ROWS, 1)
+        results.add("render_window_cold", kind, size, measure(windows, repeat, setup=fresh_cache),
+                    ops=len(starts))
+        windows()
+        results.add("render_window_warm", kind, size, measure(windows, repeat), ops=len(starts))
+
+        layout = RowLayout(1)
+        clicks = [(rng.randrange(max(1, size // BYTES_PER_LINE)), rng.randrange(layout.hex_width))
+                  for _ in range(BENCH_LOOKUPS)]
+
+        def lookups():
+            return sum(row * BYTES_PER_LINE + layout.byte_at_hex_col(col) < size for row, col in clicks)
+        results.add("click_to_offset", kind, size, measure(lookups, repeat), ops=len(clicks))
+
+        for length in BENCH_SELECTIONS:
+            if length > size:
+                continue
+            start = rng.randrange(size - length + 1)
+            # Like the viewer: the full decimal of larger selections is only computed on request
+            full = length <= INTERP_LAZY_BYTES
+
+            def interpret():
+                interpretation = SelectionInterpretation(data, start, start + length)
+                for itype in INTERP_TYPES:
+                    interpretation.preview(itype)
+                if full:
+                    interpretation.full("Decimal")
+            results.add("interpret", kind, size, measure(interpret, repeat), length=length, decimal=full)
+    finally:
+        data.close()
+
+    for count, log_path in logs:
+        def validate():
+            index = AnnotationIndex.open(log_path)
+            source = open_data_source(path)
+            try:
+                verify_annotations(index, source)
+            finally:
+                source.close()
+        results.add("open_parser", kind, size, measure(validate, repeat, setup=lambda: _drop_index(log_path)),
+                    entries=count)
+        AnnotationIndex.open(log_path).save()
+        results.add("open_parser_indexed", kind, size, measure(validate, repeat), entries=count)
+        _drop_index(log_path)
+
+
+# ===========================
+# Viewer (Tk) benchmarks
+# ===========================
+def start_xvfb():
+    """Start Xvfb on a free display if there is no DISPLAY. Returns the process, or None."""
+    if os.environ.get("DISPLAY"):
+        return None
+    xvfb = shutil.which("Xvfb")
+    if xvfb is None:
+        raise RuntimeError("no DISPLAY and Xvfb is not installed")
+    for number in range(99, 200):
+        if not os.path.exists(f"/tmp/.X{number}-lock") and not os.path.exists(f"/tmp/.X11-unix/X{number}"):
+            break
+    proc = subprocess.Popen([xvfb, f":{number}", "-screen", "0", "1600x1000x24", "-nolisten", "tcp"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while not os.path.exists(f"/tmp/.X11-unix/X{number}"):
+        if proc.poll() is not None or time.monotonic() > deadline:
+            proc.kill()
+            raise RuntimeError("Xvfb did not start")
+        time.sleep(0.05)
+    os.environ["DISPLAY"] = f":{number}"
+    return proc
+
+
+def load_viewer_module():
+    """Import FastHexParser_V1.4.py (its file name is not a module name)."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "FastHexParser_V1.4.py")
+    spec = importlib.util.spec_from_file_location("fasthex_viewer", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _wait_for_jobs(app, kind):
+    while any(job.kind == kind for job in app._jobs):
+        app.update()
+        time.sleep(0.001)
+
+
+def _open_in_viewer(app, viewer, path):
+    """open_file as the user runs it, the dialog answered with `path`: load job, new tab, first render."""
+    ask = viewer.filedialog.askopenfilename
+    viewer.filedialog.askopenfilename = lambda *args, **kwargs: path
+    try:
+        app.open_file()
+    finally:
+        viewer.filedialog.askopenfilename = ask
+    _wait_for_jobs(app, "load")
+    app.update_idletasks()
+
+
+def _close_in_viewer(app, path):
+    """Close the tab of `path`, if open; the session closes its data source."""
+    tab = app.session.find(path)
+    if tab is not None:
+        app.close_tab(tab)
+
+
+def bench_tk(results, viewer, path, kind, logs, repeat):
+    size = os.path.getsize(path)
+    rng = random.Random(4)
+    app = viewer.HexViewerNativeSelection()
+    try:
+        app.update()
+        results.add("tk_open", kind, size, measure(lambda: _open_in_viewer(app, viewer, path), repeat,
+                                                   setup=lambda: _close_in_viewer(app, path)))
+        # The overview strip is computed after the first render; keep it out of the timings below
+        _wait_for_jobs(app, "overview")
+
+        starts = _windows(rng, size, BENCH_WINDOWS // 4)
+
+        def scroll():
+            for row in starts:
+                app.scroll_to_row(row)
+            app.update_idletasks()
+        results.add("tk_scroll_cold", kind, size, measure(scroll, repeat, setup=app.row_cache.clear),
+                    ops=len(starts))
+        results.add("tk_scroll_warm", kind, size, measure(scroll, repeat), ops=len(starts))
+
+        app.scroll_to_row(0, force=True)
+        app.update_idletasks()
+        width = app.hex_text.winfo_width()
+        height = app.hex_text.winfo_height()
+        events = [types.SimpleNamespace(x=rng.randrange(width), y=rng.randrange(height), widget=app.hex_text)
+                  for _ in range(BENCH_LOOKUPS // 100)]
+
+        def clicks():
+            for event in events:
+                app._point_to_offset_hex(event)
+        results.add("tk_click_to_offset", kind, size, measure(clicks, repeat), ops=len(events))
+
+        # Drag from the top of the screen downwards, one frame per step
+        visible = app.render_row_count * BYTES_PER_LINE
+        step = max(1, visible // BENCH_DRAG_STEPS)
+
+        def start_drag():
+            app.select_start_offset = app.select_end_offset = None
+            app._update_highlight()
+            app.select_start_offset = app.render_first_row * BYTES_PER_LINE
+
+        def drag():
+            for i in range(BENCH_DRAG_STEPS):
+                app.select_end_offset = min(size - 1, app.select_start_offset + i * step)
+                app._update_highlight()
+            app.update_idletasks()
+        results.add("tk_drag_highlight", kind, size, measure(drag, repeat, setup=start_drag),
+                    ops=BENCH_DRAG_STEPS)
+
+        for count, log_path in logs:
+            # The viewer reads <file>.txt; point it at the generated log instead
+            app._parser_path = lambda log_path=log_path: log_path
+
+            def reset(log_path=log_path):
+                _drop_index(log_path)
+                # Stale entries open a report window each time
+                for widget in app.winfo_children():
+                    if isinstance(widget, viewer.tk.Toplevel):
+                        widget.destroy()
+
+            def open_parser():
+                app.open_parser()
+                _wait_for_jobs(app, "parser")
+                app.update_idletasks()
+            results.add("tk_open_parser", kind, size,
+                        measure(open_parser, repeat, setup=reset), entries=count)
+            _drop_index(log_path)
+    finally:
+        app.on_close()
+
+
+# ===========================
+# Reports
+# ===========================
+def _git_revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def _key(item):
+    return (item["benchmark"], item["kind"], item["size"], json.dumps(item["params"], sort_keys=True))
+
+
+def compare(old_path, new_path, threshold):
+    """Print new/old median ratios; returns 1 if any benchmark got slower by more than `threshold`."""
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = {_key(item): item for item in json.load(f)["results"]}
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)["results"]
+    regressions = 0
+    for item in new:
+        before = old.get(_key(item))
+        if before is None or not before["median_s"]:
+            continue
+        ratio = item["median_s"] / before["median_s"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  SLOWER"
+            regressions += 1
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        extra = " ".join(f"{k}={v}" for k, v in item["params"].items())
+        print(f"{item['benchmark']:<24} {item['kind']:<7} {size_label(item['size']):>6} {extra:<28} "
+              f"{before['median_s'] * 1000:10.3f} -> {item['median_s'] * 1000:10.3f} ms  x{ratio:5.2f}{flag}")
+    print(f"{regressions} regression(s) over {threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="fasthex_bench", description="Fast Hex Parser benchmarks.")
+    parser.add_argument("--sizes", default="1M,64M", help="comma-separated file sizes (K/M/G suffixes)")
+    parser.add_argument("--kinds", default=",".join(BENCH_KINDS), help="comma-separated: random, zero, text")
+    parser.add_argument("--annotations", default="1000,100000", help="comma-separated annotation log sizes")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per benchmark (the median is reported)")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "fasthex-bench"),
+                        help="where generated inputs are kept between runs")
+    parser.add_argument("--tk", action="store_true", help="also benchmark the Tk viewer (Xvfb if no display)")
+    parser.add_argument("-o", "--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative slowdown reported as a regression by --compare (default 0.10)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.compare:
+        return compare(args.compare[0], args.compare[1], args.threshold)
+
+    sizes = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+    kinds = [k.strip() for k in args.kinds.split(",") if k.strip()]
+    counts = [int(n) for n in args.annotations.split(",") if n.strip()]
+    for kind in kinds:
+        if kind not in BENCH_KINDS:
+            print(f"unknown kind {kind!r}", file=sys.stderr)
+            return 2
+    os.makedirs(args.workdir, exist_ok=True)
+
+    viewer = xvfb = None
+    if args.tk:
+        try:
+            xvfb = start_xvfb()
+        except RuntimeError as e:
+            print(f"--tk: {e}", file=sys.stderr)
+            return 2
+        viewer = load_viewer_module()
+
+    results = Results()
+    try:
+        for size in sizes:
+            for kind in kinds:
+                path = generate_file(args.workdir, kind, size)
+                logs = [(count, generate_annotations(path, count)) for count in counts]
+                bench_core(results, path, kind, logs, args.repeat)
+                if viewer is not None:
+                    bench_tk(results, viewer, path, kind, logs, args.repeat)
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+            xvfb.wait()
+
+    if args.output:
+        report = {
+            "revision": _git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "numpy": np is not None,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "args": {"sizes": sizes, "kinds": kinds, "annotations": counts, "repeat": args.repeat,
+                     "tk": args.tk},
+            "results": results.items,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+            f.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
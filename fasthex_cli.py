@@ -0,0 +1,357 @@
+"""
+Batch command line for Fast Hex Parser (no display needed).
+
+    python fasthex_cli.py check  FILE...                  verify <file>.txt annotation logs
+    python fasthex_cli.py dump   FILE... -r 0x100:0x200   hex-dump byte ranges
+    python fasthex_cli.py decode FILE... -a 0x50:4        decode values at offsets
+    python fasthex_cli.py template FILE... -t hdr.tpl     decode records with a structure template
+    python fasthex_cli.py diff FILE... --against REF      differing byte ranges against a reference file
+    python fasthex_cli.py export FILE -r 0:0x100000 -o out.txt   stream a dump of a range to a file
+    python fasthex_cli.py scan FILE... > hits.txt          strings and file signatures as parser-file lines
+
+Files are processed in parallel across a process pool (--jobs, default: all
+cores); output is printed per file in command line order. export handles one
+file at a time and spreads the chunks of each dump across the pool instead. A list of files can
+be passed as @listfile (one path per line). The exit status is 1 if any file
+failed or, for check, had stale or mismatched entries.
+"""
+import argparse
+import io
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from fasthex_core import (
+    BYTES_PER_LINE, INTERP_TYPES, DECODERS, AnnotationIndex, open_data_source, decode_array, format_values,
+    format_annotation_line, verify_annotations, format_rows, interpret_bytes,
+    compile_template, decode_records, export_records, template_annotations, diff_data, perf,
+    export_dump, annotation_markers, scan_data, SCAN_MIN_STRING,
+)
+
+
+def _parse_range(text):
+    """"START:END" (END exclusive) or "START+LENGTH"; numbers accept 0x prefixes."""
+    try:
+        if "+" in text:
+            start, length = text.split("+", 1)
+            start = int(start, 0)
+            return start, start + int(length, 0)
+        start, end = text.split(":", 1)
+        return int(start, 0), int(end, 0)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"bad range {text!r}, expected START:END or START+LENGTH")
+
+
+def _parse_at(text):
+    """"OFFSET" or "OFFSET:LENGTH"; the length defaults to 4 bytes."""
+    try:
+        offset, _, length = text.partition(":")
+        return int(offset, 0), int(length, 0) if length else 4
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"bad offset {text!r}, expected OFFSET or OFFSET:LENGTH")
+
+
+def _parse_offset(text):
+    """A non-negative offset; accepts 0x prefixes."""
+    try:
+        offset = int(text, 0)
+    except ValueError:
+        offset = -1
+    if offset < 0:
+        raise argparse.ArgumentTypeError(f"bad offset {text!r}, expected a non-negative number")
+    return offset
+
+
+def check_file(path, save_index=True, limit=None):
+    """Verify the annotation log next to `path`. Returns (ok, text)."""
+    parser_path = path + ".txt"
+    if not os.path.exists(parser_path):
+        return True, f"{path}: no parser file"
+    index = AnnotationIndex.open(parser_path)
+    if save_index:
+        try:
+            index.save()
+        except OSError:
+            # Read-only corpus: the index only saves time, not correctness
+            pass
+    data = open_data_source(path)
+    try:
+        report = verify_annotations(index, data)
+    finally:
+        data.close()
+    if not report.problems:
+        return True, f"{path}: {report.summary()}"
+    return False, f"{path}:\n{report.to_text(limit=limit)}"
+
+
+def dump_file(path, ranges, group_size=1):
+    """Hex dump of byte `ranges` of `path`, in the viewer's row layout."""
+    data = open_data_source(path)
+    try:
+        lines = [f"{path}:"]
+        for start, end in ranges or [(0, len(data))]:
+            start = max(0, start)
+            end = min(end, len(data))
+            # Rows start on line boundaries so the columns line up with the viewer
+            row_start = start - start % BYTES_PER_LINE
+            for off in range(row_start, end, BYTES_PER_LINE * 1024):
+                block = data.view(off, min(end, off + BYTES_PER_LINE * 1024))
+                for o, h, a in zip(*format_rows(block, off, group_size)):
+                    lines.append(f"{o}  {h} {a}")
+                del block
+        return True, "\n".join(lines)
+    finally:
+        data.close()
+
+
+def decode_file(path, locations, arrays=False):
+    """
+    Annotation-format lines with every interpretation at each (offset, length),
+    plus every array decoder when `arrays` is set.
+    """
+    data = open_data_source(path)
+    try:
+        lines = [f"{path}:"]
+        for offset, length in locations:
+            if offset >= len(data):
+                lines.append(f"{offset:08X}: out of range")
+                continue
+            values = interpret_bytes(data[offset:offset + length])
+            for itype in INTERP_TYPES:
+                if values[itype]:
+                    lines.append(format_annotation_line(offset, values["Hex (BE)"], itype, values[itype]))
+            if arrays:
+                view = data.view(offset, offset + length)
+                for decoder in DECODERS:
+                    decoded = decode_array(view, decoder)
+                    if decoded:
+                        lines.append(format_annotation_line(offset, values["Hex (BE)"], decoder,
+                                                            format_values(decoded)))
+                del view
+        return True, "\n".join(lines)
+    finally:
+        data.close()
+
+
+def template_file(path, template_text, offset=0, count=None, fmt="csv", header=False):
+    """
+    Records of a template at `offset` of `path` as CSV, JSON or parser-file
+    lines, preceded by a "path:" line when `header` is set.
+    """
+    template = compile_template(template_text)
+    data = open_data_source(path)
+    try:
+        out = io.StringIO()
+        if header:
+            out.write(f"{path}:\n")
+        records = decode_records(template, data, offset, count)
+        if fmt == "annotations":
+            for line in template_annotations(template, data, records):
+                out.write(line + "\n")
+        else:
+            export_records(template, records, out, fmt)
+        return True, out.getvalue().rstrip("\n")
+    finally:
+        data.close()
+
+
+def diff_file(path, reference, limit=None):
+    """Byte ranges where `path` differs from `reference`. Not ok if there are any."""
+    data = open_data_source(path)
+    ref = open_data_source(reference)
+    try:
+        result = diff_data(ref, data)
+    finally:
+        data.close()
+        ref.close()
+    lines = [f"{path}: {result.summary()}"]
+    for start, end in result.ranges[:limit]:
+        lines.append(f"{start:08X}-{end - 1:08X}  {end - start} bytes")
+    if limit is not None and len(result.ranges) > limit:
+        lines.append(f"... {len(result.ranges) - limit} more")
+    return not result.ranges, "\n".join(lines)
+
+
+def export_file(path, out_path, span=None, group_size=1, markers=False, workers=None):
+    """
+    Stream the dump of byte range `span` (default: whole file) of `path` to
+    `out_path` ("-" for stdout), with the annotations of <path>.txt as row
+    markers if `markers` is set. Returns (ok, text).
+    """
+    data = open_data_source(path)
+    try:
+        start, end = span or (0, len(data))
+        found = None
+        if markers and os.path.exists(path + ".txt"):
+            found = annotation_markers(AnnotationIndex.open(path + ".txt"), start, end, data)
+        if out_path == "-":
+            sys.stdout.flush()
+            export_dump(data, sys.stdout.buffer, start, end, group_size, found, path, workers)
+            sys.stdout.buffer.flush()
+            return True, ""
+        with open(out_path, "wb") as f:
+            written = export_dump(data, f, start, end, group_size, found, path, workers)
+        return True, f"{path}: {written} bytes written to {out_path}"
+    finally:
+        data.close()
+
+
+def scan_file(path, min_length=SCAN_MIN_STRING, strings=True, signatures=True, header=False):
+    """
+    Strings and signatures in `path` as parser-file lines (open_parser loads
+    them), preceded by a "path:" line when `header` is set.
+    """
+    data = open_data_source(path)
+    try:
+        index = scan_data(data, min_length=min_length, strings=strings, signatures=signatures)
+        lines = [f"{path}: {index.summary()}"] if header else []
+        lines.extend(index.annotation_lines(data))
+        return True, "\n".join(lines)
+    finally:
+        data.close()
+
+
+def _run_task(task):
+    """Process pool entry point: (function name, path, args) -> (ok, text)."""
+    name, path, args = task
+    try:
+        return TASKS[name](path, *args)
+    except Exception as e:
+        return False, f"{path}: error: {e}"
+
+
+TASKS = {
+    "check": check_file,
+    "dump": dump_file,
+    "decode": decode_file,
+    "template": template_file,
+    "diff": diff_file,
+    "scan": scan_file,
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="fasthex_cli", fromfile_prefix_chars="@",
+                                     description="Batch annotation checks, dumps and decoding.")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: number of cores)")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="write a cProfile capture of the run to FILE (runs with --jobs 1)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    check = sub.add_parser("check", help="verify <file>.txt annotation logs against the files")
+    check.add_argument("files", nargs="+")
+    check.add_argument("--no-save-index", action="store_true",
+                       help="do not write <file>.txt.idx next to the parser files")
+    check.add_argument("--limit", type=int, default=None, help="problems listed per file")
+
+    dump = sub.add_parser("dump", help="hex-dump byte ranges")
+    dump.add_argument("files", nargs="+")
+    dump.add_argument("-r", "--range", dest="ranges", type=_parse_range, action="append",
+                      help="START:END or START+LENGTH (repeatable, default: whole file)")
+    dump.add_argument("-g", "--group", type=int, choices=[1, 2, 4], default=1, help="byte grouping")
+
+    decode = sub.add_parser("decode", help="decode values at offsets")
+    decode.add_argument("files", nargs="+")
+    decode.add_argument("-a", "--at", dest="locations", type=_parse_at, action="append", required=True,
+                        help="OFFSET or OFFSET:LENGTH (repeatable, default length 4)")
+    decode.add_argument("--arrays", action="store_true",
+                        help="also decode as arrays of every int/float width and byte order")
+
+    template = sub.add_parser("template", help="decode records with a structure template")
+    template.add_argument("files", nargs="+")
+    template.add_argument("-t", "--template", required=True, help="template file (DSL or JSON)")
+    template.add_argument("-o", "--offset", type=_parse_offset, default=0, help="first record offset")
+    template.add_argument("-n", "--count", type=int, default=None,
+                          help="number of records (default: as many as fit)")
+    template.add_argument("-f", "--format", choices=["csv", "json", "annotations"], default="csv")
+
+    diff = sub.add_parser("diff", help="differing byte ranges against a reference file")
+    diff.add_argument("files", nargs="+")
+    diff.add_argument("--against", required=True, help="reference file")
+    diff.add_argument("--limit", type=int, default=None, help="ranges listed per file")
+
+    scan = sub.add_parser("scan", help="strings and file signatures as parser-file lines")
+    scan.add_argument("files", nargs="+")
+    scan.add_argument("-n", "--min-length", type=int, default=SCAN_MIN_STRING,
+                      help=f"shortest string reported (default: {SCAN_MIN_STRING})")
+    scan.add_argument("--no-strings", action="store_true", help="signatures only")
+    scan.add_argument("--no-signatures", action="store_true", help="strings only")
+
+    export = sub.add_parser("export", help="stream a hex dump of a byte range to a file")
+    export.add_argument("files", nargs="+")
+    export.add_argument("-r", "--range", dest="span", type=_parse_range, default=None,
+                        help="START:END or START+LENGTH (default: whole file)")
+    export.add_argument("-o", "--output", default=None,
+                        help="output file, - for stdout (default: <file>.dump.txt; one file only)")
+    export.add_argument("-g", "--group", type=int, choices=[1, 2, 4], default=1, help="byte grouping")
+    export.add_argument("--markers", action="store_true",
+                        help="mark rows with the annotations of <file>.txt")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "export":
+        if args.output is not None and len(args.files) > 1:
+            print("export: -o needs a single input file", file=sys.stderr)
+            return 2
+        # Each dump is already spread over the worker processes; files go one after another
+        return _report(_run_export(path, args) for path in args.files)
+    if args.command == "check":
+        extra = (not args.no_save_index, args.limit)
+    elif args.command == "dump":
+        extra = (args.ranges, args.group)
+    elif args.command == "decode":
+        extra = (args.locations, args.arrays)
+    elif args.command == "diff":
+        extra = (args.against, args.limit)
+    elif args.command == "scan":
+        # A single file gives plain parser lines; several are labelled like the other commands
+        extra = (args.min_length, not args.no_strings, not args.no_signatures, len(args.files) > 1)
+    else:
+        with open(args.template, "r", encoding="utf-8") as f:
+            template_text = f.read()
+        try:
+            compile_template(template_text)
+        except ValueError as e:
+            print(f"{args.template}: {e}", file=sys.stderr)
+            return 2
+        # A single file gives plain CSV/JSON; several are labelled like the other commands
+        extra = (template_text, args.offset, args.count, args.format, len(args.files) > 1)
+    tasks = [(args.command, path, extra) for path in args.files]
+
+    if args.profile:
+        # Worker processes would not show up in the capture
+        perf.start_profile()
+        try:
+            return _report(map(_run_task, tasks))
+        finally:
+            perf.stop_profile(args.profile)
+    if args.jobs <= 1 or len(tasks) == 1:
+        return _report(map(_run_task, tasks))
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        chunksize = max(1, len(tasks) // (args.jobs * 8))
+        return _report(pool.map(_run_task, tasks, chunksize=chunksize))
+
+
+def _run_export(path, args):
+    try:
+        return export_file(path, args.output or path + ".dump.txt", args.span, args.group,
+                           args.markers, args.jobs)
+    except Exception as e:
+        return False, f"{path}: error: {e}"
+
+
+def _report(results):
+    """Print (ok, text) results in order; exit status 1 if any failed."""
+    failed = 0
+    for ok, text in results:
+        failed += not ok
+        if text:
+            print(text)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
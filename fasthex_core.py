@@ -0,0 +1,3091 @@
+"""
+GUI-free core of Fast Hex Parser.
+
+Performance counters, data sources, background jobs, the annotation
+index/writer/verifier, pattern search, row formatting and geometry, and byte
+interpretation. Nothing here imports tkinter, so it runs on headless
+machines; the viewer (FastHexParser_V1.4.py) and the batch CLI
+(fasthex_cli.py) are both clients of this module.
+"""
+import bisect
+import bz2
+import cProfile
+import csv
+import functools
+import hashlib
+import heapq
+import json
+import lzma
+import math
+import mmap
+import multiprocessing
+import queue
+import struct
+import os
+import re
+import stat
+import tempfile
+import threading
+import sys
+import time
+import zlib
+from array import array
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BYTES_PER_LINE = 32
+
+# Block size and count for the buffered (non-mappable) data source cache
+SOURCE_BLOCK_SIZE = 64 * 1024
+SOURCE_CACHE_BLOCKS = 64
+
+# gzip, bzip2 and xz files are shown decompressed. Their restart points are
+# saved next to the file with this suffix; gzip decoder states are also kept in
+# memory every COMPRESSED_SNAPSHOT_SPACING bytes of output
+COMPRESSED_INDEX_SUFFIX = ".zidx"
+COMPRESSED_INDEX_VERSION = 1
+COMPRESSED_SNAPSHOT_SPACING = 8 * 1024 * 1024
+# Memory of one snapshot: the 32 KB window plus the decoder's tables
+COMPRESSED_SNAPSHOT_BYTES = 48 * 1024
+COMPRESSED_READ_SIZE = 256 * 1024
+
+# Formatted rows are cached in pages of ROW_PAGE_ROWS rows, up to about
+# ROW_CACHE_BYTES of strings per data source; read-ahead formats this many
+# pages either side of the view in the background
+ROW_PAGE_ROWS = 256
+ROW_CACHE_BYTES = 32 * 1024 * 1024
+ROW_CACHE_READAHEAD_PAGES = 2
+
+# Latest timings kept per timer for percentiles
+PERF_SAMPLES = 4096
+
+# Parser lines handled between two progress updates
+PARSER_BATCH_LINES = 2000
+# The annotation index is saved next to the parser file with this suffix
+ANNOTATION_INDEX_SUFFIX = ".idx"
+ANNOTATION_INDEX_VERSION = 1
+
+# Annotation writer: flush after this much idle time or this many queued lines,
+# and fsync once this many lines were written since the last checkpoint
+ANNOTATION_FLUSH_IDLE_MS = 1000
+ANNOTATION_FLUSH_LINES = 100
+ANNOTATION_FSYNC_LINES = 1000
+
+# Search scans the data in chunks of this size; consecutive chunks overlap by
+# the longest possible match so hits across chunk edges are still found
+SEARCH_CHUNK_SIZE = 4 * 1024 * 1024
+# Longest match assumed for free-form regular expressions
+SEARCH_REGEX_MAX_MATCH = 4096
+# Search stops after this many hits
+SEARCH_MAX_HITS = 100000
+SEARCH_MODES = ["Hex", "ASCII", "UTF-16", "Regex"]
+
+# Interpretations shown for a selection, in display order
+INTERP_TYPES = ["Hex (BE)", "Hex (LE)", "SignedInt16", "Float32", "Decimal"]
+# Hex values of longer selections are previewed with this many bytes, and long
+# decimals with this many digits at each end
+INTERP_PREVIEW_BYTES = 32
+INTERP_PREVIEW_DIGITS = 24
+# Decimal values of selections up to INTERP_INLINE_BYTES are computed right
+# away; larger ones belong in a background job, and beyond INTERP_LAZY_BYTES
+# they are only computed when asked for (field focused, copied or written)
+INTERP_INLINE_BYTES = 1024
+INTERP_LAZY_BYTES = 256 * 1024
+
+# Array decoders: base name, struct code and numpy dtype. Multi-byte types
+# get one decoder per byte order, named e.g. "Int16 LE" / "Int16 BE".
+DECODER_BASE_TYPES = [
+    ("Int8", "b", "i1"), ("UInt8", "B", "u1"),
+    ("Int16", "h", "i2"), ("UInt16", "H", "u2"),
+    ("Int32", "i", "i4"), ("UInt32", "I", "u4"),
+    ("Int64", "q", "i8"), ("UInt64", "Q", "u8"),
+    ("Float16", "e", "f2"), ("Float32", "f", "f4"), ("Float64", "d", "f8"),
+]
+DECODERS = OrderedDict()
+for _name, _code, _dtype in DECODER_BASE_TYPES:
+    if struct.calcsize(_code) == 1:
+        DECODERS[_name] = ("<" + _code, "<" + _dtype)
+    else:
+        DECODERS[_name + " LE"] = ("<" + _code, "<" + _dtype)
+        DECODERS[_name + " BE"] = (">" + _code, ">" + _dtype)
+del _name, _code, _dtype
+# Values per decoder shown in the decoder table
+DECODER_PREVIEW_VALUES = 256
+
+
+# ===========================
+# Performance counters
+# ===========================
+class PerfStats:
+    """
+    Named timers and counters for the hot paths, plus an optional cProfile capture.
+
+    Timers keep a count, the total and the latest PERF_SAMPLES durations (for
+    percentiles); counters are plain totals. Both may be updated from worker
+    threads. The module-level `perf` instance is shared by the core, the viewer
+    and the CLI.
+    """
+
+    def __init__(self, samples=PERF_SAMPLES):
+        self.samples = samples
+        self._timers = {}  # name -> [count, total seconds, max seconds, deque of recent durations]
+        self._counters = Counter()
+        self._lock = threading.Lock()
+        self._profile = None
+
+    def record(self, name, seconds):
+        with self._lock:
+            timer = self._timers.get(name)
+            if timer is None:
+                timer = self._timers[name] = [0, 0.0, 0.0, deque(maxlen=self.samples)]
+            timer[0] += 1
+            timer[1] += seconds
+            if seconds > timer[2]:
+                timer[2] = seconds
+            timer[3].append(seconds)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    @contextmanager
+    def timer(self, name):
+        """`with perf.timer("name"):` records how long the block took."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t0)
+
+    def timed(self, name):
+        """Decorator form of timer()."""
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                t0 = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - t0)
+            return wrapper
+        return decorate
+
+    def reset(self):
+        with self._lock:
+            self._timers.clear()
+            self._counters.clear()
+
+    def snapshot(self, counters=None):
+        """
+        {"timers": [row, ...], "counters": {name: value}}, with one row per timer
+        (name, count and total/mean/p50/p90/p99/max in milliseconds). Extra
+        `counters` (e.g. cache statistics) are merged in.
+        """
+        with self._lock:
+            timers = [(name, t[0], t[1], t[2], sorted(t[3])) for name, t in self._timers.items()]
+            merged = dict(self._counters)
+        merged.update(counters or {})
+        rows = []
+        for name, count, total, peak, recent in sorted(timers):
+            def pct(p):
+                # Nearest rank over the recent samples
+                return recent[min(len(recent) - 1, max(0, math.ceil(p * len(recent)) - 1))] * 1000
+            rows.append({"name": name, "count": count, "total_ms": total * 1000,
+                         "mean_ms": total * 1000 / count, "p50_ms": pct(0.50), "p90_ms": pct(0.90),
+                         "p99_ms": pct(0.99), "max_ms": peak * 1000})
+        return {"timers": rows, "counters": dict(sorted(merged.items()))}
+
+    @property
+    def profiling(self):
+        return self._profile is not None
+
+    def start_profile(self):
+        """Start a cProfile capture of the calling thread."""
+        if self._profile is not None:
+            return
+        profile = cProfile.Profile()
+        profile.enable()
+        self._profile = profile
+
+    def stop_profile(self, path=None):
+        """Stop the capture and, if `path` is given, dump it there (open with pstats or snakeviz)."""
+        profile, self._profile = self._profile, None
+        if profile is None:
+            return None
+        profile.disable()
+        if path:
+            profile.dump_stats(path)
+        return profile
+
+
+perf = PerfStats()
+
+PERF_CSV_FIELDS = ["name", "count", "total_ms", "mean_ms", "p50_ms", "p90_ms", "p99_ms", "max_ms"]
+
+
+def export_perf(snapshot, f, fmt="json"):
+    """Write a PerfStats.snapshot() to text file `f` as "json" or "csv" (counters as rows with only a count)."""
+    if fmt == "json":
+        json.dump(snapshot, f, indent=1)
+        f.write("\n")
+    elif fmt == "csv":
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(PERF_CSV_FIELDS)
+        for row in snapshot["timers"]:
+            writer.writerow([row["name"], row["count"]] +
+                            [f"{row[field]:.3f}" for field in PERF_CSV_FIELDS[2:]])
+        for name, value in snapshot["counters"].items():
+            writer.writerow([name, value] + [""] * (len(PERF_CSV_FIELDS) - 2))
+    else:
+        raise ValueError(f"unknown export format {fmt!r}")
+
+
+# ===========================
+# Data sources
+# ===========================
+# Every consumer of file_data goes through one of these objects instead of a
+# bytes copy of the whole file. They all support len(), indexing, slicing
+# (returns bytes) and view(start, end) (returns a memoryview, zero-copy when
+# the data is memory-mapped). refresh() picks up a size change of the
+# underlying file and returns the number of bytes added (negative if it shrank).
+# cache_bytes() is the memory the source itself holds for caching (the OS page
+# cache behind a mapping does not count).
+
+class BytesDataSource:
+    """Data source over an in-memory buffer (used for the empty initial state)."""
+
+    def __init__(self, data=b""):
+        self._data = data
+
+    def __len__(self):
+        return len(self._data)
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def view(self, start, end):
+        return memoryview(self._data)[start:end]
+
+    def refresh(self):
+        return 0
+
+    def cache_bytes(self):
+        return 0
+
+    def close(self):
+        pass
+
+
+class MappedFileSource:
+    """Read-only mmap of a regular file. Pages are loaded by the OS on access."""
+
+    def __init__(self, path=None, fileobj=None):
+        self._file = fileobj if fileobj is not None else open(path, "rb")
+        self._mm = b""
+        try:
+            self._map()
+        except Exception:
+            self._file.close()
+            raise
+
+    def _map(self):
+        """(Re)map the whole file at its current size."""
+        old = self._mm
+        self._size = os.fstat(self._file.fileno()).st_size
+        # mmap refuses empty files
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self._size else b""
+        self._release(old)
+
+    @staticmethod
+    def _release(mm):
+        if isinstance(mm, mmap.mmap):
+            try:
+                mm.close()
+            except BufferError:
+                # A memoryview is still alive; the map is released when it is collected
+                pass
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, key):
+        return self._mm[key]
+
+    def view(self, start, end):
+        return memoryview(self._mm)[start:end]
+
+    def refresh(self):
+        old_size = self._size
+        if os.fstat(self._file.fileno()).st_size != old_size:
+            # A truncated file must be remapped too: touching pages past its end faults
+            self._map()
+        return self._size - old_size
+
+    def cache_bytes(self):
+        return 0
+
+    def close(self):
+        self._release(self._mm)
+        self._file.close()
+
+
+class BufferedFileSource:
+    """Seek-and-read access with a small LRU block cache, for files that cannot be mapped."""
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._size = self._file.seek(0, os.SEEK_END)
+        self._blocks = OrderedDict()
+        # Background jobs read concurrently with the UI thread
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def _block(self, index):
+        with self._lock:
+            block = self._blocks.get(index)
+            if block is None:
+                block = self._fetch(index)
+                self._blocks[index] = block
+                if len(self._blocks) > SOURCE_CACHE_BLOCKS:
+                    self._blocks.popitem(last=False)
+            else:
+                self._blocks.move_to_end(index)
+            return block
+
+    def _fetch(self, index):
+        """Block `index` from the file (called with the lock held)."""
+        self._file.seek(index * SOURCE_BLOCK_SIZE)
+        return self._file.read(SOURCE_BLOCK_SIZE)
+
+    def _read(self, start, end):
+        start = max(0, min(start, self._size))
+        end = max(start, min(end, self._size))
+        parts = []
+        pos = start
+        while pos < end:
+            index, inner = divmod(pos, SOURCE_BLOCK_SIZE)
+            block = self._block(index)
+            chunk = block[inner : inner + (end - pos)]
+            if not chunk:
+                break
+            parts.append(chunk)
+            pos += len(chunk)
+        return b"".join(parts)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self._size)
+            data = self._read(start, stop) if stop > start else b""
+            return data if step == 1 else data[::step]
+        if key < 0:
+            key += self._size
+        if not 0 <= key < self._size:
+            raise IndexError("data source index out of range")
+        return self._read(key, key + 1)[0]
+
+    def view(self, start, end):
+        return memoryview(self._read(start, end))
+
+    def refresh(self):
+        with self._lock:
+            old_size = self._size
+            self._size = self._file.seek(0, os.SEEK_END)
+            if self._size != old_size:
+                # The cached block at the old end may have been partial
+                self._blocks.pop(old_size // SOURCE_BLOCK_SIZE, None)
+                if self._size < old_size:
+                    self._blocks.clear()
+            return self._size - old_size
+
+    def cache_bytes(self):
+        return len(self._blocks) * SOURCE_BLOCK_SIZE
+
+    def close(self):
+        self._blocks.clear()
+        self._file.close()
+
+
+# Compressed inputs are detected by their magic bytes
+COMPRESSION_MAGIC = [
+    (b"\x1f\x8b", "gzip"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"BZh", "bz2"),
+]
+# bzip2 block and end-of-stream markers (48 bits, not byte aligned)
+_BZ2_BLOCK_MAGIC = 0x314159265359
+_BZ2_EOS_MAGIC = 0x177245385090
+
+
+def detect_compression(head):
+    """Codec name ("gzip", "bz2", "xz") for the first bytes of a file, or None."""
+    for magic, codec in COMPRESSION_MAGIC:
+        if head.startswith(magic):
+            if codec == "bz2" and not (len(head) > 3 and head[3:4] in b"123456789"):
+                continue
+            return codec
+    return None
+
+
+def _new_decoder(codec):
+    if codec == "gzip":
+        return zlib.decompressobj(31)
+    if codec == "bz2":
+        return bz2.BZ2Decompressor()
+    return lzma.LZMADecompressor(lzma.FORMAT_XZ)
+
+
+def _read_varint(buf, i):
+    """xz variable-length integer at buf[i]: (value, next index)."""
+    value = shift = 0
+    while True:
+        byte = buf[i]
+        i += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, i
+        shift += 7
+
+
+def _bz2_markers(mm):
+    """Bit offsets of every bzip2 block and end-of-stream marker in `mm`, in order."""
+    found = []
+    for magic, kind in ((_BZ2_BLOCK_MAGIC, "block"), (_BZ2_EOS_MAGIC, "eos")):
+        for shift in range(8):
+            # A 48-bit marker `shift` bits into a byte spans 7 bytes, the middle 5
+            # of them fully: search for those, then check the two partial ones
+            window_magic = magic << (8 - shift)
+            pattern = ((window_magic >> 8) & ((1 << 40) - 1)).to_bytes(5, "big")
+            pos = mm.find(pattern, 1)
+            while pos != -1:
+                start = pos - 1
+                window = int.from_bytes(mm[start:start + 7].ljust(7, b"\0"), "big")
+                if (window >> (8 - shift)) & ((1 << 48) - 1) == magic:
+                    found.append((start * 8 + shift, kind))
+                pos = mm.find(pattern, pos + 1)
+    found.sort()
+    return found
+
+
+class _SegmentReader:
+    """Decodes one segment of a CompressedFileSource forward, in bounded pieces."""
+
+    def __init__(self, source, index, u, bitpos, decoder, feed_end, u_end=None, prefix=b""):
+        self.source = source
+        self.index = index
+        self.u = u
+        # Compressed bit offset of the next input not yet handed to the decoder
+        self.bitpos = bitpos
+        self.decoder = decoder
+        self.feed_end = feed_end
+        # None while scanning: decode until the input or the stream ends
+        self.u_end = u_end
+        self.prefix = prefix
+
+    def _input(self):
+        if self.prefix:
+            data, self.prefix = self.prefix, b""
+            return data
+        if self.bitpos >= self.feed_end:
+            return None
+        byte, shift = divmod(self.bitpos, 8)
+        size = min(COMPRESSED_READ_SIZE, (self.feed_end - self.bitpos + 7) // 8)
+        f = self.source._file
+        f.seek(byte)
+        data = f.read(size + 1 if shift else size)
+        if shift:
+            # bzip2 blocks start mid-byte: realign them for the decoder
+            value = int.from_bytes(data.ljust(size + 1, b"\0"), "big") << shift
+            data = (value >> 8 & ((1 << 8 * size) - 1)).to_bytes(size, "big")
+        if not data:
+            return None
+        self.bitpos += 8 * len(data)
+        return data
+
+    def read(self, limit):
+        """Up to `limit` bytes of output; b"" at the end of the segment or stream."""
+        if self.u_end is not None:
+            limit = min(limit, self.u_end - self.u)
+        dec = self.decoder
+        while limit > 0 and not dec.eof:
+            if self.source.codec == "gzip":
+                data = dec.unconsumed_tail or self._input()
+            else:
+                data = self._input() if dec.needs_input else b""
+            if data is None:
+                if self.u_end is None:
+                    break
+                raise ValueError("compressed data ends early")
+            out = dec.decompress(data, limit)
+            if out:
+                self.u += len(out)
+                return out
+        if self.u_end is not None and limit > 0:
+            # The stream ended before the segment did
+            raise ValueError("compressed data ends early")
+        return b""
+
+    def consumed_bytes(self):
+        """Compressed byte offset the decoder has read up to (gzip, at end of stream)."""
+        return self.bitpos // 8 - len(self.decoder.unused_data)
+
+    def snapshot(self):
+        """(u, bitpos, decoder copy) to resume from later; zlib decoders only."""
+        # The copy keeps the decoder's unconsumed input, so bitpos stays as it is
+        return self.u, self.bitpos, self.decoder.copy()
+
+
+class CompressedFileSource(BufferedFileSource):
+    """
+    Decompressed view of a gzip, bzip2 or xz file, decoded on demand.
+
+    The file is split into segments that decode independently of each other:
+    gzip members, bzip2 blocks and xz blocks. They are found on the first open
+    and saved next to the file (<file>.zidx), so later opens know the size and
+    every restart point without decoding anything. A block read decodes from
+    the closest point before it: the start of its segment, the last decoder
+    if reading moves forward, or for gzip a snapshot of the zlib state taken
+    every COMPRESSED_SNAPSHOT_SPACING bytes while decoding. Those snapshots
+    only live in memory: the stdlib decoders cannot save their state to disk.
+    """
+
+    def __init__(self, path, codec, progress=None):
+        self.path = path
+        self.codec = codec
+        self._file = open(path, "rb")
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+        # Segments are (start, size, compressed start bit, end bit, offset of
+        # the stream header to decode after, or -1 if the segment starts with it)
+        self.segments = []
+        # Segment index -> [(start, bitpos, zlib decoder)] sorted by start
+        self._snapshots = {}
+        # Reader left where the last block read stopped
+        self._live = None
+        try:
+            st = os.fstat(self._file.fileno())
+            self._stamp = [st.st_size, st.st_mtime_ns]
+            self.segments = self._load_index()
+            if self.segments is None:
+                self.segments = self._scan(progress)
+                self._save_index()
+        except Exception:
+            self._file.close()
+            raise
+        self._starts = [seg[0] for seg in self.segments]
+        last = self.segments[-1] if self.segments else (0, 0)
+        self._size = last[0] + last[1]
+
+    @property
+    def index_path(self):
+        return self.path + COMPRESSED_INDEX_SUFFIX
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if (state.get("version") != COMPRESSED_INDEX_VERSION or state["codec"] != self.codec
+                    or state["stamp"] != self._stamp):
+                return None
+            return [tuple(seg) for seg in state["segments"]]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _save_index(self):
+        state = {
+            "version": COMPRESSED_INDEX_VERSION,
+            "codec": self.codec,
+            "stamp": self._stamp,
+            "segments": self.segments,
+        }
+        try:
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f, separators=(",", ":"))
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            # Read-only location: the next open scans again
+            pass
+
+    # --- first pass ---
+
+    def _scan(self, progress):
+        if self.codec == "bz2":
+            try:
+                return self._scan_bz2_blocks(progress)
+            except (OSError, ValueError, EOFError):
+                pass
+        elif self.codec == "xz":
+            try:
+                return self._scan_xz_index()
+            except (OSError, ValueError, lzma.LZMAError):
+                pass
+        return self._scan_streams(progress)
+
+    def _scan_streams(self, progress):
+        """Decode the whole file once, one segment per compressed stream (gzip member)."""
+        segments = []
+        csize = self._stamp[0]
+        u = c = 0
+        while c < csize:
+            self._file.seek(c)
+            head = self._file.read(COMPRESSED_READ_SIZE)
+            padding = len(head) - len(head.lstrip(b"\0"))
+            if padding:
+                # Stream padding (xz) or zero fill after the last stream
+                c += padding
+                continue
+            if detect_compression(head) != self.codec:
+                # Trailing garbage, ignored like the command line tools do
+                break
+            index = len(segments)
+            reader = _SegmentReader(self, index, u, c * 8, _new_decoder(self.codec), csize * 8)
+            next_snapshot = u + COMPRESSED_SNAPSHOT_SPACING
+            while True:
+                out = reader.read(COMPRESSED_READ_SIZE * 16)
+                if not out:
+                    break
+                if self.codec == "gzip" and reader.u >= next_snapshot:
+                    self._snapshots.setdefault(index, []).append(reader.snapshot())
+                    next_snapshot = reader.u + COMPRESSED_SNAPSHOT_SPACING
+                if progress:
+                    progress(reader.bitpos // 8, csize)
+            if not reader.decoder.eof:
+                # Truncated (a capture still being written, or cut short): show
+                # what decodes, like zcat does
+                segments.append((u, reader.u - u, c * 8, csize * 8, -1))
+                break
+            end = reader.consumed_bytes()
+            segments.append((u, reader.u - u, c * 8, end * 8, -1))
+            u, c = reader.u, end
+        return segments
+
+    def _scan_bz2_blocks(self, progress):
+        """One segment per bzip2 block, sized by decoding each block on its own."""
+        csize = self._stamp[0]
+        mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            markers = _bz2_markers(mm)
+        finally:
+            mm.close()
+        segments = []
+        u = 0
+        header_at = 0
+        for (bitpos, kind), (end, _) in zip(markers, markers[1:]):
+            if kind != "block":
+                # The next stream's header follows the marker and a 32-bit checksum
+                header_at = (bitpos + 48 + 32 + 7) // 8
+                continue
+            self._file.seek(header_at)
+            reader = _SegmentReader(self, len(segments), u, bitpos, bz2.BZ2Decompressor(),
+                                    self._feed_end(end), prefix=self._file.read(4))
+            size = 0
+            while True:
+                out = reader.read(COMPRESSED_READ_SIZE * 16)
+                if not out:
+                    break
+                size += len(out)
+            if not size:
+                # A block only produces output once it is complete, so a marker
+                # that was really part of the compressed data shows up here
+                raise ValueError(f"bad bzip2 block at bit {bitpos}")
+            segments.append((u, size, bitpos, end, header_at))
+            u += size
+            if progress:
+                progress(end // 8, csize)
+        if not segments:
+            raise ValueError("no bzip2 blocks found")
+        return segments
+
+    def _scan_xz_index(self):
+        """One segment per xz block, read from the index at the end of each stream."""
+        f = self._file
+        pos = self._stamp[0]
+        streams = []
+        while pos > 0:
+            f.seek(pos - 4)
+            if f.read(4) == b"\0\0\0\0":
+                pos -= 4
+                continue
+            f.seek(pos - 12)
+            footer = f.read(12)
+            if len(footer) != 12 or footer[10:] != b"YZ":
+                raise ValueError("bad xz stream footer")
+            index_size = (struct.unpack_from("<I", footer, 4)[0] + 1) * 4
+            index_start = pos - 12 - index_size
+            f.seek(index_start)
+            index = f.read(index_size)
+            if not index or index[0] != 0:
+                raise ValueError("bad xz index")
+            count, i = _read_varint(index, 1)
+            records = []
+            for _ in range(count):
+                unpadded, i = _read_varint(index, i)
+                usize, i = _read_varint(index, i)
+                records.append((unpadded, usize))
+            blocks_size = sum((unpadded + 3) & ~3 for unpadded, _ in records)
+            stream_start = index_start - blocks_size - 12
+            f.seek(stream_start)
+            if stream_start < 0 or f.read(6) != b"\xfd7zXZ\x00":
+                raise ValueError("bad xz stream header")
+            streams.append((stream_start, records))
+            pos = stream_start
+        segments = []
+        u = 0
+        for stream_start, records in reversed(streams):
+            c = stream_start + 12
+            for unpadded, usize in records:
+                if usize:
+                    segments.append((u, usize, c * 8, (c + unpadded) * 8, stream_start))
+                u += usize
+                c += (unpadded + 3) & ~3
+        return segments
+
+    # --- reads ---
+
+    def _feed_end(self, end):
+        """Bit offset up to which the decoder of a segment ending at bit `end` is given input."""
+        if self.codec == "bz2":
+            # Part of the next marker too, so the block's last symbols are flushed,
+            # but not enough of an end-of-stream marker to reach its checksum
+            return min(end + 64, self._stamp[0] * 8)
+        return end
+
+    def _new_reader(self, index, u=None, bitpos=None, decoder=None):
+        """Reader for segment `index`, from its start or from a saved decoder state."""
+        start, size, start_bit, end_bit, header_at = self.segments[index]
+        prefix = b""
+        if decoder is None:
+            u, bitpos, decoder = start, start_bit, _new_decoder(self.codec)
+            if header_at >= 0:
+                # A block on its own decodes after a copy of its stream's header
+                self._file.seek(header_at)
+                prefix = self._file.read(4 if self.codec == "bz2" else 12)
+        return _SegmentReader(self, index, u, bitpos, decoder, self._feed_end(end_bit), start + size, prefix)
+
+    def _reader_at(self, index, pos):
+        """A reader for segment `index` positioned as close to `pos` as possible."""
+        best = self._live if self._live is not None and self._live.index == index \
+            and self._live.u <= pos else None
+        snapshots = self._snapshots.get(index)
+        if snapshots:
+            i = bisect.bisect_right([snap[0] for snap in snapshots], pos) - 1
+            if i >= 0 and (best is None or snapshots[i][0] > best.u):
+                u, bitpos, decoder = snapshots[i]
+                return self._new_reader(index, u, bitpos, decoder.copy())
+        return best or self._new_reader(index)
+
+    def _advance(self, reader, limit):
+        out = reader.read(limit)
+        if self.codec == "gzip":
+            snapshots = self._snapshots.setdefault(reader.index, [])
+            last = snapshots[-1][0] if snapshots else self.segments[reader.index][0]
+            if reader.u >= last + COMPRESSED_SNAPSHOT_SPACING:
+                snapshots.append(reader.snapshot())
+        return out
+
+    def _fetch(self, index):
+        start = index * SOURCE_BLOCK_SIZE
+        end = min(start + SOURCE_BLOCK_SIZE, self._size)
+        parts = []
+        pos = start
+        while pos < end:
+            seg_index = bisect.bisect_right(self._starts, pos) - 1
+            reader = self._reader_at(seg_index, pos)
+            while reader.u < pos:
+                self._advance(reader, min(pos - reader.u, COMPRESSED_READ_SIZE * 16))
+            stop = min(end, reader.u_end)
+            while reader.u < stop:
+                parts.append(self._advance(reader, stop - reader.u))
+            self._live = reader
+            pos = stop
+        return b"".join(parts)
+
+    def refresh(self):
+        # A compressed file that grows would need a new first pass
+        return 0
+
+    def cache_bytes(self):
+        snapshots = sum(len(s) for s in self._snapshots.values())
+        return super().cache_bytes() + snapshots * COMPRESSED_SNAPSHOT_BYTES
+
+    def close(self):
+        self._snapshots.clear()
+        self._live = None
+        super().close()
+
+
+def _spool_to_tempfile(path, progress=None):
+    """Copy a non-seekable input (pipe, FIFO, device) into an anonymous temp file."""
+    spool = tempfile.TemporaryFile()
+    try:
+        done = 0
+        with open(path, "rb") as src:
+            while True:
+                chunk = src.read(SOURCE_BLOCK_SIZE * 16)
+                if not chunk:
+                    break
+                spool.write(chunk)
+                done += len(chunk)
+                if progress:
+                    progress(done, None)
+        spool.flush()
+        spool.seek(0)
+    except BaseException:
+        spool.close()
+        raise
+    return spool
+
+
+@perf.timed("open_data_source")
+def open_data_source(path, progress=None, decompress=True):
+    """
+    Open `path` with the cheapest backend that works for it; gzip, bzip2 and xz
+    files are opened decompressed unless `decompress` is false, or they do not
+    decode (a raw dump that merely starts with the magic bytes).
+    `progress(done, total)` is called while slow inputs are being copied or scanned.
+    """
+    mode = os.stat(path).st_mode
+    if stat.S_ISREG(mode):
+        if decompress:
+            with open(path, "rb") as f:
+                codec = detect_compression(f.read(8))
+            if codec:
+                try:
+                    source = CompressedFileSource(path, codec, progress)
+                except (zlib.error, OSError, lzma.LZMAError, EOFError, ValueError):
+                    # Not actually compressed, or corrupt from the start: show it as it is
+                    source = None
+                if source is not None:
+                    if len(source):
+                        return source
+                    source.close()
+        try:
+            return MappedFileSource(path)
+        except (OSError, ValueError):
+            return BufferedFileSource(path)
+    if stat.S_ISBLK(mode):
+        return BufferedFileSource(path)
+    # Pipes can only be read once: spool them to disk and map the copy
+    return MappedFileSource(fileobj=_spool_to_tempfile(path, progress))
+
+
+# ===========================
+# Background jobs
+# ===========================
+class JobCancelled(Exception):
+    """Raised inside a worker once its job has been cancelled."""
+
+
+class BackgroundJob:
+    """
+    Runs `work(job)` in a daemon thread.
+
+    The worker hands results to the UI with job.post(item) and reports
+    job.set_progress(done, total); both raise JobCancelled after cancel(), which
+    is how workers stop early. The UI thread collects posted items with drain()
+    (the viewer polls it through after()), so no Tk call ever happens off the
+    main thread.
+    """
+
+    def __init__(self, work, kind="", label=""):
+        self.work = work
+        self.kind = kind
+        self.label = label
+        self.progress = None  # (done, total or None)
+        self.result = None
+        self.error = None
+        self.done = False
+        self._items = queue.Queue()
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            self.result = self.work(self)
+        except JobCancelled:
+            pass
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def post(self, item):
+        self.check()
+        self._items.put(item)
+
+    def set_progress(self, done, total=None):
+        self.check()
+        self.progress = (done, total)
+
+    def drain(self):
+        items = []
+        while True:
+            try:
+                items.append(self._items.get_nowait())
+            except queue.Empty:
+                return items
+
+
+# ===========================
+# Annotation index
+# ===========================
+def parse_annotation_line(line):
+    """
+    Parse one "|offset|data|type|interp|" line.
+    Returns (offset, length, data, data_type, interp) or None for anything else.
+    `data` is the logged bytes, or None if the logged hex is not valid.
+    """
+    line = line.strip()
+    if not line.startswith("|"):
+        return None
+    parts = line.split("|")
+    if len(parts) < 4:
+        return None
+    offset_str = parts[1].strip()
+    data_str   = parts[2].strip()
+    data_type  = parts[3].strip()
+    interp     = parts[4].strip() if len(parts) > 4 else ""
+
+    try:
+        offset = int(offset_str, 16)
+    except ValueError:
+        return None
+
+    if data_str.lower().startswith("0x"):
+        data_str = data_str[2:]
+    try:
+        data = bytes.fromhex(data_str)
+    except ValueError:
+        data = None
+
+    if data_type in ["SignedInt16"]:
+        length = 2
+    elif data_type in ["Float32"]:
+        length = 4
+    else:
+        length = len(data_str)//2
+    return offset, length, data, data_type, interp
+
+
+def format_annotation_line(offset, raw_hex, data_type, interp):
+    """The "|offset|data|type|interp|" line parse_annotation_line reads back."""
+    return f"|{offset:08X}|{raw_hex}|{data_type}|{interp}|"
+
+
+def escape_annotation_value(text):
+    """`text` with the characters that would break a parser line ("|", CR, LF) as \\xNN escapes."""
+    return text.replace("|", "\\x7C").replace("\r", "\\x0D").replace("\n", "\\x0A")
+
+
+class AnnotationIndex:
+    """
+    Offset-sorted index over a parser file (<file>.txt).
+
+    Offsets and lengths live in parallel array("Q") columns sorted by offset,
+    with (data, data_type, interp) records alongside. The index remembers how
+    many bytes of the parser file it has consumed, so refresh() only parses
+    lines appended since then, and save()/load() keep it next to the parser
+    file between sessions.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offsets = array("Q")
+        self.lengths = array("Q")
+        self.records = []
+        self.max_length = 0
+        # Bytes of the parser file already parsed, plus its last line to detect rewrites
+        self.parsed_bytes = 0
+        self.last_line = b""
+        # Unterminated last line (parsed, but read again once it grows) and its entry
+        self.partial_line = b""
+        self.partial_entry = None
+        self.mtime = None
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @property
+    def index_path(self):
+        return self.path + ANNOTATION_INDEX_SUFFIX
+
+    @classmethod
+    @perf.timed("AnnotationIndex.open")
+    def open(cls, path, progress=None):
+        """Load the saved index for `path` if there is one, then catch up with the file."""
+        index = cls.load(path) or cls(path)
+        index.refresh(progress)
+        return index
+
+    def clear(self):
+        self.offsets = array("Q")
+        self.lengths = array("Q")
+        self.records = []
+        self.max_length = 0
+        self.parsed_bytes = 0
+        self.last_line = b""
+        self.partial_line = b""
+        self.partial_entry = None
+        self.mtime = None
+
+    def _still_prefix(self, f):
+        """True if the file still starts with what has been parsed so far."""
+        if not self.last_line:
+            return self.parsed_bytes == 0
+        f.seek(self.parsed_bytes - len(self.last_line))
+        return f.read(len(self.last_line)) == self.last_line
+
+    def refresh(self, progress=None):
+        """Parse the lines appended since the last call. Returns the number of new entries."""
+        st = os.stat(self.path)
+        if st.st_size == self.parsed_bytes + len(self.partial_line) and st.st_mtime == self.mtime:
+            return 0
+        new = []
+        with open(self.path, "rb") as f:
+            if st.st_size < self.parsed_bytes or not self._still_prefix(f):
+                # Truncated or rewritten: start over
+                self.clear()
+            before = len(self)
+            # The unterminated last line is read again, finished or not
+            self._drop_partial()
+            f.seek(self.parsed_bytes)
+            done = self.parsed_bytes
+            for line_no, raw in enumerate(f, 1):
+                if not raw.endswith(b"\n"):
+                    # Kept without moving parsed_bytes past it, so it is re-read if it grows
+                    self.partial_line = raw
+                    try:
+                        self.partial_entry = parse_annotation_line(raw.decode("utf-8"))
+                    except UnicodeDecodeError:
+                        # Cut inside a character while being written
+                        self.partial_entry = None
+                    if self.partial_entry is not None:
+                        new.append(self.partial_entry)
+                    break
+                done += len(raw)
+                self.parsed_bytes = done
+                self.last_line = raw
+                entry = parse_annotation_line(raw.decode("utf-8"))
+                if entry is not None:
+                    new.append(entry)
+                if progress and line_no % PARSER_BATCH_LINES == 0:
+                    progress(done, st.st_size)
+        self.mtime = st.st_mtime
+        self.extend(new)
+        return len(self) - before
+
+    def _drop_partial(self):
+        """Remove the entry of the unterminated last line from the columns."""
+        entry = self.partial_entry
+        self.partial_line = b""
+        self.partial_entry = None
+        if entry is None:
+            return
+        i = bisect.bisect_left(self.offsets, entry[0])
+        while i < len(self.offsets) and self.offsets[i] == entry[0]:
+            if self.entry(i) == tuple(entry):
+                del self.offsets[i]
+                del self.lengths[i]
+                del self.records[i]
+                return
+            i += 1
+
+    def extend(self, entries):
+        """Merge (offset, length, data, data_type, interp) entries into the index."""
+        if not entries:
+            return
+        entries = sorted(entries, key=lambda e: e[0])
+        if self.offsets and entries[0][0] < self.offsets[-1]:
+            old = zip(self.offsets, self.lengths, self.records)
+            new = ((e[0], e[1], e[2:]) for e in entries)
+            merged = list(heapq.merge(old, new, key=lambda e: e[0]))
+            self.offsets = array("Q", (e[0] for e in merged))
+            self.lengths = array("Q", (e[1] for e in merged))
+            self.records = [e[2] for e in merged]
+        else:
+            self.offsets.extend(e[0] for e in entries)
+            self.lengths.extend(e[1] for e in entries)
+            self.records.extend(e[2:] for e in entries)
+        self.max_length = max(self.max_length, max(e[1] for e in entries))
+
+    def add(self, offset, length, data, data_type, interp):
+        self.extend([(offset, length, data, data_type, interp)])
+
+    def query(self, start, end):
+        """Indices of the entries intersecting the byte range [start, end)."""
+        offsets = self.offsets
+        i = bisect.bisect_left(offsets, max(0, start - self.max_length + 1))
+        hits = []
+        while i < len(offsets) and offsets[i] < end:
+            if offsets[i] + self.lengths[i] > start:
+                hits.append(i)
+            i += 1
+        return hits
+
+    def entry(self, i):
+        """(offset, length, data, data_type, interp) of entry `i`."""
+        return (self.offsets[i], self.lengths[i]) + tuple(self.records[i])
+
+    def save(self):
+        # The unterminated last line is not in parsed_bytes, so its entry is not saved either
+        partial = tuple(self.partial_entry) if self.partial_entry is not None else None
+        entries = [self.entry(i) for i in range(len(self))]
+        if partial is not None and partial in entries:
+            entries.remove(partial)
+        state = {
+            "version": ANNOTATION_INDEX_VERSION,
+            "parsed_bytes": self.parsed_bytes,
+            "last_line": self.last_line.hex(),
+            "mtime": self.mtime,
+            "entries": [[off, length, data.hex() if data is not None else None, data_type, interp]
+                        for off, length, data, data_type, interp in entries],
+        }
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, separators=(",", ":"))
+        os.replace(tmp_path, self.index_path)
+
+    @classmethod
+    def load(cls, path):
+        """Saved index for parser file `path`, or None if missing or unreadable."""
+        index = cls(path)
+        try:
+            with open(index.index_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("version") != ANNOTATION_INDEX_VERSION:
+                return None
+            index.parsed_bytes = state["parsed_bytes"]
+            index.last_line = bytes.fromhex(state["last_line"])
+            index.mtime = state["mtime"]
+            entries = state["entries"]
+            index.offsets = array("Q", (e[0] for e in entries))
+            index.lengths = array("Q", (e[1] for e in entries))
+            index.records = [(bytes.fromhex(e[2]) if e[2] is not None else None, e[3], e[4])
+                             for e in entries]
+            index.max_length = max(index.lengths, default=0)
+        except (OSError, ValueError, KeyError, IndexError, TypeError):
+            return None
+        return index
+
+
+def annotation_matches(data, offset, length, expected):
+    """True if `data` holds the logged bytes `expected` at `offset`."""
+    if expected is None or len(expected) != length or offset + length > len(data):
+        return False
+    return data.view(offset, offset + length) == expected
+
+
+class AnnotationWriter:
+    """
+    Buffered, append-only writer for a parser file.
+
+    write() queues a line (skipping exact duplicates of lines already in the
+    file or queue) and flushes by itself once ANNOTATION_FLUSH_LINES are
+    pending; the viewer also flushes when idle and on close. The file stays
+    open between flushes and is fsync'ed every ANNOTATION_FSYNC_LINES lines
+    and on close.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._pending = []
+        self._seen = None
+        self._file = None
+        self._unsynced = 0
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def _load_seen(self):
+        self._seen = set()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    self._seen.add(line.rstrip("\n"))
+        except FileNotFoundError:
+            pass
+
+    def write(self, line):
+        """Queue `line`. Returns False if it is a duplicate and was skipped."""
+        if self._seen is None:
+            self._load_seen()
+        if line in self._seen:
+            return False
+        self._seen.add(line)
+        self._pending.append(line)
+        if len(self._pending) >= ANNOTATION_FLUSH_LINES:
+            self.flush()
+        return True
+
+    def write_many(self, lines):
+        """Queue many lines and write them out in one go. Returns the number of new lines."""
+        if self._seen is None:
+            self._load_seen()
+        new = 0
+        for line in lines:
+            if line not in self._seen:
+                self._seen.add(line)
+                self._pending.append(line)
+                new += 1
+        self.flush()
+        return new
+
+    def flush(self, sync=False):
+        """Write queued lines; fsync when asked to or at the next checkpoint."""
+        if self._pending:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write("\n".join(self._pending) + "\n")
+            self._file.flush()
+            self._unsynced += len(self._pending)
+            self._pending = []
+        if self._file is not None and self._unsynced and \
+                (sync or self._unsynced >= ANNOTATION_FSYNC_LINES):
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def close(self):
+        try:
+            self.flush(sync=True)
+        finally:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def merge_ranges(ranges):
+    """Sort (start, end) ranges and merge overlapping or adjacent ones."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class VerificationReport:
+    """Result of verify_annotations: matched byte ranges plus every stale entry."""
+
+    def __init__(self, total=0):
+        self.total = total
+        self.matched = 0
+        # Sorted, merged (start, end) ranges of matching entries
+        self.matched_ranges = []
+        # (offset, data_type, reason, expected_hex, actual_hex) for entries that do not match
+        self.problems = []
+
+    def ranges_between(self, start, end):
+        """Matched ranges intersecting [start, end)."""
+        return ranges_between(self.matched_ranges, start, end)
+
+    def covers(self, start, end):
+        """True if [start, end) lies within one matched range."""
+        i = bisect.bisect_right(self.matched_ranges, (start, float("inf"))) - 1
+        return i >= 0 and self.matched_ranges[i][1] >= end
+
+    def summary(self):
+        return f"{self.matched} of {self.total} entries match, {len(self.problems)} stale or mismatched"
+
+    def to_text(self, limit=None):
+        lines = [self.summary(), ""]
+        for offset, data_type, reason, expected, actual in self.problems[:limit]:
+            lines.append(f"{offset:08X}  {data_type:<14} {reason:<13} logged 0x{expected}  file 0x{actual}")
+        if limit is not None and len(self.problems) > limit:
+            lines.append(f"... {len(self.problems) - limit} more")
+        return "\n".join(lines)
+
+
+@perf.timed("verify_annotations")
+def verify_annotations(index, data, progress=None):
+    """
+    Check every entry of `index` against `data` in one offset-ordered pass.
+    Bytes are compared directly against memoryview slices of the data source;
+    hex is only produced for the entries that end up in the report.
+    """
+    report = VerificationReport(len(index))
+    data_len = len(data)
+    hits = []
+    for i, (offset, length) in enumerate(zip(index.offsets, index.lengths)):
+        expected, data_type = index.records[i][:2]
+        end = offset + length
+        if expected is not None and len(expected) == length and end <= data_len \
+                and data.view(offset, end) == expected:
+            # Entries are sorted by offset: extend the last range when adjacent
+            if hits and offset <= hits[-1][1]:
+                if end > hits[-1][1]:
+                    hits[-1] = (hits[-1][0], end)
+            else:
+                hits.append((offset, end))
+            report.matched += 1
+        else:
+            if expected is None:
+                reason = "invalid data"
+            elif offset >= data_len:
+                reason = "out of range"
+            elif end > data_len:
+                reason = "truncated"
+            else:
+                reason = "mismatch"
+            actual = data.view(offset, min(end, data_len)).hex().upper() if offset < data_len else ""
+            logged = expected.hex().upper() if expected is not None else ""
+            report.problems.append((offset, data_type, reason, logged, actual))
+        if progress and i % PARSER_BATCH_LINES == 0:
+            progress(i, report.total)
+    report.matched_ranges = hits
+    return report
+
+
+# ===========================
+# Pattern search
+# ===========================
+def compile_search_pattern(text, mode):
+    """
+    Compile a search pattern to (bytes regex, longest match length).
+
+    Hex:    "DE AD ?? EF" - pairs of hex digits, "??" matches any byte
+    ASCII:  literal ASCII text
+    UTF-16: literal text encoded as UTF-16 little-endian
+    Regex:  a Python `re` bytes pattern (\\xNN escapes for raw bytes)
+    Raises ValueError for patterns that cannot be compiled.
+    """
+    if mode == "Hex":
+        digits = "".join(text.split())
+        if digits.lower().startswith("0x"):
+            digits = digits[2:]
+        if not digits or len(digits) % 2:
+            raise ValueError("Hex pattern needs pairs of hex digits")
+        parts = []
+        for i in range(0, len(digits), 2):
+            pair = digits[i:i+2]
+            if pair == "??":
+                parts.append(b".")
+            else:
+                parts.append(re.escape(bytes([int(pair, 16)])))
+        return re.compile(b"".join(parts), re.DOTALL), len(digits) // 2
+    if mode == "ASCII":
+        needle = text.encode("ascii")
+    elif mode == "UTF-16":
+        needle = text.encode("utf-16-le")
+    elif mode == "Regex":
+        try:
+            return re.compile(text.encode("latin-1"), re.DOTALL), SEARCH_REGEX_MAX_MATCH
+        except re.error as e:
+            raise ValueError(f"Bad regular expression: {e}")
+    else:
+        raise ValueError(f"Unknown search mode: {mode}")
+    if not needle:
+        raise ValueError("Empty search pattern")
+    return re.compile(re.escape(needle)), len(needle)
+
+
+def search_data(data, regex, max_match, start=0, chunk_size=SEARCH_CHUNK_SIZE, progress=None):
+    """
+    Yield (offset, length) of every non-empty match of `regex` in `data`.
+
+    The data is scanned chunk by chunk through memoryviews; each chunk is
+    extended by max_match - 1 bytes and only matches starting inside the chunk
+    proper are reported. A chunk is searched from where the previous chunk's
+    last match ended, so like a single finditer() over the whole data, matches
+    never overlap and nothing is missed or reported twice at the edges.
+    """
+    size = len(data)
+    overlap = max(0, max_match - 1)
+    pos = start
+    last_end = start
+    while pos < size:
+        chunk_end = min(size, pos + chunk_size)
+        # Skipped when the previous match covers the whole chunk
+        if last_end < chunk_end:
+            view = data.view(pos, min(size, chunk_end + overlap))
+            limit = chunk_end - pos
+            for m in regex.finditer(view, max(0, last_end - pos)):
+                if m.start() >= limit:
+                    break
+                if m.end() > m.start():
+                    last_end = pos + m.end()
+                    yield pos + m.start(), m.end() - m.start()
+            del view
+        pos = chunk_end
+        if progress:
+            progress(pos - start, size - start)
+
+
+# ===========================
+# Row formatting
+# ===========================
+# Printable ASCII stays, everything else becomes "."
+ASCII_TABLE = bytes(b if 32 <= b < 127 else ord(".") for b in range(256))
+
+
+def format_rows(data, start_offset, group_size, bytes_per_line=BYTES_PER_LINE):
+    """
+    Format a block of rows in bulk.
+
+    `data` is any bytes-like object starting at row offset `start_offset`.
+    Returns (offset_lines, hex_lines, ascii_lines), one string per row, in the
+    same layout the viewer has always used: "%08X" offsets, groups of
+    `group_size` bytes as upper-case hex each followed by one space (a short
+    last group is padded), and "." for non-printable ASCII.
+    """
+    size = len(data)
+    if not size:
+        return [], [], []
+    group_width = group_size * 2 + 1
+    row_width = (bytes_per_line // group_size) * group_width
+
+    # One hex() call for the whole block. Rows start on group boundaries, so the
+    # separators line up and every full row is exactly row_width characters.
+    hex_str = data.hex(" ", -group_size).upper() + " "
+    hex_lines = [hex_str[i : i + row_width] for i in range(0, len(hex_str), row_width)]
+    tail = size % bytes_per_line
+    if tail:
+        groups = (tail + group_size - 1) // group_size
+        hex_lines[-1] = hex_lines[-1].ljust(groups * group_width)
+
+    ascii_str = bytes(data).translate(ASCII_TABLE).decode("ascii")
+    ascii_lines = [ascii_str[i : i + bytes_per_line] for i in range(0, size, bytes_per_line)]
+
+    offset_lines = [f"{off:08X}" for off in range(start_offset, start_offset + size, bytes_per_line)]
+    return offset_lines, hex_lines, ascii_lines
+
+
+def benchmark_format_rows(size_mb=64, repeat=3):
+    """Print format_rows throughput in MB/s for each grouping size."""
+    data = os.urandom(size_mb * 1024 * 1024)
+    for group_size in (1, 2, 4):
+        best = None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            format_rows(data, 0, group_size)
+            elapsed = time.perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"group {group_size}: {size_mb / best:8.1f} MB/s")
+
+
+# ===========================
+# Row page cache
+# ===========================
+class RowPageCache:
+    """
+    LRU cache of formatted rows of one data source, in pages of ROW_PAGE_ROWS
+    rows keyed by (page index, grouping size).
+
+    rows() assembles any row range from cached pages and formats only the
+    missing ones, so scrolling back or switching the grouping back costs a
+    lookup. prefetch() formats the pages either side of a range ahead of time;
+    it is meant for a background job, and the cache is safe to share between
+    that job and the UI thread. Pages are evicted least recently used first
+    once their estimated size exceeds `budget` bytes. A page is reformatted
+    when the data source grew or shrank under it (follow mode); clear() drops
+    everything, e.g. after the file was rewritten.
+    """
+
+    def __init__(self, data, budget=ROW_CACHE_BYTES):
+        self.data = data
+        self.budget = budget
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self._pages = OrderedDict()  # (page, group_size) -> (nbytes, lines, cost)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pages)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self.used = 0
+
+    def _page_span(self, page):
+        start = page * ROW_PAGE_ROWS * BYTES_PER_LINE
+        return start, min(len(self.data), start + ROW_PAGE_ROWS * BYTES_PER_LINE)
+
+    def _lookup(self, key, nbytes):
+        """Cached lines of a page if they still cover `nbytes` bytes (and mark them recently used)."""
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is None or entry[0] != nbytes:
+                return None
+            self._pages.move_to_end(key)
+            return entry[1]
+
+    def _format(self, page, group_size):
+        start, end = self._page_span(page)
+        with perf.timer("format_rows"):
+            view = self.data.view(start, end)
+            lines = format_rows(view, start, group_size)
+            del view
+        # str objects are ~49 bytes plus one per character, and each list holds a pointer per row
+        cost = sum(sum(map(len, column)) + 57 * len(column) for column in lines)
+        with self._lock:
+            old = self._pages.pop((page, group_size), None)
+            if old is not None:
+                self.used -= old[2]
+            self._pages[(page, group_size)] = (end - start, lines, cost)
+            self.used += cost
+            # Always keep the page just formatted, even if it alone is over budget
+            while self.used > self.budget and len(self._pages) > 1:
+                _, (_, _, evicted) = self._pages.popitem(last=False)
+                self.used -= evicted
+        return lines
+
+    def page(self, page, group_size):
+        """(offset_lines, hex_lines, ascii_lines) of one page."""
+        start, end = self._page_span(page)
+        lines = self._lookup((page, group_size), end - start)
+        if lines is not None:
+            self.hits += 1
+            return lines
+        self.misses += 1
+        return self._format(page, group_size)
+
+    def rows(self, first_row, last_row, group_size):
+        """Like format_rows() over rows [first_row, last_row), but served from cached pages."""
+        offset_lines, hex_lines, ascii_lines = [], [], []
+        last_row = min(last_row, (len(self.data) + BYTES_PER_LINE - 1) // BYTES_PER_LINE)
+        if last_row <= first_row:
+            return offset_lines, hex_lines, ascii_lines
+        for page in range(first_row // ROW_PAGE_ROWS, (last_row - 1) // ROW_PAGE_ROWS + 1):
+            base = page * ROW_PAGE_ROWS
+            lo = max(0, first_row - base)
+            hi = last_row - base
+            offsets, hexes, asciis = self.page(page, group_size)
+            offset_lines += offsets[lo:hi]
+            hex_lines += hexes[lo:hi]
+            ascii_lines += asciis[lo:hi]
+        return offset_lines, hex_lines, ascii_lines
+
+    def prefetch(self, first_row, last_row, group_size, pages=ROW_CACHE_READAHEAD_PAGES, check=None):
+        """
+        Format the pages of rows [first_row, last_row) and `pages` pages either
+        side of them that are not cached yet, nearest first. Returns how many
+        were formatted. `check()` is called between pages and may raise to stop.
+        """
+        page_count = (len(self.data) + ROW_PAGE_ROWS * BYTES_PER_LINE - 1) // (ROW_PAGE_ROWS * BYTES_PER_LINE)
+        first = first_row // ROW_PAGE_ROWS
+        last = max(first, (last_row - 1) // ROW_PAGE_ROWS)
+        order = list(range(first, last + 1))
+        for distance in range(1, pages + 1):
+            order += [last + distance, first - distance]
+        done = 0
+        for page in order:
+            if not 0 <= page < page_count:
+                continue
+            if check is not None:
+                check()
+            start, end = self._page_span(page)
+            if self._lookup((page, group_size), end - start) is None:
+                self._format(page, group_size)
+                done += 1
+        self.prefetched += done
+        return done
+
+    def stats(self):
+        """Counters for status displays and profiling."""
+        return {"pages": len(self._pages), "bytes": self.used, "budget": self.budget,
+                "hits": self.hits, "misses": self.misses, "prefetched": self.prefetched}
+
+
+# ===========================
+# Row geometry
+# ===========================
+class RowLayout:
+    """
+    Column geometry of one row for a given grouping size.
+
+    A row of the hex column is `bytes_per_line // group_size` groups, each printed
+    as 2*group_size hex digits followed by one space. Column <-> byte mapping is
+    computed from that, with a per-column lookup table shared by all rows, so no
+    per-group records are needed.
+    """
+
+    def __init__(self, group_size, bytes_per_line=BYTES_PER_LINE):
+        self.group_size = group_size
+        self.bytes_per_line = bytes_per_line
+        self.group_width = group_size * 2 + 1
+        self.hex_width = (bytes_per_line // group_size) * self.group_width
+
+        # Byte index in the row for each hex column. The separator after a group
+        # belongs to the last byte of that group.
+        table = bytearray(self.hex_width)
+        for col in range(self.hex_width):
+            group, inner = divmod(col, self.group_width)
+            table[col] = group * group_size + min(inner // 2, group_size - 1)
+        self.hex_col_to_byte = bytes(table)
+
+    def byte_at_hex_col(self, col):
+        """Byte index within the row under hex column `col` (clamped to the row)."""
+        if col < 0:
+            return 0
+        if col >= self.hex_width:
+            return self.bytes_per_line - 1
+        return self.hex_col_to_byte[col]
+
+    def byte_at_ascii_col(self, col):
+        return max(0, min(col, self.bytes_per_line - 1))
+
+    def hex_col(self, byte_in_row):
+        """First hex column of a byte."""
+        group, inner = divmod(byte_in_row, self.group_size)
+        return group * self.group_width + inner * 2
+
+    def hex_end_col(self, byte_in_row):
+        """Column just past a byte; includes the separator when the byte ends its group."""
+        group, inner = divmod(byte_in_row, self.group_size)
+        if inner == self.group_size - 1:
+            return (group + 1) * self.group_width
+        return group * self.group_width + inner * 2 + 2
+
+
+# ===========================
+# Interpretation
+# ===========================
+def int_to_decimal(value, check=None):
+    """
+    str(value) for a non-negative int of any size.
+
+    Large values are split by divide and conquer on powers of ten, so the
+    conversion is not bound by sys.int_max_str_digits. `check()` is called
+    between steps and may raise to abort (see BackgroundJob.check).
+    """
+    base = 10 ** 1000
+    if value < base:
+        return str(value)
+    # powers[k] == 10 ** (1000 * 2**k)
+    powers = [base]
+    while powers[-1] ** 2 <= value:
+        powers.append(powers[-1] ** 2)
+
+    def convert(n, k, width):
+        if k < 0:
+            text = str(n)
+            return text.zfill(width) if width else text
+        if check:
+            check()
+        hi, lo = divmod(n, powers[k])
+        digits = 1000 << k
+        if not width and not hi:
+            return convert(lo, k - 1, 0)
+        return convert(hi, k - 1, width - digits if width else 0) + convert(lo, k - 1, digits)
+
+    return convert(value, len(powers) - 1, 0)
+
+
+class SelectionInterpretation:
+    """
+    Interpretations of the byte range [start, end) of a data source, computed on demand.
+
+    preview(itype) is always cheap: hex of long selections is cut to
+    INTERP_PREVIEW_BYTES with a length note, and so are long decimals.
+    full(itype) builds and caches the complete value; expensive(itype) tells
+    whether that is slow enough to run in a background job, and deferred(itype)
+    whether it should wait until someone actually asks for it.
+    """
+
+    def __init__(self, data, start, end):
+        self.data = data
+        self.start = start
+        self.end = end
+        self._full = {}
+
+    def __len__(self):
+        return self.end - self.start
+
+    def _head(self, n):
+        return bytes(self.data.view(self.start, min(self.end, self.start + n)))
+
+    def expensive(self, itype):
+        return itype == "Decimal" and len(self) > INTERP_INLINE_BYTES
+
+    def deferred(self, itype):
+        return itype == "Decimal" and len(self) > INTERP_LAZY_BYTES
+
+    def computed(self, itype):
+        return itype in self._full or not self.expensive(itype)
+
+    def full(self, itype, check=None):
+        """Complete value of `itype` ("" if the selection is too short for it)."""
+        value = self._full.get(itype)
+        if value is not None:
+            return value
+        size = len(self)
+        if itype == "Hex (BE)":
+            value = "0x" + self.data.view(self.start, self.end).hex().upper() if size else ""
+        elif itype == "Hex (LE)":
+            value = "0x" + self.data.view(self.start, self.end)[::-1].hex().upper() if size else ""
+        elif itype == "SignedInt16":
+            value = str(int.from_bytes(self._head(2), byteorder="little", signed=True)) if size >= 2 else ""
+        elif itype == "Float32":
+            value = str(struct.unpack("<f", self._head(4))[0]) if size >= 4 else ""
+        elif itype == "Decimal":
+            number = int.from_bytes(self.data.view(self.start, self.end), byteorder="little", signed=False)
+            value = int_to_decimal(number, check) if size else ""
+        else:
+            raise ValueError(f"Unknown interpretation: {itype}")
+        self._full[itype] = value
+        return value
+
+    def decoder_table(self, limit=DECODER_PREVIEW_VALUES):
+        """
+        (decoder, count, preview) for every entry of DECODERS. The selection is
+        read once, only as far as the widest type needs for `limit` values.
+        """
+        size = len(self)
+        buf = self._head(limit * 8)
+        table = []
+        for decoder, (fmt, _) in DECODERS.items():
+            count = size // struct.calcsize(fmt)
+            table.append((decoder, count, format_values(decode_array(buf, decoder, limit), count)))
+        return table
+
+    def decoded(self, decoder):
+        """The whole selection as a comma-separated array of `decoder` values."""
+        return format_values(decode_array(self.data.view(self.start, self.end), decoder))
+
+    def preview(self, itype):
+        """Short display form of `itype`, or None while an expensive value is not computed yet."""
+        size = len(self)
+        if itype in ("Hex (BE)", "Hex (LE)") and size > INTERP_PREVIEW_BYTES:
+            if itype == "Hex (BE)":
+                shown = self._head(INTERP_PREVIEW_BYTES)
+            else:
+                shown = bytes(self.data.view(self.end - INTERP_PREVIEW_BYTES, self.end)[::-1])
+            return f"0x{shown.hex().upper()}... ({size} bytes)"
+        if not self.computed(itype):
+            return None
+        value = self.full(itype)
+        if itype == "Decimal" and len(value) > 2 * INTERP_PREVIEW_DIGITS:
+            return (f"{value[:INTERP_PREVIEW_DIGITS]}...{value[-INTERP_PREVIEW_DIGITS:]}"
+                    f" ({len(value)} digits)")
+        return value
+
+
+def decode_array(buf, decoder, limit=None):
+    """
+    Values of `buf` read as a packed array of DECODERS[decoder], as Python
+    numbers. A trailing partial item is ignored; `limit` caps the count.
+    Uses numpy when it is installed, otherwise array (byteswapped when the
+    byte order is not native) or struct.iter_unpack for float16.
+    """
+    fmt, dtype = DECODERS[decoder]
+    size = struct.calcsize(fmt)
+    count = len(buf) // size
+    if limit is not None:
+        count = min(count, limit)
+    buf = memoryview(buf)[:count * size]
+    if np is not None:
+        return np.frombuffer(buf, dtype=dtype).tolist()
+    code = fmt[1]
+    if code == "e" or array(code).itemsize != size:
+        return [v for (v,) in struct.iter_unpack(fmt, buf)]
+    values = array(code)
+    values.frombytes(buf)
+    if size > 1 and (fmt[0] == "<") != (sys.byteorder == "little"):
+        values.byteswap()
+    return values.tolist()
+
+
+def format_values(values, total=None):
+    """Comma-separated values, with a count note when only the first of `total` are shown."""
+    text = ", ".join(map(str, values))
+    if total is not None and total > len(values):
+        text += f", ... ({total} values)"
+    return text
+
+
+def interpret_bytes(selected_bytes):
+    """
+    Interpret a selection the way the bottom panel shows it.
+    Returns {interp_type: full text} for every entry of INTERP_TYPES; types
+    that need more bytes than were selected map to "".
+    """
+    selected_bytes = bytes(selected_bytes)
+    interp = SelectionInterpretation(BytesDataSource(selected_bytes), 0, len(selected_bytes))
+    return {itype: interp.full(itype) for itype in INTERP_TYPES}
+
+
+# ===========================
+# Structure templates
+# ===========================
+# Template field types and their struct codes. "char" is text (cut at the
+# first NUL), "bytes" raw data shown as hex, "pad" skipped bytes.
+TEMPLATE_TYPES = {
+    "i8": "b", "u8": "B", "i16": "h", "u16": "H",
+    "i32": "i", "u32": "I", "i64": "q", "u64": "Q",
+    "f16": "e", "f32": "f", "f64": "d",
+    "char": "s", "bytes": "s", "pad": "x",
+}
+TEMPLATE_ENDIAN = {"little": "<", "le": "<", "<": "<", "big": ">", "be": ">", ">": ">"}
+# Records decoded between two progress updates
+TEMPLATE_BATCH_RECORDS = 65536
+
+_FIELD_TYPE_RE = re.compile(r"^\s*(\w+)\s*(?:\[\s*(\d+)\s*\])?\s*(\S+)?\s*$")
+
+
+def _parse_field_type(spec):
+    """("u16[4] be" or ("u16", 4, "be")) -> (type, count, endian or None)."""
+    if isinstance(spec, (tuple, list)):
+        ftype, count, endian = (list(spec) + [1, None])[:3]
+    else:
+        m = _FIELD_TYPE_RE.match(spec)
+        if not m:
+            raise ValueError(f"Bad field type: {spec!r}")
+        ftype, count, endian = m.group(1), int(m.group(2) or 1), m.group(3)
+    if ftype not in TEMPLATE_TYPES:
+        raise ValueError(f"Unknown field type: {ftype}")
+    if endian is not None and endian.lower() not in TEMPLATE_ENDIAN:
+        raise ValueError(f"Unknown byte order: {endian}")
+    if count < 1:
+        raise ValueError(f"Bad field count: {count}")
+    return ftype, count, TEMPLATE_ENDIAN[endian.lower()] if endian else None
+
+
+class StructTemplate:
+    """
+    A record layout compiled once to struct.Struct objects.
+
+    Consecutive fields with the same byte order share one precompiled Struct;
+    a layout in a single byte order (the usual case) is one Struct, so N
+    records are decoded with a single Struct.iter_unpack. unpack() turns the
+    flat tuple into one value per field: arrays become tuples, char fields
+    bytes up to the first NUL.
+    """
+
+    def __init__(self, name, fields, endian="<"):
+        """`fields` is a list of (name, type, count, endian or None)."""
+        self.name = name
+        # (name, type, count, offset in record, size) of every non-pad field
+        self.fields = []
+        # (Struct, offset in record) per run of fields with the same byte order
+        self.segments = []
+        # (type, first flat index, count) per field, to regroup unpacked tuples
+        self._layout = []
+
+        offset = 0
+        values = 0
+        run_endian, run_codes, run_start = None, [], 0
+        for fname, ftype, count, fendian in fields:
+            fendian = fendian or endian
+            if run_codes and fendian != run_endian:
+                self.segments.append((struct.Struct(run_endian + "".join(run_codes)), run_start))
+                run_codes, run_start = [], offset
+            run_endian = fendian
+            code = TEMPLATE_TYPES[ftype]
+            run_codes.append(f"{count}{code}")
+            size = struct.calcsize(f"<{count}{code}")
+            if ftype != "pad":
+                self.fields.append((fname, ftype, count, offset, size))
+                n = 1 if code == "s" else count
+                self._layout.append((ftype, values, n))
+                values += n
+            offset += size
+        if run_codes:
+            self.segments.append((struct.Struct(run_endian + "".join(run_codes)), run_start))
+        self.size = offset
+        if not self.size:
+            raise ValueError("Template has no fields")
+        # Every field is one value that needs no post-processing
+        self._flat = all(n == 1 and ftype not in ("char", "bytes") for ftype, _, n in self._layout)
+
+    @property
+    def field_names(self):
+        return [f[0] for f in self.fields]
+
+    def _group(self, flat):
+        if self._flat:
+            return flat
+        record = []
+        for ftype, first, n in self._layout:
+            if ftype == "char":
+                record.append(flat[first].split(b"\0", 1)[0])
+            elif n == 1:
+                record.append(flat[first])
+            else:
+                record.append(flat[first:first + n])
+        return tuple(record)
+
+    def unpack(self, buf, offset=0):
+        """Field values of the record at `offset` of `buf`."""
+        if len(self.segments) == 1:
+            return self._group(self.segments[0][0].unpack_from(buf, offset))
+        flat = ()
+        for st, seg_offset in self.segments:
+            flat += st.unpack_from(buf, offset + seg_offset)
+        return self._group(flat)
+
+    def iter_unpack(self, buf, count=None):
+        """Field values of consecutive records in `buf` (at most `count`)."""
+        available = len(buf) // self.size
+        count = available if count is None else min(count, available)
+        if len(self.segments) == 1:
+            records = self.segments[0][0].iter_unpack(memoryview(buf)[:count * self.size])
+            return records if self._flat else map(self._group, records)
+        return (self.unpack(buf, i * self.size) for i in range(count))
+
+
+def compile_template(spec):
+    """
+    Compile a template to a StructTemplate. `spec` is DSL text, JSON text, or a dict.
+
+    DSL, one field per line ("#" starts a comment):
+
+        struct Header          optional name
+        endian little          default byte order (little/big, le/be, < or >)
+        magic    char[4]
+        version  u16
+        flags    u32 be        per-field byte order
+        table    u32[8]        arrays
+        _        pad[4]        skipped bytes
+
+    Types: i8/u8/i16/u16/i32/u32/i64/u64, f16/f32/f64, char[N], bytes[N], pad[N].
+    The dict form is {"name": ..., "endian": ..., "fields": {name: type}}, where
+    the fields may also be a list of (name, type) pairs and a type is either
+    a DSL type string or a (type, count, endian) tuple.
+    Raises ValueError for invalid templates.
+    """
+    if isinstance(spec, str):
+        if spec.lstrip().startswith("{"):
+            spec = json.loads(spec)
+        else:
+            spec = _parse_template_dsl(spec)
+    endian = spec.get("endian", "little")
+    if endian.lower() not in TEMPLATE_ENDIAN:
+        raise ValueError(f"Unknown byte order: {endian}")
+    fields = spec.get("fields", [])
+    if isinstance(fields, dict):
+        fields = list(fields.items())
+    compiled = []
+    for fname, ftype in fields:
+        compiled.append((fname,) + _parse_field_type(ftype))
+    return StructTemplate(spec.get("name", "Template"), compiled, TEMPLATE_ENDIAN[endian.lower()])
+
+
+def _parse_template_dsl(text):
+    spec = {"fields": []}
+    for line_no, line in enumerate(text.splitlines(), 1):
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        key, *rest = line.split(None, 1)
+        rest = rest[0].strip() if rest else ""
+        if not rest:
+            raise ValueError(f"Line {line_no}: expected '<name> <type>'")
+        if key == "struct":
+            spec["name"] = rest
+        elif key == "endian":
+            spec["endian"] = rest
+        else:
+            spec["fields"].append((key, rest))
+    return spec
+
+
+def format_field(ftype, value):
+    """Text form of a field value, as shown and logged."""
+    if ftype == "bytes":
+        return "0x" + value.hex().upper()
+    if ftype == "char":
+        return value.decode("latin-1")
+    if isinstance(value, tuple):
+        return " ".join(map(str, value))
+    return str(value)
+
+
+def _json_field(ftype, value):
+    if ftype in ("bytes", "char"):
+        return format_field(ftype, value)
+    return list(value) if isinstance(value, tuple) else value
+
+
+def decode_records(template, data, start, count=None, progress=None):
+    """
+    Yield (record offset, field values) for up to `count` records of `template`
+    starting at `start` of data source `data` (as many as fit when None).
+    Records are decoded in batches of TEMPLATE_BATCH_RECORDS through memoryviews.
+    """
+    if start < 0:
+        raise ValueError("Record offset must not be negative")
+    available = max(0, (len(data) - start) // template.size)
+    count = available if count is None else min(count, available)
+    done = 0
+    while done < count:
+        n = min(TEMPLATE_BATCH_RECORDS, count - done)
+        batch_start = start + done * template.size
+        view = data.view(batch_start, batch_start + n * template.size)
+        for i, record in enumerate(template.iter_unpack(view, n)):
+            yield batch_start + i * template.size, record
+        del view
+        done += n
+        if progress:
+            progress(done, count)
+
+
+def export_records(template, records, f, fmt="csv"):
+    """
+    Write (offset, values) records to the text file `f` as CSV (with an offset
+    column and a header row) or as a JSON array of objects. Returns the count.
+    """
+    types = [field[1] for field in template.fields]
+    names = template.field_names
+    count = 0
+    if fmt == "csv":
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(["offset"] + names)
+        for offset, values in records:
+            writer.writerow([f"{offset:08X}"] + [format_field(t, v) for t, v in zip(types, values)])
+            count += 1
+    elif fmt == "json":
+        f.write("[")
+        for offset, values in records:
+            obj = {"offset": offset}
+            obj.update((n, _json_field(t, v)) for n, t, v in zip(names, types, values))
+            f.write(",\n" if count else "\n")
+            f.write(json.dumps(obj))
+            count += 1
+        f.write("\n]\n")
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+    return count
+
+
+def template_annotations(template, data, records):
+    """
+    Yield one "|offset|data|Template.field|value|" line per field of every
+    (offset, values) record, in the parser file format open_parser reads.
+    """
+    fields = template.fields
+    for offset, values in records:
+        for (fname, ftype, _, field_offset, size), value in zip(fields, values):
+            off = offset + field_offset
+            raw = "0x" + data.view(off, off + size).hex().upper()
+            # Char fields hold any byte, including the parser line's "|" and newlines
+            value = escape_annotation_value(format_field(ftype, value))
+            yield format_annotation_line(off, raw, f"{template.name}.{fname}", value)
+
+
+# ===========================
+# Byte overview (entropy / byte classes)
+# ===========================
+# The overview splits the file into at most this many blocks (a power of two
+# bytes each, at least OVERVIEW_MIN_BLOCK) and samples up to
+# OVERVIEW_SAMPLE_BYTES of each block, in OVERVIEW_SAMPLE_SLICES even slices
+OVERVIEW_MAX_BLOCKS = 4096
+OVERVIEW_MIN_BLOCK = 256
+OVERVIEW_SAMPLE_BYTES = 16 * 1024
+OVERVIEW_SAMPLE_SLICES = 16
+# Files at least this big are analysed by a process pool, this many blocks per task
+OVERVIEW_PARALLEL_BYTES = 256 * 1024 * 1024
+OVERVIEW_TASK_BLOCKS = 256
+OVERVIEW_CACHE_VERSION = 1
+# Printable ASCII, as used by the ASCII column
+PRINTABLE_BYTES = frozenset(range(32, 127))
+
+
+def overview_cache_dir():
+    """Where computed overviews are kept ($XDG_CACHE_HOME or ~/.cache)."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "fasthexparser", "overview")
+
+
+def overview_block_size(size):
+    block = OVERVIEW_MIN_BLOCK
+    while block * OVERVIEW_MAX_BLOCKS < size:
+        block *= 2
+    return block
+
+
+def _block_sample(view):
+    """At most OVERVIEW_SAMPLE_BYTES of `view`, taken as evenly spaced slices."""
+    size = len(view)
+    if size <= OVERVIEW_SAMPLE_BYTES:
+        return bytes(view)
+    piece = OVERVIEW_SAMPLE_BYTES // OVERVIEW_SAMPLE_SLICES
+    step = (size - piece) // (OVERVIEW_SAMPLE_SLICES - 1)
+    return b"".join(view[i * step : i * step + piece] for i in range(OVERVIEW_SAMPLE_SLICES))
+
+
+def block_stats(sample):
+    """
+    (entropy, zeros, printable, high) of a byte sample, each scaled to 0..255:
+    Shannon entropy out of 8 bits per byte, and the fraction of 0x00 bytes,
+    printable ASCII bytes and bytes >= 0x80.
+    """
+    n = len(sample)
+    if not n:
+        return 0, 0, 0, 0
+    if np is not None:
+        counts = np.bincount(np.frombuffer(sample, dtype=np.uint8), minlength=256)
+        p = counts[counts > 0] / n
+        entropy = float(-(p * np.log2(p)).sum())
+        zeros = int(counts[0])
+        printable = int(counts[32:127].sum())
+        high = int(counts[128:].sum())
+    else:
+        counts = Counter(sample)
+        entropy = -sum(c / n * math.log2(c / n) for c in counts.values())
+        zeros = counts.get(0, 0)
+        printable = sum(c for b, c in counts.items() if b in PRINTABLE_BYTES)
+        high = sum(c for b, c in counts.items() if b >= 128)
+    return (min(255, round(entropy * 255 / 8)), round(zeros * 255 / n),
+            round(printable * 255 / n), round(high * 255 / n))
+
+
+class ByteOverview:
+    """Per-block entropy and byte-class density of a file (see block_stats), one byte per block each."""
+
+    def __init__(self, size, block_size):
+        self.size = size
+        self.block_size = block_size
+        self.entropy = bytearray()
+        self.zeros = bytearray()
+        self.printable = bytearray()
+        self.high = bytearray()
+
+    def __len__(self):
+        return len(self.entropy)
+
+    def add(self, stats):
+        for column, value in zip((self.entropy, self.zeros, self.printable, self.high), stats):
+            column.append(value)
+
+    def block(self, i):
+        """(entropy, zeros, printable, high) of block `i`."""
+        return self.entropy[i], self.zeros[i], self.printable[i], self.high[i]
+
+    def to_json(self):
+        return {"version": OVERVIEW_CACHE_VERSION, "size": self.size, "block_size": self.block_size,
+                "entropy": self.entropy.hex(), "zeros": self.zeros.hex(),
+                "printable": self.printable.hex(), "high": self.high.hex()}
+
+    @classmethod
+    def from_json(cls, state):
+        if state.get("version") != OVERVIEW_CACHE_VERSION:
+            raise ValueError("old overview cache")
+        overview = cls(state["size"], state["block_size"])
+        overview.entropy = bytearray.fromhex(state["entropy"])
+        overview.zeros = bytearray.fromhex(state["zeros"])
+        overview.printable = bytearray.fromhex(state["printable"])
+        overview.high = bytearray.fromhex(state["high"])
+        return overview
+
+
+def _overview_blocks(data, first, count, block_size):
+    stats = []
+    size = len(data)
+    for i in range(first, first + count):
+        view = data.view(i * block_size, min(size, (i + 1) * block_size))
+        stats.append(block_stats(_block_sample(view)))
+        del view
+    return stats
+
+
+def _overview_task(path, first, count, block_size):
+    """Process pool entry point: block stats of one run of blocks of the file at `path`."""
+    data = open_data_source(path)
+    try:
+        return _overview_blocks(data, first, count, block_size)
+    finally:
+        data.close()
+
+
+def overview_cache_key(path, data):
+    """
+    Cache key from the file's size, mtime and a hash of its first and last
+    64 KB, so a rewritten file of the same size is not mistaken for the old one.
+    """
+    st = os.stat(path)
+    size = len(data)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{size}:{st.st_mtime_ns}:{overview_block_size(size)}".encode())
+    digest.update(data.view(0, min(size, 65536)))
+    digest.update(data.view(max(0, size - 65536), size))
+    return digest.hexdigest()
+
+
+def compute_overview(data, path=None, progress=None, check=None, workers=None, use_cache=True):
+    """
+    ByteOverview of data source `data`. With `path` of a regular file, the
+    result is cached on disk and files of OVERVIEW_PARALLEL_BYTES or more are
+    analysed across a process pool. `check()` is called between chunks and may
+    raise to abort.
+    """
+    size = len(data)
+    block_size = overview_block_size(size)
+    nblocks = (size + block_size - 1) // block_size
+    regular = path is not None and os.path.isfile(path) and os.path.getsize(path) == size
+
+    cache_path = None
+    if regular and use_cache:
+        cache_path = os.path.join(overview_cache_dir(), overview_cache_key(path, data) + ".json")
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                return ByteOverview.from_json(json.load(f))
+        except (OSError, ValueError, KeyError):
+            pass
+
+    overview = ByteOverview(size, block_size)
+    runs = [(first, min(OVERVIEW_TASK_BLOCKS, nblocks - first))
+            for first in range(0, nblocks, OVERVIEW_TASK_BLOCKS)]
+    if regular and size >= OVERVIEW_PARALLEL_BYTES and len(runs) > 1:
+        # spawn, not fork: the caller may be a GUI process with threads running
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(_overview_task, path, first, count, block_size) for first, count in runs]
+            try:
+                for done, future in enumerate(futures, 1):
+                    if check:
+                        check()
+                    for stats in future.result():
+                        overview.add(stats)
+                    if progress:
+                        progress(done, len(runs))
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+    else:
+        for done, (first, count) in enumerate(runs, 1):
+            if check:
+                check()
+            for stats in _overview_blocks(data, first, count, block_size):
+                overview.add(stats)
+            if progress:
+                progress(done, len(runs))
+
+    if cache_path is not None:
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            tmp_path = cache_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(overview.to_json(), f)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass
+    return overview
+
+
+# ===========================
+# Binary diff
+# ===========================
+# Files are compared in chunks of DIFF_CHUNK_SIZE; differing chunks are narrowed
+# down to DIFF_BLOCK_SIZE blocks and those to exact byte runs
+DIFF_CHUNK_SIZE = 1024 * 1024
+DIFF_BLOCK_SIZE = 4096
+# The diff stops collecting ranges after this many
+DIFF_MAX_RANGES = 1000000
+_NONZERO_RUN_RE = re.compile(rb"[^\x00]+")
+
+
+def ranges_between(ranges, start, end):
+    """Entries of the sorted, non-overlapping (start, end) list `ranges` intersecting [start, end)."""
+    i = max(0, bisect.bisect_right(ranges, (start, float("inf"))) - 1)
+    hits = []
+    for r in ranges[i:]:
+        if r[0] >= end:
+            break
+        if r[1] > start:
+            hits.append(r)
+    return hits
+
+
+def _byte_runs(a, b, base):
+    """(start, end) runs where the equal-length byte strings `a` and `b` differ, offset by `base`."""
+    x = int.from_bytes(a, "big") ^ int.from_bytes(b, "big")
+    xor = x.to_bytes(len(a), "big")
+    return [(base + m.start(), base + m.end()) for m in _NONZERO_RUN_RE.finditer(xor)]
+
+
+class DiffResult:
+    """Differing byte ranges between two data sources, sorted and merged."""
+
+    def __init__(self, size_a, size_b):
+        self.size_a = size_a
+        self.size_b = size_b
+        self.ranges = []
+        # True if DIFF_MAX_RANGES was reached and later differences are missing
+        self.truncated = False
+
+    def __len__(self):
+        return len(self.ranges)
+
+    def add(self, start, end):
+        if self.ranges and start <= self.ranges[-1][1]:
+            self.ranges[-1] = (self.ranges[-1][0], max(end, self.ranges[-1][1]))
+        else:
+            self.ranges.append((start, end))
+
+    def ranges_between(self, start, end):
+        return ranges_between(self.ranges, start, end)
+
+    def next_after(self, offset):
+        """First range starting after `offset`, or None."""
+        i = bisect.bisect_right(self.ranges, (offset, float("inf")))
+        return self.ranges[i] if i < len(self.ranges) else None
+
+    def prev_before(self, offset):
+        """Last range starting before `offset`, or None."""
+        i = bisect.bisect_left(self.ranges, (offset, -1))
+        return self.ranges[i - 1] if i > 0 else None
+
+    def differing_bytes(self):
+        return sum(end - start for start, end in self.ranges)
+
+    def summary(self):
+        if not self.ranges:
+            return "Files are identical" if self.size_a == self.size_b else "Identical up to the shorter file's end"
+        more = "+" if self.truncated else ""
+        return f"{len(self.ranges)}{more} differing ranges, {self.differing_bytes()} bytes"
+
+
+def diff_data(a, b, chunk_size=DIFF_CHUNK_SIZE, block_size=DIFF_BLOCK_SIZE, progress=None, check=None):
+    """
+    DiffResult of data sources `a` and `b`. Equal chunks are skipped with one
+    comparison each; only differing chunks are compared block by block, and
+    only differing blocks byte by byte. If the sizes differ, the extra tail of
+    the longer file is one more range. `check()` may raise to abort.
+    """
+    result = DiffResult(len(a), len(b))
+    common = min(len(a), len(b))
+    for pos in range(0, common, chunk_size):
+        if check:
+            check()
+        end = min(common, pos + chunk_size)
+        chunk_a = a[pos:end]
+        chunk_b = b[pos:end]
+        if chunk_a != chunk_b:
+            for sub in range(0, end - pos, block_size):
+                block_a = chunk_a[sub:sub + block_size]
+                block_b = chunk_b[sub:sub + block_size]
+                if block_a != block_b:
+                    for start, stop in _byte_runs(block_a, block_b, pos + sub):
+                        result.add(start, stop)
+            if len(result.ranges) >= DIFF_MAX_RANGES:
+                result.truncated = True
+                return result
+        if progress:
+            progress(end, common)
+    if len(a) != len(b):
+        result.add(common, max(len(a), len(b)))
+    return result
+
+
+# ===========================
+# Dump export
+# ===========================
+# Dumps are formatted and written in chunks of EXPORT_CHUNK_SIZE (a whole number
+# of rows). Ranges of EXPORT_PARALLEL_BYTES or more are formatted across a process
+# pool with at most EXPORT_PENDING_PER_WORKER chunks per worker in flight, so
+# memory stays bounded however large the range is.
+EXPORT_CHUNK_SIZE = 4 * 1024 * 1024
+EXPORT_PARALLEL_BYTES = 32 * 1024 * 1024
+EXPORT_PENDING_PER_WORKER = 2
+
+if np is not None:
+    # Two hex digits per byte value, and the ASCII column character per byte value
+    _HEX_PAIRS = np.frombuffer("".join(f"{b:02X}" for b in range(256)).encode("ascii"), dtype=np.uint16)
+    _ASCII_LUT = np.frombuffer(ASCII_TABLE, dtype=np.uint8)
+
+
+def _dump_rows(view, start, group_size):
+    """Dump text of `view` from format_rows, the hex column of a short last row padded."""
+    offset_lines, hex_lines, ascii_lines = format_rows(view, start, group_size)
+    if not offset_lines:
+        return b""
+    hex_lines[-1] = hex_lines[-1].ljust(RowLayout(group_size).hex_width)
+    return ("\n".join(f"{o}  {h} {a}" for o, h, a in zip(offset_lines, hex_lines, ascii_lines)) + "\n").encode("ascii")
+
+
+def _dump_rows_numpy(view, start, group_size, offset_width):
+    """Same text as _dump_rows for whole rows, built as one (rows, line length) byte array."""
+    rows = len(view) // BYTES_PER_LINE
+    groups = BYTES_PER_LINE // group_size
+    hex_width = groups * (group_size * 2 + 1)
+    line = offset_width + 2 + hex_width + 1 + BYTES_PER_LINE + 1
+    data = np.frombuffer(view, dtype=np.uint8)
+    out = np.empty((rows, line), dtype=np.uint8)
+
+    offsets = np.arange(start, start + rows * BYTES_PER_LINE, BYTES_PER_LINE, dtype=">u8")
+    digits = _HEX_PAIRS[offsets.view(np.uint8).reshape(rows, 8)].view(np.uint8).reshape(rows, 16)
+    out[:, :offset_width] = digits[:, 16 - offset_width:]
+    out[:, offset_width:offset_width + 2] = ord(" ")
+    hex_part = out[:, offset_width + 2:offset_width + 2 + hex_width].reshape(rows, groups, group_size * 2 + 1)
+    hex_part[:, :, :group_size * 2] = _HEX_PAIRS[data].view(np.uint8).reshape(rows, groups, group_size * 2)
+    hex_part[:, :, group_size * 2] = ord(" ")
+    out[:, line - BYTES_PER_LINE - 2] = ord(" ")
+    out[:, line - BYTES_PER_LINE - 1:line - 1] = _ASCII_LUT[data].reshape(rows, BYTES_PER_LINE)
+    out[:, line - 1] = ord("\n")
+    return out.tobytes()
+
+
+def format_dump(data, start, end, group_size=1, markers=()):
+    """
+    Rows of bytes [start, end) of `data` as dump text (bytes): "OFFSET  HEX ASCII"
+    per row in the viewer's layout and grouping, with the hex column of a short
+    last row padded so its ASCII column lines up. `start` must be a row
+    boundary. `markers` are offset-sorted (offset, length, label); each row
+    ends with "  ; OFFSET+LENGTH label" for the markers starting in it. Uses
+    NumPy when it is installed.
+    """
+    view = data.view(start, end)
+    try:
+        whole = len(view) - len(view) % BYTES_PER_LINE
+        offset_width = len(f"{start:08X}")
+        # Offsets past 4 GB get more digits; a chunk must not mix widths for the fast path
+        if np is not None and whole and len(f"{start + whole - BYTES_PER_LINE:08X}") == offset_width:
+            text = (_dump_rows_numpy(view[:whole], start, group_size, offset_width) +
+                    _dump_rows(view[whole:], start + whole, group_size))
+        else:
+            text = _dump_rows(view, start, group_size)
+    finally:
+        del view
+    if not markers:
+        return text
+
+    labels = {}
+    for offset, length, label in markers:
+        labels.setdefault((offset - start) // BYTES_PER_LINE, []).append(f"{offset:08X}+{length} {label}")
+    lines = text.split(b"\n")
+    for row, row_labels in labels.items():
+        lines[row] += ("  ; " + "; ".join(row_labels)).encode("utf-8")
+    return b"\n".join(lines)
+
+
+def annotation_markers(index, start, end, data=None):
+    """
+    Dump markers (offset, length, "data_type=interp") for the annotations of
+    AnnotationIndex `index` in [start, end), sorted by offset. With `data`,
+    entries that no longer match the file are labelled "(stale)".
+    """
+    markers = []
+    for i in index.query(start, end):
+        offset, length, logged, data_type, interp = index.entry(i)[:5]
+        if offset < start:
+            continue
+        label = f"{data_type}={interp}"
+        if data is not None and not annotation_matches(data, offset, length, logged):
+            label += " (stale)"
+        markers.append((offset, length, label))
+    return markers
+
+
+def _export_task(path, start, end, group_size, markers):
+    """Process pool entry point: dump text of one chunk of the file at `path`."""
+    data = open_data_source(path)
+    try:
+        return format_dump(data, start, end, group_size, markers)
+    finally:
+        data.close()
+
+
+def _write_chunk(f, pending, start, end, progress):
+    stop, future = pending
+    written = f.write(future.result())
+    if progress:
+        progress(stop - start, end - start)
+    return written
+
+
+@perf.timed("export_dump")
+def export_dump(data, f, start=0, end=None, group_size=1, markers=None, path=None, workers=None,
+                progress=None, check=None):
+    """
+    Stream the dump of bytes [start, end) of `data` (start rounded down to a
+    row) into binary file `f`, chunk by chunk and in order. With `path` of a
+    regular file, ranges of EXPORT_PARALLEL_BYTES or more are formatted across
+    `workers` processes. `check()` may raise to abort. Returns the number of
+    bytes written.
+    """
+    end = len(data) if end is None else min(end, len(data))
+    start = max(0, start)
+    start -= start % BYTES_PER_LINE
+    markers = sorted(markers or [])
+    marker_offsets = [m[0] for m in markers]
+    chunks = []
+    for pos in range(start, end, EXPORT_CHUNK_SIZE):
+        stop = min(end, pos + EXPORT_CHUNK_SIZE)
+        first = bisect.bisect_left(marker_offsets, pos)
+        last = bisect.bisect_left(marker_offsets, stop)
+        chunks.append((pos, stop, group_size, markers[first:last]))
+
+    workers = workers or os.cpu_count() or 1
+    regular = path is not None and os.path.isfile(path) and os.path.getsize(path) == len(data)
+    written = 0
+    if regular and workers > 1 and end - start >= EXPORT_PARALLEL_BYTES and len(chunks) > 1:
+        # spawn, not fork: the caller may be a GUI process with threads running
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            pending = deque()
+            try:
+                for chunk in chunks:
+                    if check:
+                        check()
+                    pending.append((chunk[1], pool.submit(_export_task, path, *chunk)))
+                    # Write the oldest chunk before queueing more than the window allows
+                    if len(pending) >= workers * EXPORT_PENDING_PER_WORKER:
+                        written += _write_chunk(f, pending.popleft(), start, end, progress)
+                while pending:
+                    written += _write_chunk(f, pending.popleft(), start, end, progress)
+            except BaseException:
+                for _, future in pending:
+                    future.cancel()
+                raise
+    else:
+        for chunk in chunks:
+            if check:
+                check()
+            written += f.write(format_dump(data, *chunk))
+            if progress:
+                progress(chunk[1] - start, end - start)
+    return written
+
+
+# ===========================
+# Strings and signatures scan
+# ===========================
+# The file is scanned in chunks of SCAN_CHUNK_SIZE, across a process pool for
+# regular files of SCAN_PARALLEL_BYTES or more. Runs of at least SCAN_MIN_STRING
+# printable ASCII characters (or UTF-16LE code units) are strings; longer runs
+# than SCAN_MAX_STRING are cut there
+SCAN_CHUNK_SIZE = 4 * 1024 * 1024
+SCAN_PARALLEL_BYTES = 32 * 1024 * 1024
+SCAN_PENDING_PER_WORKER = 2
+SCAN_MIN_STRING = 6
+SCAN_MAX_STRING = 4096
+# Bytes after a signature that its check may look at
+SCAN_SIGNATURE_WINDOW = 1024
+# Annotation types of the hits; signatures are "Signature" with their name as the value
+SCAN_STRING_TYPES = ["String", "String (UTF-16)"]
+SCAN_SIGNATURE_TYPE = "Signature"
+
+
+def _check_elf(buf, pos):
+    bits = "32-bit" if buf[pos + 4] == 1 else "64-bit"
+    order = "LSB" if buf[pos + 5] == 1 else "MSB"
+    return f"ELF {bits} {order}"
+
+
+def _check_pe(buf, pos):
+    """MZ is too common on its own: the header must point at a PE signature."""
+    if len(buf) < pos + 0x40:
+        return None
+    pe = pos + struct.unpack_from("<I", buf, pos + 0x3C)[0]
+    return "PE executable" if bytes(buf[pe:pe + 4]) == b"PE\0\0" else None
+
+
+def _check_zlib(buf, pos):
+    """Two header bytes match often by chance; the stream must also inflate."""
+    try:
+        zlib.decompressobj().decompress(bytes(buf[pos:pos + SCAN_SIGNATURE_WINDOW]))
+    except zlib.error:
+        return None
+    return "zlib stream"
+
+
+def _check_jpeg(buf, pos):
+    """The first marker segment must be followed by another marker."""
+    if len(buf) < pos + 6:
+        return None
+    after = pos + 4 + (buf[pos + 4] << 8 | buf[pos + 5])
+    if after + 1 < len(buf) and buf[after] != 0xFF:
+        return None
+    return "JPEG image"
+
+
+_DER_TAGS = frozenset(b"\x01\x02\x03\x04\x05\x06\x0a\x0c\x13\x16\x17\x18\x1e\x30\x31"
+                      b"\x80\x81\x82\x83\xa0\xa1\xa2\xa3")
+
+
+def _check_der(buf, pos):
+    """
+    DER SEQUENCE with a two-byte length (the usual certificate or key header):
+    its elements must be well-formed TLVs that fit, checked as far as the
+    signature window reaches and at least three of them (or all there are).
+    """
+    if len(buf) < pos + 4:
+        return None
+    length = buf[pos + 2] << 8 | buf[pos + 3]
+    if length < 256:
+        # DER would have used a shorter length form
+        return None
+    end = pos + 4 + length
+    i = pos + 4
+    elements = 0
+    while i < end and elements < 3:
+        if i + 2 > len(buf) or buf[i] not in _DER_TAGS:
+            return None
+        inner = buf[i + 1]
+        i += 2
+        if inner & 0x80:
+            count = inner & 0x7F
+            if not 1 <= count <= 2 or i + count > len(buf):
+                return None
+            inner = int.from_bytes(buf[i:i + count], "big")
+            if inner < (128 if count == 1 else 256):
+                return None
+            i += count
+        i += inner
+        if i > end:
+            return None
+        elements += 1
+    return f"DER SEQUENCE, {length + 4} bytes"
+
+
+# (name, pattern, check): check(buffer, match offset) returns the annotation
+# value, or None to reject a chance match; without a check the name is used
+SCAN_SIGNATURES = [
+    ("PNG image", rb"\x89PNG\r\n\x1a\n", None),
+    ("JPEG image", rb"\xff\xd8\xff[\xdb\xe0-\xef\xfe]", _check_jpeg),
+    ("GIF image", rb"GIF8[79]a", None),
+    ("PDF document", rb"%PDF-\d\.\d", None),
+    ("ZIP entry", rb"PK\x03\x04", None),
+    ("ELF executable", rb"\x7fELF[\x01\x02][\x01\x02]\x01", _check_elf),
+    ("PE executable", rb"MZ", _check_pe),
+    ("gzip stream", rb"\x1f\x8b\x08[\x00-\x1f]", None),
+    ("bzip2 stream", rb"BZh[1-9]1AY&SY", None),
+    ("xz stream", rb"\xfd7zXZ\x00", None),
+    ("7z archive", rb"7z\xbc\xaf\x27\x1c", None),
+    ("SQLite database", rb"SQLite format 3\x00", None),
+    ("zlib stream", rb"\x78[\x01\x5e\x9c\xda]", _check_zlib),
+    ("DER SEQUENCE", rb"\x30\x82", _check_der),
+]
+# One pattern each: re finds a literal prefix fast, an alternation of them slowly
+_SIGNATURE_RES = [re.compile(pattern, re.DOTALL) for _, pattern, _ in SCAN_SIGNATURES]
+
+
+@functools.lru_cache(maxsize=8)
+def _string_patterns(min_length):
+    return (
+        re.compile(rb"[\x20-\x7e]{%d,%d}" % (min_length, SCAN_MAX_STRING)),
+        re.compile(rb"(?:[\x20-\x7e]\x00){%d,%d}" % (min_length, SCAN_MAX_STRING)),
+    )
+
+
+def _printable_before(buf, pos, width):
+    """True if a printable character of `width` bytes ends at buf[pos]."""
+    if pos < width:
+        return False
+    return 0x20 <= buf[pos - width] <= 0x7E and (width == 1 or buf[pos - 1] == 0)
+
+
+def scan_type(code):
+    """(annotation type, signature index or None) of a ScanIndex code."""
+    if code < len(SCAN_STRING_TYPES):
+        return SCAN_STRING_TYPES[code], None
+    return SCAN_SIGNATURE_TYPE, code - len(SCAN_STRING_TYPES)
+
+
+def _scan_chunk(data, start, end, min_length=SCAN_MIN_STRING, strings=True, signatures=True):
+    """
+    (offsets, lengths, codes) arrays of the hits starting in [start, end),
+    sorted. Codes index SCAN_STRING_TYPES, then SCAN_SIGNATURES after them.
+    """
+    # Two bytes before the chunk to tell where runs start, and enough after it
+    # to finish runs and signature checks that start inside it
+    base = max(0, start - 2)
+    view = data.view(base, min(len(data), end + max(SCAN_MAX_STRING * 2, SCAN_SIGNATURE_WINDOW)))
+    first, limit = start - base, end - base
+    hits = []
+    try:
+        if strings:
+            for code, regex in enumerate(_string_patterns(min_length)):
+                for m in regex.finditer(view, first):
+                    pos = m.start()
+                    if pos >= limit:
+                        break
+                    # Only the start of a run counts: skip the rest of a run cut
+                    # at SCAN_MAX_STRING, or one that began in the previous chunk
+                    if not _printable_before(view, pos, code + 1):
+                        hits.append((base + pos, m.end() - pos, code))
+        if signatures:
+            for index, regex in enumerate(_SIGNATURE_RES):
+                check = SCAN_SIGNATURES[index][2]
+                for m in regex.finditer(view, first):
+                    pos = m.start()
+                    if pos >= limit:
+                        break
+                    if check is None or check(view, pos) is not None:
+                        hits.append((base + pos, m.end() - pos, len(SCAN_STRING_TYPES) + index))
+    finally:
+        del view
+    hits.sort()
+    return (array("Q", [h[0] for h in hits]), array("I", [h[1] for h in hits]),
+            array("B", [h[2] for h in hits]))
+
+
+def _scan_task(path, start, end, min_length, strings, signatures):
+    """Process pool entry point: hits of one chunk of the file at `path`."""
+    data = open_data_source(path)
+    try:
+        return _scan_chunk(data, start, end, min_length, strings, signatures)
+    finally:
+        data.close()
+
+
+class ScanIndex:
+    """
+    Strings and signatures found by scan_data, sorted by offset in compact
+    array columns (offset, length, code; see scan_type).
+    """
+
+    def __init__(self, size=0):
+        self.size = size
+        self.offsets = array("Q")
+        self.lengths = array("I")
+        self.codes = array("B")
+        self.max_length = 0
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def extend(self, offsets, lengths, codes):
+        """Append the hits of the next chunk (chunks arrive in file order)."""
+        self.offsets.extend(offsets)
+        self.lengths.extend(lengths)
+        self.codes.extend(codes)
+        if lengths:
+            self.max_length = max(self.max_length, max(lengths))
+
+    def query(self, start, end):
+        """Indices of the hits intersecting the byte range [start, end)."""
+        offsets = self.offsets
+        i = bisect.bisect_left(offsets, max(0, start - self.max_length + 1))
+        hits = []
+        while i < len(offsets) and offsets[i] < end:
+            if offsets[i] + self.lengths[i] > start:
+                hits.append(i)
+            i += 1
+        return hits
+
+    def ranges_between(self, start, end):
+        return merge_ranges((self.offsets[i], self.offsets[i] + self.lengths[i]) for i in self.query(start, end))
+
+    def entry(self, i):
+        """(offset, length, code) of hit `i`."""
+        return self.offsets[i], self.lengths[i], self.codes[i]
+
+    def describe(self, i, data):
+        """(annotation type, value) of hit `i`, read back from data source `data`."""
+        offset, length, code = self.entry(i)
+        data_type, signature = scan_type(code)
+        if signature is None:
+            raw = data[offset:offset + length]
+            text = raw.decode("ascii" if code == 0 else "utf-16-le")
+            return data_type, escape_annotation_value(text)
+        name, _, check = SCAN_SIGNATURES[signature]
+        if check is None:
+            return data_type, name
+        view = data.view(offset, min(len(data), offset + SCAN_SIGNATURE_WINDOW))
+        try:
+            return data_type, check(view, 0) or name
+        finally:
+            del view
+
+    def annotation_lines(self, data, indices=None):
+        """Yield a "|offset|data|type|value|" parser line per hit (or per hit in `indices`)."""
+        for i in range(len(self)) if indices is None else indices:
+            offset, length, _ = self.entry(i)
+            data_type, value = self.describe(i, data)
+            raw = "0x" + data.view(offset, offset + length).hex().upper()
+            yield format_annotation_line(offset, raw, data_type, value)
+
+    def summary(self):
+        counts = Counter(self.codes)
+        strings = sum(counts[code] for code in range(len(SCAN_STRING_TYPES)))
+        return f"{strings} strings, {len(self) - strings} signatures"
+
+
+@perf.timed("scan_data")
+def scan_data(data, path=None, min_length=SCAN_MIN_STRING, strings=True, signatures=True,
+              progress=None, check=None, workers=None):
+    """
+    ScanIndex of the strings and known file signatures in data source `data`.
+    With `path` of a regular file, files of SCAN_PARALLEL_BYTES or more are
+    scanned across `workers` processes. `check()` may raise to abort.
+    """
+    size = len(data)
+    index = ScanIndex(size)
+    chunks = [(pos, min(size, pos + SCAN_CHUNK_SIZE)) for pos in range(0, size, SCAN_CHUNK_SIZE)]
+    options = (min_length, strings, signatures)
+    workers = workers or os.cpu_count() or 1
+    regular = path is not None and os.path.isfile(path) and os.path.getsize(path) == size
+    if regular and workers > 1 and size >= SCAN_PARALLEL_BYTES and len(chunks) > 1:
+        # spawn, not fork: the caller may be a GUI process with threads running
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            pending = deque()
+            try:
+                for start, end in chunks:
+                    if check:
+                        check()
+                    pending.append((end, pool.submit(_scan_task, path, start, end, *options)))
+                    # Collect the oldest chunk before queueing more than the window allows
+                    if len(pending) >= workers * SCAN_PENDING_PER_WORKER:
+                        end, future = pending.popleft()
+                        index.extend(*future.result())
+                        if progress:
+                            progress(end, size)
+                while pending:
+                    end, future = pending.popleft()
+                    index.extend(*future.result())
+                    if progress:
+                        progress(end, size)
+            except BaseException:
+                for _, future in pending:
+                    future.cancel()
+                raise
+    else:
+        for start, end in chunks:
+            if check:
+                check()
+            index.extend(*_scan_chunk(data, start, end, *options))
+            if progress:
+                progress(end, size)
+    return index
+
+
+# ===========================
+# Multi-file sessions
+# ===========================
+# The files open in a session share one memory budget for everything that can
+# be rebuilt: formatted rows, data source caches, overviews and parser
+# results. Idle files over the budget are trimmed, least recently used first
+SESSION_CACHE_BYTES = 512 * 1024 * 1024
+# Rough memory of one loaded annotation entry, and of one merged byte range
+ANNOTATION_ENTRY_BYTES = 160
+RANGE_BYTES = 64
+
+
+class FileTab:
+    """
+    Everything kept for one file of a FileSession. The view state (path,
+    scroll position, selection, the parser file in use) always stays; the
+    data source, row cache, overview and parser results are dropped when the
+    tab is idle and memory is short, and rebuilt when it is shown again.
+    """
+
+    def __init__(self, path, raw=False):
+        self.path = path
+        # Opened without decompressing, see open_data_source
+        self.raw = raw
+        self.data = None
+        self.row_cache = None
+        self.top_row = 0
+        self.select_start_offset = None
+        self.select_end_offset = None
+        # Parser file loaded with open_parser, so it can be loaded again after eviction
+        self.parser_path = None
+        self.annotations = None
+        self.parser_report = None
+        self.session_ranges = []
+        self.overview = None
+        # Kept on eviction: a scan takes far longer than everything else to redo
+        self.scan_index = None
+        # FileSession clock value when the tab was last shown
+        self.last_used = 0
+
+    @property
+    def name(self):
+        name = os.path.basename(self.path)
+        return f"{name} (raw)" if self.raw else name
+
+    @property
+    def loaded(self):
+        return self.data is not None
+
+    def cache_bytes(self):
+        """Estimated memory of the parts eviction can drop."""
+        total = 0
+        if self.data is not None:
+            total += self.data.cache_bytes()
+        if self.row_cache is not None:
+            total += self.row_cache.used
+        if self.overview is not None:
+            total += 4 * len(self.overview)
+        if self.annotations is not None:
+            total += len(self.annotations) * ANNOTATION_ENTRY_BYTES
+        if self.parser_report is not None:
+            total += (len(self.parser_report.matched_ranges) + len(self.parser_report.problems)) * RANGE_BYTES
+        return total
+
+
+class FileSession:
+    """
+    The open files (FileTabs) of a viewer window, in tab order, with data
+    sources shared per path: a file open in a tab and as the compare file is
+    opened once. A compressed file opened raw is a different source (and tab)
+    from the same file opened decompressed. trim() keeps the rebuildable
+    memory of idle tabs within `budget`, evicting the least recently used tab
+    first; the active tab is never evicted (its row cache has a budget of its
+    own).
+    """
+
+    def __init__(self, budget=SESSION_CACHE_BYTES, row_cache_bytes=ROW_CACHE_BYTES):
+        self.budget = budget
+        self.row_cache_bytes = row_cache_bytes
+        self.tabs = []
+        self.active = None
+        self.evictions = 0
+        self._clock = 0
+        # (realpath, raw) -> [data source, reference count]
+        self._sources = {}
+
+    def __len__(self):
+        return len(self.tabs)
+
+    @staticmethod
+    def _key(path, raw=False):
+        return os.path.realpath(path), bool(raw)
+
+    def find(self, path, raw=False):
+        """The tab of `path`, or None."""
+        key = self._key(path, raw)
+        for tab in self.tabs:
+            if self._key(tab.path, tab.raw) == key:
+                return tab
+        return None
+
+    def acquire(self, path, raw=False):
+        """The open data source of `path` with one more reference, or None if it is not open."""
+        entry = self._sources.get(self._key(path, raw))
+        if entry is None:
+            return None
+        entry[1] += 1
+        return entry[0]
+
+    def register(self, path, data, raw=False):
+        """
+        Take a freshly opened data source of `path` (with one reference). If
+        another one got registered meanwhile, `data` is closed and the shared
+        one is returned instead.
+        """
+        shared = self.acquire(path, raw)
+        if shared is not None:
+            data.close()
+            return shared
+        self._sources[self._key(path, raw)] = [data, 1]
+        return data
+
+    def retain(self, data):
+        """
+        One more reference to the registered source `data`, e.g. for a job
+        still reading it. Returns False if `data` is not registered.
+        """
+        for entry in self._sources.values():
+            if entry[0] is data:
+                entry[1] += 1
+                return True
+        return False
+
+    def release(self, data):
+        """Drop one reference to `data`, closing it with the last one."""
+        for key, entry in self._sources.items():
+            if entry[0] is data:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del self._sources[key]
+                    data.close()
+                return
+        data.close()
+
+    def add(self, path, raw=False):
+        """New, not yet loaded tab for `path`, after the active one."""
+        tab = FileTab(path, raw)
+        index = self.tabs.index(self.active) + 1 if self.active in self.tabs else len(self.tabs)
+        self.tabs.insert(index, tab)
+        return tab
+
+    def attach(self, tab, data):
+        """Give `tab` data source `data` (one reference, see acquire/register) and a fresh row cache."""
+        tab.data = data
+        tab.row_cache = RowPageCache(tab.data, self.row_cache_bytes)
+
+    def activate(self, tab):
+        self._clock += 1
+        tab.last_used = self._clock
+        self.active = tab
+
+    def evict(self, tab):
+        """Drop the rebuildable state of `tab`."""
+        if tab.data is not None:
+            self.release(tab.data)
+        tab.data = None
+        tab.row_cache = None
+        tab.overview = None
+        tab.annotations = None
+        tab.parser_report = None
+        self.evictions += 1
+
+    def close(self, tab):
+        """Remove `tab`; returns the tab next to it (or None) to show instead if it was active."""
+        index = self.tabs.index(tab)
+        if tab.data is not None:
+            self.release(tab.data)
+            tab.data = None
+        self.tabs.remove(tab)
+        if tab is not self.active:
+            return self.active
+        self.active = None
+        if not self.tabs:
+            return None
+        return self.tabs[min(index, len(self.tabs) - 1)]
+
+    def cache_bytes(self):
+        # A shared source counts once
+        seen = set()
+        total = 0
+        for tab in self.tabs:
+            total += tab.cache_bytes()
+            if tab.data is not None:
+                if id(tab.data) in seen:
+                    total -= tab.data.cache_bytes()
+                seen.add(id(tab.data))
+        return total
+
+    def trim(self):
+        """Evict idle tabs, least recently used first, until the session is within budget."""
+        idle = sorted((tab for tab in self.tabs if tab is not self.active and tab.cache_bytes()),
+                      key=lambda tab: tab.last_used)
+        evicted = []
+        total = self.cache_bytes()
+        for tab in idle:
+            if total <= self.budget:
+                break
+            total -= tab.cache_bytes()
+            self.evict(tab)
+            evicted.append(tab)
+        return evicted
+
+    def close_all(self):
+        for tab in list(self.tabs):
+            self.close(tab)
+        for data, _ in list(self._sources.values()):
+            data.close()
+        self._sources.clear()
+
+    def stats(self):
+        return {"tabs": len(self.tabs), "loaded": sum(tab.loaded for tab in self.tabs),
+                "bytes": self.cache_bytes(), "budget": self.budget, "evictions": self.evictions}
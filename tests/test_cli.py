@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+import fasthex_cli
+from fasthex_core import format_rows
+
+
+@pytest.fixture
+def sample_file(tmp_path):
+    path = tmp_path / "sample.bin"
+    path.write_bytes(b"\x01\x02\x03\x04" + b"hello world!" + bytes(range(24)) * 2)
+    return path
+
+
+def run(capsys, *argv):
+    status = fasthex_cli.main(["-j", "1", *map(str, argv)])
+    return status, capsys.readouterr().out
+
+
+def test_check(capsys, sample_file):
+    parser = sample_file.parent / (sample_file.name + ".txt")
+    parser.write_text("|00000000|0x0102|Hex (BE)|0x0102|\n|00000002|0xFFFF|Hex (BE)|0xFFFF|\n")
+    status, out = run(capsys, "check", sample_file, "--no-save-index")
+    assert status == 1
+    assert "1 of 2 entries match, 1 stale or mismatched" in out
+    parser.write_text("|00000000|0x0102|Hex (BE)|0x0102|\n")
+    assert run(capsys, "check", sample_file)[0] == 0
+
+
+def test_check_without_parser_file(capsys, sample_file):
+    status, out = run(capsys, "check", sample_file)
+    assert status == 0 and "no parser file" in out
+
+
+def test_dump(capsys, sample_file):
+    status, out = run(capsys, "dump", sample_file, "-r", "32:40", "-g", "2")
+    offsets, hexes, asciis = format_rows(sample_file.read_bytes()[32:40], 32, 2)
+    assert status == 0
+    assert out.splitlines() == [f"{sample_file}:", f"{offsets[0]}  {hexes[0]} {asciis[0]}"]
+
+
+def test_decode(capsys, sample_file):
+    status, out = run(capsys, "decode", sample_file, "-a", "0:2", "-a", "0x1000")
+    lines = out.splitlines()
+    assert status == 0
+    assert "|00000000|0x0102|SignedInt16|513|" in lines
+    assert lines[-1] == "00001000: out of range"
+
+
+def test_template(capsys, sample_file, tmp_path):
+    template = tmp_path / "rec.tpl"
+    template.write_text("struct Rec\na u8\nb u8\n")
+    status, out = run(capsys, "template", sample_file, "-t", template, "-o", "0x1", "-n", "2", "-f", "json")
+    assert status == 0
+    assert json.loads(out) == [{"offset": 1, "a": 2, "b": 3}, {"offset": 3, "a": 4, "b": ord("h")}]
+    with pytest.raises(SystemExit):
+        run(capsys, "template", sample_file, "-t", template, "-o", "-1")
+
+
+def test_diff(capsys, sample_file, tmp_path):
+    other = tmp_path / "other.bin"
+    data = bytearray(sample_file.read_bytes())
+    data[5] ^= 0xFF
+    other.write_bytes(bytes(data))
+    status, out = run(capsys, "diff", other, "--against", sample_file)
+    assert status == 1
+    assert "00000005-00000005  1 bytes" in out.splitlines()
+    assert run(capsys, "diff", sample_file, "--against", sample_file)[0] == 0
+
+
+def test_scan(capsys, sample_file):
+    status, out = run(capsys, "scan", sample_file, "-n", "5", "--no-signatures")
+    assert status == 0
+    assert out.splitlines() == ["|00000004|0x68656C6C6F20776F726C6421|String|hello world!|"]
+
+
+def test_export(capsys, sample_file, tmp_path):
+    out_path = tmp_path / "out.txt"
+    status, out = run(capsys, "export", sample_file, "-r", "0+32", "-o", out_path)
+    assert status == 0 and str(out_path) in out
+    offsets, hexes, asciis = format_rows(sample_file.read_bytes()[:32], 0, 1)
+    assert out_path.read_text() == f"{offsets[0]}  {hexes[0]} {asciis[0]}\n"
@@ -0,0 +1,760 @@
+import bz2
+import gzip
+import io
+import json
+import lzma
+import os
+import random
+import shutil
+import struct
+import subprocess
+
+import pytest
+
+import fasthex_core
+from fasthex_core import (
+    BYTES_PER_LINE, DECODERS, INTERP_TYPES, PERF_CSV_FIELDS, AnnotationIndex, AnnotationWriter,
+    BytesDataSource, CompressedFileSource, FileSession, JobCancelled, PerfStats, RowLayout, RowPageCache,
+    SelectionInterpretation, VerificationReport, block_stats, compile_search_pattern, compile_template,
+    compute_overview, decode_array, decode_records, diff_data, export_dump, export_perf, format_dump,
+    format_field, format_rows, int_to_decimal, open_data_source, parse_annotation_line, scan_data,
+    search_data, template_annotations, verify_annotations,
+)
+
+GROUP_SIZES = [1, 2, 4]
+# Whole rows, short last rows and short last groups
+SIZES = [0, 1, 3, 31, 32, 33, 62, 64, 95, 1000]
+
+
+@pytest.fixture(params=["numpy", "plain"])
+def numpy_mode(request, monkeypatch):
+    """Run a test with NumPy (skipped when it is not installed) and without it."""
+    if request.param == "numpy":
+        if fasthex_core.np is None:
+            pytest.skip("numpy is not installed")
+    else:
+        monkeypatch.setattr(fasthex_core, "np", None)
+    return request.param
+
+
+def sample(size, seed=0):
+    """Random bytes with every printable and non-printable class in them."""
+    rng = random.Random(seed)
+    return bytes(rng.randrange(256) for _ in range(size))
+
+
+def baseline_rows(data, group_size):
+    """The row loop of the original refresh_hex_view."""
+    offsets, hexes, asciis = [], [], []
+    groups_per_line = BYTES_PER_LINE // group_size
+    for line_offset in range(0, len(data), BYTES_PER_LINE):
+        line_bytes = data[line_offset:line_offset + BYTES_PER_LINE]
+        offsets.append(f"{line_offset:08X}")
+        asciis.append("".join(chr(b) if 32 <= b < 127 else "." for b in line_bytes))
+        parts = []
+        for i in range(groups_per_line):
+            group_off = line_offset + i * group_size
+            if group_off >= len(data):
+                break
+            parts.append(data[group_off:group_off + group_size].hex().upper().ljust(group_size * 2, " ") + " ")
+        hexes.append("".join(parts))
+    return offsets, hexes, asciis
+
+
+def baseline_dump(data, group_size, start=0):
+    width = RowLayout(group_size).hex_width
+    offsets, hexes, asciis = baseline_rows(data, group_size)
+    lines = [f"{int(o, 16) + start:08X}  {h.ljust(width)} {a}\n" for o, h, a in zip(offsets, hexes, asciis)]
+    return "".join(lines).encode("ascii")
+
+
+# ===========================
+# Row formatting and dumps
+# ===========================
+@pytest.mark.parametrize("group_size", GROUP_SIZES)
+@pytest.mark.parametrize("size", SIZES)
+def test_format_rows_matches_baseline(group_size, size):
+    data = sample(size)
+    assert format_rows(data, 0, group_size) == tuple(baseline_rows(data, group_size))
+
+
+@pytest.mark.parametrize("group_size", GROUP_SIZES)
+def test_format_rows_block_at_offset(group_size):
+    data = sample(1000)
+    offsets, hexes, asciis = baseline_rows(data, group_size)
+    assert format_rows(data[64:], 64, group_size) == (offsets[2:], hexes[2:], asciis[2:])
+
+
+@pytest.mark.parametrize("group_size", GROUP_SIZES)
+@pytest.mark.parametrize("size", SIZES)
+def test_format_dump(numpy_mode, group_size, size):
+    data = sample(size)
+    assert format_dump(BytesDataSource(data), 0, size, group_size) == baseline_dump(data, group_size)
+
+
+def test_format_dump_from_offset(numpy_mode):
+    data = sample(1000)
+    text = format_dump(BytesDataSource(data), 96, 1000, 2)
+    assert text == baseline_dump(data[96:], 2, start=96)
+
+
+def test_format_dump_markers(numpy_mode):
+    data = sample(100)
+    text = format_dump(BytesDataSource(data), 0, 100, 1, [(33, 2, "UInt16=7"), (40, 1, "Decimal=1")])
+    lines = text.split(b"\n")
+    plain = baseline_dump(data, 1).split(b"\n")
+    assert lines[1] == plain[1] + b"  ; 00000021+2 UInt16=7; 00000028+1 Decimal=1"
+    assert lines[0] == plain[0] and lines[2:] == plain[2:]
+
+
+@pytest.mark.parametrize("group_size", GROUP_SIZES)
+def test_export_dump(numpy_mode, monkeypatch, group_size):
+    # Several chunks, the last one short
+    monkeypatch.setattr(fasthex_core, "EXPORT_CHUNK_SIZE", 4096)
+    data = sample(10000)
+    out = io.BytesIO()
+    written = export_dump(BytesDataSource(data), out, 40, None, group_size)
+    assert written == len(out.getvalue())
+    assert out.getvalue() == baseline_dump(data[32:], group_size, start=32)
+
+
+def test_export_dump_parallel(monkeypatch, tmp_path):
+    monkeypatch.setattr(fasthex_core, "EXPORT_CHUNK_SIZE", 64 * 1024)
+    monkeypatch.setattr(fasthex_core, "EXPORT_PARALLEL_BYTES", 0)
+    data = sample(300000)
+    path = tmp_path / "data.bin"
+    path.write_bytes(data)
+    source = open_data_source(str(path))
+    try:
+        parallel, sequential = io.BytesIO(), io.BytesIO()
+        export_dump(source, parallel, path=str(path), workers=2)
+        export_dump(source, sequential, workers=1)
+    finally:
+        source.close()
+    assert parallel.getvalue() == sequential.getvalue() == baseline_dump(data, 1)
+
+
+def test_row_page_cache(monkeypatch):
+    monkeypatch.setattr(fasthex_core, "ROW_PAGE_ROWS", 4)
+    buf = bytearray(sample(1000))
+    cache = RowPageCache(BytesDataSource(buf))
+    for first, last in [(0, 32), (3, 9), (28, 40), (5, 5)]:
+        expected = format_rows(buf[first * BYTES_PER_LINE:last * BYTES_PER_LINE], first * BYTES_PER_LINE, 2)
+        assert cache.rows(first, last, 2) == expected
+    assert cache.stats()["misses"] == len(cache) == 8
+    cache.rows(0, 8, 2)
+    assert cache.hits == 6
+    # The last page is reformatted once the file grows under it
+    buf += sample(20, seed=1)
+    assert cache.rows(30, 32, 2) == format_rows(buf[30 * BYTES_PER_LINE:], 30 * BYTES_PER_LINE, 2)
+    assert (cache.misses, len(cache)) == (9, 8)
+    # Rows 4-7 are page 1; two pages either side are 2, 0 and 3
+    assert cache.prefetch(4, 8, 1, pages=2) == 4
+    assert cache.prefetch(4, 8, 1, pages=2) == 0
+    cache.clear()
+    assert (len(cache), cache.used) == (0, 0)
+
+
+def test_row_page_cache_eviction(monkeypatch):
+    monkeypatch.setattr(fasthex_core, "ROW_PAGE_ROWS", 4)
+    cache = RowPageCache(BytesDataSource(sample(1000)), budget=1)
+    cache.rows(0, 12, 1)
+    # Over budget, only the page formatted last is kept
+    assert len(cache) == 1 and cache.page(2, 1) and cache.hits == 1
+    cache.budget = 10 ** 6
+    cache.rows(0, 12, 1)
+    cache.page(0, 1)
+    cache.budget = cache.used - 1
+    cache.page(0, 4)
+    # Least recently used first: page 1 goes, page 0 was just looked up
+    assert list(cache._pages) == [(2, 1), (0, 1), (0, 4)]
+    assert cache.used <= cache.budget
+
+
+# ===========================
+# Interpretation panel
+# ===========================
+@pytest.mark.parametrize("digits", [1, 999, 1000, 1001, 4321, 20000])
+def test_int_to_decimal(digits):
+    rng = random.Random(digits)
+    text = str(rng.randrange(1, 10)) + "".join(str(rng.randrange(10)) for _ in range(digits - 1))
+    # Built from digit groups, since int(text) is bound by sys.int_max_str_digits
+    value = 0
+    for i in range(0, digits, 100):
+        value = value * 10 ** len(text[i:i + 100]) + int(text[i:i + 100])
+    assert int_to_decimal(value) == text
+
+
+def test_int_to_decimal_check():
+    def check():
+        raise JobCancelled()
+    assert int_to_decimal(10 ** 999, check) == "1" + "0" * 999
+    with pytest.raises(JobCancelled):
+        int_to_decimal(10 ** 5000, check)
+
+
+def test_interpretation_previews():
+    data = BytesDataSource(b"\x01\x02" + bytes(2000))
+    interp = SelectionInterpretation(data, 0, 2)
+    assert [interp.preview(itype) for itype in INTERP_TYPES] == ["0x0102", "0x0201", "513", "", "513"]
+    assert interp.full("Float32") == ""
+    interp = SelectionInterpretation(data, 0, 2000)
+    assert interp.preview("Hex (BE)") == "0x0102" + "00" * 30 + "... (2000 bytes)"
+    # Long decimals wait for full() before they have a preview
+    assert interp.expensive("Decimal") and not interp.deferred("Decimal")
+    assert interp.preview("Decimal") is None
+    assert interp.full("Decimal") == "513"
+    assert interp.preview("Decimal") == "513"
+
+
+# ===========================
+# Array decoders
+# ===========================
+@pytest.mark.parametrize("decoder", list(DECODERS))
+def test_decode_array(numpy_mode, decoder):
+    fmt, _ = DECODERS[decoder]
+    buf = sample(203)
+    expected = [v for (v,) in struct.iter_unpack(fmt, buf[:len(buf) - len(buf) % struct.calcsize(fmt)])]
+    # repr, so NaNs compare equal
+    assert list(map(repr, decode_array(buf, decoder))) == list(map(repr, expected))
+    assert list(map(repr, decode_array(buf, decoder, limit=3))) == list(map(repr, expected[:3]))
+
+
+def test_decoder_table():
+    data = BytesDataSource(struct.pack("<5H", 1, 2, 3, 4, 5) + b"\xff")
+    table = {decoder: (count, preview) for decoder, count, preview in
+             SelectionInterpretation(data, 0, 11).decoder_table(limit=3)}
+    assert list(table) == list(DECODERS)
+    assert table["UInt8"] == (11, "1, 0, 2, ... (11 values)")
+    assert table["UInt16 LE"] == (5, "1, 2, 3, ... (5 values)")
+    assert table["UInt64 BE"] == (1, str(struct.unpack(">Q", data.view(0, 8))[0]))
+    assert SelectionInterpretation(data, 0, 4).decoded("UInt16 BE") == "256, 512"
+
+
+# ===========================
+# Annotation verification
+# ===========================
+def test_verify_annotations(tmp_path):
+    path = tmp_path / "f.bin.txt"
+    path.write_text("|00000000|0x0102|Hex (BE)|0x0102|\n"
+                    "|00000002|0x0304|Hex (BE)|0x0304|\n"
+                    "|00000004|0xFFFF|Hex (BE)|0xFFFF|\n"
+                    "|00000007|0x0809|UInt16|2312|\n"
+                    "|00000100|0x00|Decimal|0|\n"
+                    "|00000005|0xZZ|Decimal|?|\n")
+    report = verify_annotations(AnnotationIndex.open(str(path)), BytesDataSource(bytes(range(1, 9))))
+    assert (report.total, report.matched) == (6, 2)
+    # Adjacent matches merge into one range
+    assert report.matched_ranges == [(0, 4)]
+    assert report.ranges_between(3, 10) == [(0, 4)]
+    assert [(offset, reason) for offset, _, reason, _, _ in report.problems] == [
+        (4, "mismatch"), (5, "invalid data"), (7, "truncated"), (0x100, "out of range")]
+    assert report.problems[0][3:] == ("FFFF", "0506")
+    assert report.summary() == "2 of 6 entries match, 4 stale or mismatched"
+    assert report.to_text(limit=1).splitlines()[-1] == "... 3 more"
+
+
+def test_annotation_writer(tmp_path, monkeypatch):
+    path = tmp_path / "f.bin.txt"
+    path.write_text("|00000000|0x01|Decimal|1|\n")
+    monkeypatch.setattr(fasthex_core, "ANNOTATION_FLUSH_LINES", 3)
+    writer = AnnotationWriter(str(path))
+    # Duplicates of the file and of the queue are skipped
+    assert not writer.write("|00000000|0x01|Decimal|1|")
+    assert writer.write("|00000001|0x02|Decimal|2|")
+    assert not writer.write("|00000001|0x02|Decimal|2|")
+    assert writer.write("|00000002|0x03|Decimal|3|")
+    assert writer.pending == 2 and len(path.read_text().splitlines()) == 1
+    assert writer.write("|00000003|0x04|Decimal|4|")
+    assert writer.pending == 0
+    assert writer.write_many(["|00000003|0x04|Decimal|4|", "|00000004|0x05|Decimal|5|"]) == 1
+    assert writer.write("|00000005|0x06|Decimal|6|")
+    writer.close()
+    lines = path.read_text().splitlines()
+    assert [int(line.split("|")[1], 16) for line in lines] == list(range(6))
+
+
+# ===========================
+# Search
+# ===========================
+def whole_search(data, regex):
+    """Matches of one finditer() over all of `data`, as search_data reports them."""
+    return [(m.start(), m.end() - m.start()) for m in regex.finditer(data) if m.end() > m.start()]
+
+
+def test_search_match_across_chunk_edge():
+    data = BytesDataSource(b"xx" + b"a" * 10 + b"yy")
+    regex, max_match = compile_search_pattern("a+", "Regex")
+    assert list(search_data(data, regex, max_match, chunk_size=5)) == [(2, 10)]
+    regex, max_match = compile_search_pattern("aa", "ASCII")
+    assert list(search_data(data, regex, max_match, chunk_size=5)) == [(2, 2), (4, 2), (6, 2), (8, 2), (10, 2)]
+
+
+@pytest.mark.parametrize("text, mode", [("ab", "ASCII"), ("61 ?? 61", "Hex"), ("a", "UTF-16"),
+                                        (r"b[a-c]{1,5}", "Regex")])
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64])
+def test_search_chunks_match_whole_search(text, mode, chunk_size):
+    rng = random.Random(4)
+    data = bytes(rng.choice(b"abc\x00") for _ in range(500))
+    regex, max_match = compile_search_pattern(text, mode)
+    hits = list(search_data(BytesDataSource(data), regex, max_match, chunk_size=chunk_size))
+    assert hits == whole_search(data, regex)
+
+
+def test_search_bad_patterns():
+    for text, mode in [("ABC", "Hex"), ("", "ASCII"), ("(", "Regex")]:
+        with pytest.raises(ValueError):
+            compile_search_pattern(text, mode)
+
+
+# ===========================
+# Annotation index
+# ===========================
+LINE_A = "|00000000|0x0102|Hex (BE)|0x0102|\n"
+LINE_B = "|00000004|0x03|Decimal|3|\n"
+LINE_C = "|00000002|0x05|Decimal|5|\n"
+
+
+def touch_later(path):
+    """Move the mtime on, so a rewrite of the same size is noticed."""
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+
+def offsets_of(index):
+    return [index.entry(i)[0] for i in range(len(index))]
+
+
+def test_annotation_index_append(tmp_path):
+    path = tmp_path / "f.bin.txt"
+    path.write_text(LINE_A + LINE_B)
+    index = AnnotationIndex.open(str(path))
+    assert offsets_of(index) == [0, 4]
+    with open(path, "a") as f:
+        f.write(LINE_C)
+    touch_later(path)
+    assert index.refresh() == 1
+    assert offsets_of(index) == [0, 2, 4]
+    assert index.query(2, 3) == [1]
+
+
+def test_annotation_index_partial_line(tmp_path):
+    path = tmp_path / "f.bin.txt"
+    path.write_text(LINE_A + LINE_B.rstrip("\n"))
+    index = AnnotationIndex.open(str(path))
+    # The unterminated last line counts, but is read again once it grows
+    assert offsets_of(index) == [0, 4]
+    assert index.parsed_bytes == len(LINE_A)
+    index.save()
+    assert offsets_of(AnnotationIndex.open(str(path))) == [0, 4]
+
+    with open(path, "a") as f:
+        f.write("\n|00000002|0x05|Dec")
+    touch_later(path)
+    index.refresh()
+    assert offsets_of(index) == [0, 2, 4]
+    with open(path, "a") as f:
+        f.write("imal|5|\n")
+    touch_later(path)
+    assert index.refresh() == 0
+    assert [index.entry(i)[3] for i in range(len(index))] == ["Hex (BE)", "Decimal", "Decimal"]
+    assert index.parsed_bytes == os.path.getsize(path)
+
+
+def test_annotation_index_rewrite(tmp_path):
+    path = tmp_path / "f.bin.txt"
+    path.write_text(LINE_A + LINE_B)
+    index = AnnotationIndex.open(str(path))
+    index.save()
+    path.write_text(LINE_C + LINE_B)
+    touch_later(path)
+    assert offsets_of(index) == [0, 4]
+    index.refresh()
+    assert offsets_of(index) == [2, 4]
+    # A saved index of the old contents is not trusted either
+    assert offsets_of(AnnotationIndex.open(str(path))) == [2, 4]
+
+
+def test_report_covers():
+    report = VerificationReport()
+    report.matched_ranges = [(0, 4), (10, 20)]
+    assert report.covers(0, 4) and report.covers(12, 20)
+    # Saved while a parse ran: not in the loaded index, so still highlighted separately
+    assert not report.covers(3, 5) and not report.covers(12, 21) and not report.covers(30, 31)
+
+
+# ===========================
+# Structure templates
+# ===========================
+HEADER_DSL = """
+struct Header
+endian little
+magic    char[4]
+version  u16
+flags\tu32 be      # tab-separated, big-endian
+table    u8[2]
+_        pad[1]
+crc      bytes[2]
+"""
+HEADER = b"AB\x00\x00" + struct.pack("<H", 7) + struct.pack(">I", 0x01020304) + b"\x09\x0a" + b"?" + b"\xbe\xef"
+
+
+def test_template_dsl_and_json_agree():
+    template = compile_template(HEADER_DSL)
+    assert template.name == "Header" and template.size == len(HEADER)
+    assert template.field_names == ["magic", "version", "flags", "table", "crc"]
+    same = compile_template({"name": "Header", "fields": [
+        ("magic", "char[4]"), ("version", "u16"), ("flags", "u32 be"), ("table", "u8[2]"),
+        ("_", "pad[1]"), ("crc", "bytes[2]")]})
+    assert same.size == template.size and same.field_names == template.field_names
+
+
+@pytest.mark.parametrize("text", ["x", "x u17", "x char[0]", "endian middle\nx u8"])
+def test_template_errors(text):
+    with pytest.raises(ValueError):
+        compile_template(text)
+
+
+def test_decode_records():
+    template = compile_template(HEADER_DSL)
+    data = BytesDataSource(HEADER * 3 + b"\x00" * 5)
+    records = list(decode_records(template, data, 0))
+    assert [offset for offset, _ in records] == [0, len(HEADER), 2 * len(HEADER)]
+    values = records[0][1]
+    assert [format_field(field[1], value) for field, value in zip(template.fields, values)] == \
+        ["AB", "7", str(0x01020304), "9 10", "0xBEEF"]
+    assert len(list(decode_records(template, data, len(HEADER), count=5))) == 2
+    with pytest.raises(ValueError):
+        list(decode_records(template, data, -10))
+
+
+def test_template_annotations_escape_char_fields():
+    template = compile_template("struct R\nname char[6]\n")
+    data = BytesDataSource(b"a|b\ncd")
+    lines = list(template_annotations(template, data, decode_records(template, data, 0)))
+    assert lines == ["|00000000|0x617C620A6364|R.name|a\\x7Cb\\x0Acd|"]
+    assert parse_annotation_line(lines[0]) == (0, 6, b"a|b\ncd", "R.name", "a\\x7Cb\\x0Acd")
+
+
+# ===========================
+# Overview strip
+# ===========================
+def test_block_stats(numpy_mode):
+    assert block_stats(b"") == (0, 0, 0, 0)
+    assert block_stats(bytes(64)) == (0, 255, 0, 0)
+    assert block_stats(bytes(range(256))) == (255, 1, 95, 128)
+    assert block_stats(b"ab" * 32) == (32, 0, 255, 0)
+
+
+def test_compute_overview(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    path = tmp_path / "f.bin"
+    path.write_bytes(bytes(256) + b"text" * 64 + bytes(range(256)) + b"\xff" * 100)
+    data = open_data_source(str(path))
+    try:
+        calls = []
+        overview = compute_overview(data, str(path), progress=lambda done, total: calls.append(done))
+        assert (overview.size, overview.block_size, len(overview)) == (868, 256, 4)
+        assert overview.block(0) == (0, 255, 0, 0)
+        assert overview.block(1)[2] == 255
+        assert overview.block(3) == (0, 0, 0, 255)
+        assert calls == [1]
+        # The second run is served from the cache
+        assert os.listdir(tmp_path / "cache" / "fasthexparser" / "overview")
+        monkeypatch.setattr(fasthex_core, "_overview_blocks", None)
+        assert compute_overview(data, str(path)).to_json() == overview.to_json()
+    finally:
+        data.close()
+
+
+# ===========================
+# Binary diff
+# ===========================
+def baseline_diff(a, b):
+    """Differing runs found byte by byte."""
+    differing = [i for i in range(max(len(a), len(b))) if a[i:i + 1] != b[i:i + 1]]
+    runs = []
+    for i in differing:
+        if runs and runs[-1][1] == i:
+            runs[-1] = (runs[-1][0], i + 1)
+        else:
+            runs.append((i, i + 1))
+    return runs
+
+
+@pytest.mark.parametrize("chunk_size, block_size", [(64, 16), (50, 7), (1 << 20, 4096)])
+def test_diff_data(chunk_size, block_size):
+    a = sample(1000)
+    b = bytearray(a)
+    rng = random.Random(1)
+    for i in rng.sample(range(len(b)), 40) + [15, 16, 63, 64, 999]:
+        b[i] ^= 0xFF
+    for extra in (b"", b"tail"):
+        other = bytes(b) + extra
+        result = diff_data(BytesDataSource(a), BytesDataSource(other), chunk_size, block_size)
+        assert result.ranges == baseline_diff(a, other)
+    first, second = result.ranges[:2]
+    assert result.next_after(first[0]) == second
+    assert result.prev_before(second[0]) == first and result.prev_before(first[0]) is None
+    assert result.summary() == f"{len(result)} differing ranges, {result.differing_bytes()} bytes"
+
+
+def test_diff_identical():
+    a = BytesDataSource(sample(100))
+    assert diff_data(a, a).summary() == "Files are identical"
+    assert diff_data(a, BytesDataSource(sample(100) + b"x")).ranges == [(100, 101)]
+    assert diff_data(BytesDataSource(b"ab"), BytesDataSource(b"abc"), 1, 1).ranges == [(2, 3)]
+
+
+# ===========================
+# Strings and signatures scan
+# ===========================
+ELF_HEADER = b"\x7fELF\x02\x01\x01" + bytes(9)
+SCAN_SAMPLE = (bytes(10) + b"short" + bytes(3) + b"a|long string" + b"\x01" + "wide text".encode("utf-16-le")
+               + bytes(4) + ELF_HEADER + b"\x7fELF\x09")
+
+
+def test_scan_data():
+    data = BytesDataSource(SCAN_SAMPLE)
+    index = scan_data(data)
+    lines = list(index.annotation_lines(data))
+    assert [line.split("|")[3:5] for line in lines] == [
+        ["String", "a\\x7Clong string"], ["String (UTF-16)", "wide text"], ["Signature", "ELF 64-bit LSB"]]
+    assert lines[0].startswith(f"|{18:08X}|0x617C6C6F6E67")
+    assert index.summary() == "2 strings, 1 signatures"
+    assert index.ranges_between(20, 40) == [(18, 31), (32, 50)]
+    assert index.query(0, 18) == []
+    assert len(scan_data(data, signatures=False)) == 2
+    assert len(scan_data(data, min_length=4, strings=True, signatures=False)) == 3
+
+
+def test_scan_chunk_edges(monkeypatch, tmp_path):
+    data = sample(20000) + SCAN_SAMPLE * 3 + b"x" * 5000
+    path = tmp_path / "f.bin"
+    path.write_bytes(data)
+    expected = scan_data(BytesDataSource(data))
+    assert len(expected) >= 10
+    # Long strings are cut at SCAN_MAX_STRING
+    assert max(expected.lengths) == fasthex_core.SCAN_MAX_STRING
+    monkeypatch.setattr(fasthex_core, "SCAN_CHUNK_SIZE", 1000)
+    for workers in (1, 2):
+        monkeypatch.setattr(fasthex_core, "SCAN_PARALLEL_BYTES", 0)
+        source = open_data_source(str(path))
+        try:
+            index = scan_data(source, str(path), workers=workers)
+        finally:
+            source.close()
+        assert [index.entry(i) for i in range(len(index))] == [expected.entry(i) for i in range(len(expected))]
+
+
+# ===========================
+# File session
+# ===========================
+class CountingSource(BytesDataSource):
+    """Data source with a fixed cache size that remembers being closed."""
+
+    def __init__(self, cache=0):
+        super().__init__(bytes(64))
+        self.cache = cache
+        self.closed = False
+
+    def cache_bytes(self):
+        return self.cache
+
+    def close(self):
+        self.closed = True
+
+
+def test_session_sources(tmp_path):
+    path = str(tmp_path / "f.bin")
+    session = FileSession()
+    data = CountingSource()
+    assert session.acquire(path) is None
+    assert session.register(path, data) is data
+    # A second open of the same file is closed in favour of the shared one
+    late = CountingSource()
+    assert session.register(str(tmp_path / "." / "f.bin"), late) is data and late.closed
+    assert session.acquire(path, raw=True) is None
+    assert session.retain(data) and not session.retain(late)
+    for _ in range(2):
+        session.release(data)
+    assert not data.closed
+    session.release(data)
+    assert data.closed and session.acquire(path) is None
+
+
+def test_session_tabs_and_trim(tmp_path):
+    session = FileSession(budget=250)
+    tabs = []
+    for name in "abcd":
+        tab = session.add(str(tmp_path / name))
+        session.attach(tab, session.register(tab.path, CountingSource(100)))
+        session.activate(tab)
+        tabs.append(tab)
+    a, b, c, d = tabs
+    assert session.tabs == tabs and session.find(b.path) is b and session.find(b.path, raw=True) is None
+    session.activate(a)
+    # Idle tabs go least recently used first, and never the active one
+    assert session.trim() == [b, c]
+    assert (a.loaded, b.loaded, c.loaded, d.loaded) == (True, False, False, True)
+    session.budget = 0
+    assert session.trim() == [d]
+    assert session.stats() == {"tabs": 4, "loaded": 1, "bytes": 100, "budget": 0, "evictions": 3}
+    # Closing the active tab shows its neighbour; closing another keeps the active one
+    session.activate(c)
+    assert session.close(d) is c
+    assert session.close(c) is b
+    assert session.close(b) is None
+    source = a.data
+    session.close_all()
+    assert source.closed and not session.tabs
+
+
+# ===========================
+# Compressed files
+# ===========================
+def compressible(size, seed=1):
+    rng = random.Random(seed)
+    words = [bytes(rng.randrange(256) for _ in range(rng.randrange(1, 12))) for _ in range(500)]
+    out = bytearray()
+    while len(out) < size:
+        out += rng.choice(words)
+    return bytes(out[:size])
+
+
+def xz_blocks(data):
+    if shutil.which("xz") is None:
+        pytest.skip("xz is not installed")
+    return subprocess.run(["xz", "-c", "--block-size=64KiB"], input=data, stdout=subprocess.PIPE,
+                          check=True).stdout
+
+
+COMPRESSED_CASES = {
+    "gzip": lambda a, b: gzip.compress(a + b),
+    "gzip members": lambda a, b: gzip.compress(a) + gzip.compress(b),
+    "bzip2 blocks": lambda a, b: bz2.compress(a + b, compresslevel=1),
+    "bzip2 streams": lambda a, b: bz2.compress(a, compresslevel=1) + bz2.compress(b, compresslevel=1),
+    "xz": lambda a, b: lzma.compress(a + b),
+    "xz streams": lambda a, b: lzma.compress(a) + lzma.compress(b),
+    "xz blocks": lambda a, b: xz_blocks(a + b),
+}
+
+
+def check_random_reads(source, data, reads=150, seed=2):
+    rng = random.Random(seed)
+    assert len(source) == len(data)
+    for _ in range(reads):
+        start = rng.randrange(len(data))
+        end = min(len(data), start + rng.randrange(1, 200000))
+        assert source[start:end] == data[start:end]
+        assert bytes(source.view(start, end)) == data[start:end]
+    assert source[len(data) - 1] == data[-1]
+
+
+@pytest.mark.parametrize("case", list(COMPRESSED_CASES))
+def test_compressed_random_reads(monkeypatch, tmp_path, case):
+    # Small enough for several gzip snapshots
+    monkeypatch.setattr(fasthex_core, "COMPRESSED_SNAPSHOT_SPACING", 64 * 1024)
+    a, b = compressible(400000, seed=1), compressible(300000, seed=2)
+    path = tmp_path / "data.z"
+    path.write_bytes(COMPRESSED_CASES[case](a, b))
+
+    source = open_data_source(str(path))
+    try:
+        assert isinstance(source, CompressedFileSource)
+        if case != "gzip" and case != "xz":
+            assert len(source.segments) > 1
+        segments = source.segments
+        check_random_reads(source, a + b)
+    finally:
+        source.close()
+
+    # Second open: from the saved index, without decoding
+    assert os.path.exists(str(path) + fasthex_core.COMPRESSED_INDEX_SUFFIX)
+    source = open_data_source(str(path))
+    try:
+        assert source.segments == segments
+        check_random_reads(source, a + b, seed=3)
+    finally:
+        source.close()
+
+
+def test_compressed_truncated(tmp_path):
+    data = compressible(300000)
+    packed = gzip.compress(data)
+    path = tmp_path / "cut.gz"
+    path.write_bytes(packed[:len(packed) // 2])
+    source = open_data_source(str(path))
+    try:
+        assert 0 < len(source) < len(data)
+        assert source[0:len(source)] == data[:len(source)]
+    finally:
+        source.close()
+
+
+@pytest.mark.parametrize("magic", [b"\x1f\x8b", b"\x1f\x8b\x08\x00", b"BZh91AY&SY", b"\xfd7zXZ\x00"])
+def test_compressed_magic_only_opens_raw(tmp_path, magic):
+    data = magic + sample(5000)
+    path = tmp_path / "dump.bin"
+    path.write_bytes(data)
+    source = open_data_source(str(path))
+    try:
+        assert not isinstance(source, CompressedFileSource)
+        assert source[0:len(data)] == data
+    finally:
+        source.close()
+
+
+def test_compressed_open_raw(tmp_path):
+    packed = gzip.compress(b"hello" * 1000)
+    path = tmp_path / "a.gz"
+    path.write_bytes(packed)
+    source = open_data_source(str(path), decompress=False)
+    try:
+        assert source[0:len(packed)] == packed
+    finally:
+        source.close()
+
+
+# ===========================
+# Performance counters
+# ===========================
+def test_perf_snapshot():
+    stats = PerfStats(samples=10)
+    for ms in range(1, 21):
+        stats.record("format", ms / 1000)
+    stats.count("hits", 3)
+    stats.count("hits")
+    snapshot = stats.snapshot({"cache_pages": 7})
+    (row,) = snapshot["timers"]
+    assert (row["name"], row["count"]) == ("format", 20)
+    assert row["total_ms"] == pytest.approx(210) and row["max_ms"] == pytest.approx(20)
+    # Percentiles are over the last 10 samples only
+    assert [round(row[key]) for key in ("p50_ms", "p90_ms", "p99_ms")] == [15, 19, 20]
+    assert snapshot["counters"] == {"cache_pages": 7, "hits": 4}
+    stats.reset()
+    assert stats.snapshot() == {"timers": [], "counters": {}}
+
+
+def test_perf_timed_and_export():
+    stats = PerfStats()
+
+    @stats.timed("fail")
+    def fail():
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        fail()
+    with stats.timer("block"):
+        pass
+    snapshot = stats.snapshot({"pages": 2})
+    assert [(row["name"], row["count"]) for row in snapshot["timers"]] == [("block", 1), ("fail", 1)]
+    f = io.StringIO()
+    export_perf(snapshot, f, "csv")
+    lines = f.getvalue().splitlines()
+    assert lines[0] == ",".join(PERF_CSV_FIELDS) and lines[-1] == "pages,2,,,,,,"
+    f = io.StringIO()
+    export_perf(snapshot, f)
+    assert json.loads(f.getvalue()) == snapshot
+    with pytest.raises(ValueError):
+        export_perf(snapshot, io.StringIO(), "xml")